@@ -0,0 +1,503 @@
+# async_mysql_handler.py
+# asyncio counterpart of MySQLHandler on aiomysql, for running the pipeline inside one event loop.
+#
+#   db_handler = AsyncMySQLHandler(config, pool_size=8)
+#   await db_handler.connect()
+#   term_id, name, description = await db_handler.get_next_unprocessed_term()
+#   ...
+#   await db_handler.close()
+#
+# It covers the MySQLHandler methods used to generate and publish a single-locale post, with the same
+# arguments and return values. Locale variants, refresh/rerender (fetch_stale_posts, update_post_content,
+# fetch_raw_contents, update_post_contents) and the image backfill queue are only on MySQLHandler. Each call borrows a connection from the
+# handler's own pool, so one handler is shared by every task and DB work overlaps with in-flight OpenAI
+# calls instead of blocking the loop or hopping to a thread.
+from collections import Counter
+from datetime import datetime
+
+import aiomysql
+import pymysql
+
+from metrics import timed, record_error
+from mysql_handler import (SUMMARY_META_KEYS, _category_taxonomy_ids, _category_taxonomy_lock, generate_slug,
+                           term_count_update)
+from sites import DEFAULT_BASE_URL, DEFAULT_MIN_TERM_ID
+
+
+class AsyncMySQLHandler:
+    def __init__(self, config, pool_size=4, base_url=DEFAULT_BASE_URL, min_term_id=DEFAULT_MIN_TERM_ID,
+                 max_term_id=None):
+        self.config = dict(config)
+        self.pool_size = pool_size
+        self.base_url = base_url.rstrip("/")
+        self.min_term_id = min_term_id
+        # No upper bound by default; term_id is an unsigned BIGINT in WordPress
+        self.max_term_id = max_term_id if max_term_id is not None else 2 ** 63
+        self.pool = None
+
+    @timed("mysql.connect")
+    async def connect(self):
+        # Same settings file as MySQLHandler (mysql.connector names)
+        try:
+            self.pool = await aiomysql.create_pool(
+                host=self.config.get("host", "localhost"),
+                port=int(self.config.get("port", 3306)),
+                user=self.config.get("user"),
+                password=self.config.get("password", ""),
+                db=self.config.get("database"),
+                minsize=1,
+                maxsize=self.pool_size,
+                autocommit=False,
+                charset="utf8mb4",
+            )
+            print("Connected to MariaDB")
+        except pymysql.MySQLError as err:
+            record_error(err)
+            print(f"Error connecting: {err}")
+
+    @timed("mysql.close")
+    async def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            await self.pool.wait_closed()
+            self.pool = None
+            print("MariaDB connection is closed")
+
+    def database_key(self):
+        return self.config.get("host"), str(self.config.get("port")), self.config.get("database")
+
+    async def get_rotation_epoch(self, cursor, name: str) -> int:
+        """Return the current cycle number for a rotation ('terms' or 'templates')."""
+        await cursor.execute("SELECT epoch FROM z_rotation WHERE name = %s", (name,))
+        record = await cursor.fetchone()
+        return record[0] if record else 1
+
+    async def start_new_rotation(self, connection, cursor, name: str, epoch: int):
+        """Begin the next cycle with a single-row update (see MySQLHandler.start_new_rotation)."""
+        await cursor.execute("UPDATE z_rotation SET epoch = epoch + 1 WHERE name = %s AND epoch = %s", (name, epoch))
+        await connection.commit()
+
+    async def get_category_taxonomy_id(self, cursor, term_id: int):
+        """Resolve a category's term_id to its term_taxonomy_id using the map shared with MySQLHandler."""
+        key = self.database_key()
+        with _category_taxonomy_lock:
+            taxonomy_ids = _category_taxonomy_ids.get(key)
+        if taxonomy_ids is None:
+            await cursor.execute("SELECT term_id, term_taxonomy_id FROM wp_term_taxonomy WHERE taxonomy = 'category'")
+            taxonomy_ids = dict(await cursor.fetchall())
+            with _category_taxonomy_lock:
+                _category_taxonomy_ids[key] = taxonomy_ids
+
+        term_taxonomy_id = taxonomy_ids.get(term_id)
+        if term_taxonomy_id is None:
+            # Category created after the map was loaded
+            await cursor.execute(
+                "SELECT term_taxonomy_id FROM wp_term_taxonomy WHERE term_id = %s AND taxonomy = 'category'",
+                (term_id,),
+            )
+            record = await cursor.fetchone()
+            if record:
+                term_taxonomy_id = record[0]
+                with _category_taxonomy_lock:
+                    taxonomy_ids[term_id] = term_taxonomy_id
+        return term_taxonomy_id
+
+    @staticmethod
+    async def apply_term_counts(cursor, deltas):
+        """Write term_taxonomy_id -> delta count changes in one UPDATE; call right before commit()."""
+        update = term_count_update(deltas)
+        if update:
+            await cursor.execute(*update)
+
+    @timed("mysql.get_next_unprocessed_term")
+    async def get_next_unprocessed_term(self):
+        select_query = """
+            SELECT term_id, name, z_category_description
+            FROM wp_terms
+            WHERE z_epoch < %s
+            AND term_id BETWEEN %s AND %s
+            AND z_category_description != ''
+            ORDER BY z_epoch, term_id
+            LIMIT 1
+        """
+        async with self.pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                try:
+                    epoch = await self.get_rotation_epoch(cursor, "terms")
+                    await cursor.execute(select_query, (epoch, self.min_term_id, self.max_term_id))
+                    record = await cursor.fetchone()
+                    if not record:
+                        # Every term has been used in this cycle; start the next one
+                        await self.start_new_rotation(connection, cursor, "terms", epoch)
+                        epoch = await self.get_rotation_epoch(cursor, "terms")
+                        await cursor.execute(select_query, (epoch, self.min_term_id, self.max_term_id))
+                        record = await cursor.fetchone()
+                    await connection.commit()
+
+                    if record:
+                        term_id, name, z_category_description = record
+                        return term_id, name, z_category_description
+                    return None, None, None
+                except pymysql.MySQLError as err:
+                    record_error(err)
+                    print(f"Error: {err}")
+                    return None, None, None
+
+    @staticmethod
+    async def pick_template(cursor, epoch: int):
+        """A random template not used in this cycle, drawn from the index first (see MySQLHandler.pick_template)."""
+        await cursor.execute("SELECT blog_type FROM blog_templates WHERE last_epoch < %s ORDER BY RAND() LIMIT 1",
+                             (epoch,))
+        record = await cursor.fetchone()
+        if not record:
+            return None
+        await cursor.execute("""
+            SELECT blog_type, user_prompt
+            FROM blog_templates
+            WHERE blog_type = %s AND last_epoch < %s
+            ORDER BY RAND()
+            LIMIT 1
+        """, (record[0], epoch))
+        return await cursor.fetchone()
+
+    @timed("mysql.get_blog_template")
+    async def get_blog_template(self, z_category_description):
+        async with self.pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                try:
+                    epoch = await self.get_rotation_epoch(cursor, "templates")
+                    record = await self.pick_template(cursor, epoch)
+                    if not record:
+                        # Every template has been used in this cycle; start the next one
+                        await self.start_new_rotation(connection, cursor, "templates", epoch)
+                        epoch = await self.get_rotation_epoch(cursor, "templates")
+                        record = await self.pick_template(cursor, epoch)
+                    await connection.commit()
+
+                    if record:
+                        blog_type, user_prompt = record
+                        # Replace '{category}' with the given z_category_description
+                        return blog_type, user_prompt.replace("{category}", z_category_description)
+                    return None, None
+                except pymysql.MySQLError as err:
+                    record_error(err)
+                    print(f"Error: {err}")
+                    return None, None
+
+    @timed("mysql.mark_blog_type_as_taken")
+    async def mark_blog_type_as_taken(self, blog_type: str):
+        # Stamp the template with the current cycle so it is skipped until the next one
+        update_query = """
+            UPDATE blog_templates
+            SET last_epoch = (SELECT epoch FROM z_rotation WHERE name = 'templates')
+            WHERE blog_type = %s
+        """
+        async with self.pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                try:
+                    await cursor.execute(update_query, (blog_type,))
+                    await connection.commit()
+                    if cursor.rowcount > 0:
+                        print(f"Successfully marked {cursor.rowcount} rows as used in this cycle for blog_type: {blog_type}.")
+                    else:
+                        print("No rows were updated. Check if the blog_type exists.")
+                except pymysql.MySQLError as err:
+                    record_error(err)
+                    print(f"Error: {err}")
+                    await connection.rollback()
+
+    @timed("mysql.update_term_processed")
+    async def update_term_processed(self, term_id: int):
+        """Stamp the term with the current cycle so it is skipped until the next one."""
+        update_query = """
+            UPDATE wp_terms
+            SET z_epoch = (SELECT epoch FROM z_rotation WHERE name = 'terms')
+            WHERE term_id = %s
+        """
+        async with self.pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                try:
+                    await cursor.execute(update_query, (term_id,))
+                    await connection.commit()
+                    print(f"Term ID {term_id} marked as processed in this cycle.")
+                except pymysql.MySQLError as err:
+                    record_error(err)
+                    print(f"Error: {err}")
+                    await connection.rollback()
+
+    @timed("mysql.create_blog_post")
+    async def create_blog_post(self, blog_content):
+        if self.pool is None:
+            print("No active connection to MariaDB")
+            return
+
+        post_status = blog_content.get("status", "publish")
+        summary = blog_content.get("summary") or {}
+        post_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        insert_query = """
+            INSERT INTO wp_posts (
+                post_author, post_date, post_content, post_title, post_status,
+                post_name, post_parent, post_type, post_modified, post_modified_gmt,
+                post_excerpt, to_ping, pinged, post_content_filtered
+            )
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """
+        post_data = (
+            1, post_date, blog_content["content"], blog_content["title"], post_status,
+            generate_slug(blog_content["title"]), 0, "post", post_date, post_date, summary.get("excerpt", ""),
+            "", "", ""
+        )
+
+        async with self.pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                try:
+                    await cursor.execute(insert_query, post_data)
+                    post_id = cursor.lastrowid
+                    meta = [(post_id, meta_key, summary[field])
+                            for field, meta_keys in SUMMARY_META_KEYS.items() if summary.get(field) is not None
+                            for meta_key in meta_keys]
+                    meta += [(post_id, meta_key, meta_value)
+                             for meta_key, meta_value in (blog_content.get("meta") or {}).items()]
+                    if meta:
+                        await cursor.executemany(
+                            "INSERT INTO wp_postmeta (post_id, meta_key, meta_value) VALUES (%s, %s, %s)", meta)
+                    await connection.commit()
+                    print(f"Blog post created with ID: {post_id} ({post_status})")
+                    return post_id
+                except pymysql.MySQLError as err:
+                    record_error(err)
+                    print(f"Error: {err}")
+                    await connection.rollback()
+
+    @timed("mysql.create_image_attachment")
+    async def create_image_attachment(self, image_name: str, post_id: int, month: str, year: str):
+        """Create an image attachment in the wp_posts table."""
+        if self.pool is None:
+            print("No active connection to MariaDB")
+            return
+
+        post_title = image_name.rsplit('.', 1)[0]
+        post_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        guid = f"{self.base_url}/wp-content/uploads/{year}/{month}/{image_name}"
+        insert_query = """
+            INSERT INTO wp_posts (
+                post_author, post_date, post_content, post_title, post_status,
+                post_name, post_parent, post_type, post_modified, post_modified_gmt,
+                post_excerpt, to_ping, pinged, post_content_filtered, guid, post_mime_type
+            )
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """
+        post_data = (
+            1, post_date, "", post_title, "inherit", post_title.lower(), post_id, "attachment",
+            post_date, post_date, "", "", "", "", guid, "image/jpeg"
+        )
+
+        async with self.pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                try:
+                    await cursor.execute(insert_query, post_data)
+                    attachment_id = cursor.lastrowid
+                    await connection.commit()
+                    print(f"Image attachment created with ID: {attachment_id}")
+                    return attachment_id
+                except pymysql.MySQLError as err:
+                    record_error(err)
+                    print(f"Error: {err}")
+                    await connection.rollback()
+
+    @timed("mysql.assign_category_to_post")
+    async def assign_category_to_post(self, category_id, post_id, published: bool = True):
+        """Assign a category to a post, bumping the category's count for published posts."""
+        insert_query = """
+            INSERT INTO wp_term_relationships (object_id, term_taxonomy_id, term_order)
+            VALUES (%s, %s, %s)
+        """
+        async with self.pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                try:
+                    term_taxonomy_id = await self.get_category_taxonomy_id(cursor, category_id)
+                    if term_taxonomy_id is None:
+                        print(f"Error: no category taxonomy for term ID {category_id}; Post ID {post_id} left uncategorized.")
+                        return
+                    await cursor.execute(insert_query, (post_id, term_taxonomy_id, 0))
+                    if published:
+                        await self.apply_term_counts(cursor, {term_taxonomy_id: 1})
+                    await connection.commit()
+                    print(f"Category ID {category_id} assigned to Post ID {post_id}.")
+                except pymysql.MySQLError as err:
+                    record_error(err)
+                    print(f"Error: {err}")
+                    await connection.rollback()
+
+    @timed("mysql.assign_image_to_post")
+    async def assign_image_to_post(self, post_id: int, post_attachment_id: int, image_path: str):
+        """Assign image details to a post in the wp_postmeta table."""
+        insert_query = """
+            INSERT INTO wp_postmeta (post_id, meta_key, meta_value)
+            VALUES (%s, %s, %s)
+        """
+        async with self.pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                try:
+                    await cursor.executemany(insert_query, [
+                        (post_id, '_thumbnail_id', post_attachment_id),
+                        (post_attachment_id, '_wp_attached_file', image_path),
+                    ])
+                    await connection.commit()
+                    print(f"Image assigned to Post ID {post_id} with attachment ID {post_attachment_id} and image path '{image_path}'.")
+                except pymysql.MySQLError as err:
+                    record_error(err)
+                    print(f"Error: {err}")
+                    await connection.rollback()
+
+    @timed("mysql.add_to_publish_buffer")
+    async def add_to_publish_buffer(self, post_id: int):
+        """Queue a fully rendered draft for the scheduled publisher."""
+        insert_query = """
+            INSERT INTO z_publish_buffer (post_id, created_at)
+            VALUES (%s, %s)
+        """
+        async with self.pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                try:
+                    await cursor.execute(insert_query, (post_id, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+                    await connection.commit()
+                    print(f"Post ID {post_id} added to the publish buffer.")
+                except pymysql.MySQLError as err:
+                    record_error(err)
+                    print(f"Error: {err}")
+                    await connection.rollback()
+
+    @timed("mysql.count_buffered_posts")
+    async def count_buffered_posts(self) -> int:
+        """Return how many drafts are waiting in the publish buffer."""
+        async with self.pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                try:
+                    await cursor.execute("SELECT COUNT(*) FROM z_publish_buffer")
+                    return (await cursor.fetchone())[0]
+                except pymysql.MySQLError as err:
+                    record_error(err)
+                    print(f"Error: {err}")
+                    return 0
+
+    @timed("mysql.publish_buffered_posts")
+    async def publish_buffered_posts(self, limit: int = 1):
+        """Publish the oldest buffered drafts in one transaction. Returns the published post IDs."""
+        async with self.pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                try:
+                    await cursor.execute("SELECT post_id FROM z_publish_buffer ORDER BY post_id LIMIT %s FOR UPDATE",
+                                         (limit,))
+                    post_ids = [record[0] for record in await cursor.fetchall()]
+                    if not post_ids:
+                        await connection.rollback()
+                        return []
+
+                    placeholders = ", ".join(["%s"] * len(post_ids))
+                    await cursor.execute(f"DELETE FROM z_publish_buffer WHERE post_id IN ({placeholders})",
+                                         tuple(post_ids))
+
+                    # Locale variants go live together with their source post
+                    await cursor.execute(f"""
+                        SELECT post_id FROM wp_postmeta
+                        WHERE meta_key = '_blog_translation_of' AND meta_value IN ({placeholders})
+                    """, tuple(str(post_id) for post_id in post_ids))
+                    all_ids = post_ids + [record[0] for record in await cursor.fetchall()]
+                    placeholders = ", ".join(["%s"] * len(all_ids))
+
+                    # Only posts still in draft are flipped and counted (see MySQLHandler.publish_buffered_posts)
+                    await cursor.execute(f"""
+                        SELECT ID FROM wp_posts WHERE ID IN ({placeholders}) AND post_status = 'draft' FOR UPDATE
+                    """, tuple(all_ids))
+                    draft_ids = [record[0] for record in await cursor.fetchall()]
+                    if draft_ids:
+                        placeholders = ", ".join(["%s"] * len(draft_ids))
+                        post_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                        await cursor.execute(f"""
+                            UPDATE wp_posts
+                            SET post_status = 'publish', post_date = %s, post_modified = %s, post_modified_gmt = %s
+                            WHERE ID IN ({placeholders})
+                        """, (post_date, post_date, post_date, *draft_ids))
+
+                        # The drafts' categories were not counted while they were unpublished
+                        await cursor.execute(f"""
+                            SELECT tr.term_taxonomy_id, COUNT(*)
+                            FROM wp_term_relationships tr
+                            JOIN wp_term_taxonomy tt ON tt.term_taxonomy_id = tr.term_taxonomy_id AND tt.taxonomy = 'category'
+                            WHERE tr.object_id IN ({placeholders})
+                            GROUP BY tr.term_taxonomy_id
+                        """, tuple(draft_ids))
+                        await self.apply_term_counts(cursor, Counter(dict(await cursor.fetchall())))
+
+                    await connection.commit()
+                    print(f"Published buffered posts: {post_ids}")
+                    return post_ids
+                except pymysql.MySQLError as err:
+                    record_error(err)
+                    print(f"Error: {err}")
+                    await connection.rollback()
+                    return []
+
+    async def _fetchall(self, query: str, params):
+        async with self.pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                try:
+                    await cursor.execute(query, params)
+                    return list(await cursor.fetchall())
+                except pymysql.MySQLError as err:
+                    record_error(err)
+                    print(f"Error: {err}")
+                    return []
+
+    @timed("mysql.fetch_posts_since")
+    async def fetch_posts_since(self, last_post_id: int, limit: int = 500):
+        """Return (ID, post_title, post_content) of posts newer than last_post_id, oldest first."""
+        return await self._fetchall("""
+            SELECT ID, post_title, post_content
+            FROM wp_posts
+            WHERE ID > %s
+            AND post_type = 'post'
+            AND post_status IN ('publish', 'future', 'draft')
+            ORDER BY ID
+            LIMIT %s
+        """, (last_post_id, limit))
+
+    @timed("mysql.fetch_post_titles_since")
+    async def fetch_post_titles_since(self, last_post_id: int, limit: int = 500):
+        """Return (ID, post_title, category names joined by '|') of published posts newer than last_post_id."""
+        return await self._fetchall("""
+            SELECT p.ID, p.post_title, GROUP_CONCAT(t.name SEPARATOR '|')
+            FROM wp_posts p
+            LEFT JOIN wp_term_relationships tr ON tr.object_id = p.ID
+            LEFT JOIN wp_term_taxonomy tt ON tt.term_taxonomy_id = tr.term_taxonomy_id AND tt.taxonomy = 'category'
+            LEFT JOIN wp_terms t ON t.term_id = tt.term_id
+            WHERE p.ID > %s
+            AND p.post_type = 'post'
+            AND p.post_status = 'publish'
+            GROUP BY p.ID, p.post_title
+            ORDER BY p.ID
+            LIMIT %s
+        """, (last_post_id, limit))
+
+    @timed("mysql.fetch_post_titles")
+    async def fetch_post_titles(self, post_ids):
+        """Return (ID, post_title, category names joined by '|') for the given posts."""
+        if not post_ids:
+            return []
+        placeholders = ", ".join(["%s"] * len(post_ids))
+        return await self._fetchall(f"""
+            SELECT p.ID, p.post_title, GROUP_CONCAT(t.name SEPARATOR '|')
+            FROM wp_posts p
+            LEFT JOIN wp_term_relationships tr ON tr.object_id = p.ID
+            LEFT JOIN wp_term_taxonomy tt ON tt.term_taxonomy_id = tr.term_taxonomy_id AND tt.taxonomy = 'category'
+            LEFT JOIN wp_terms t ON t.term_id = tt.term_id
+            WHERE p.ID IN ({placeholders})
+            GROUP BY p.ID, p.post_title
+        """, tuple(post_ids))
+
+    @timed("mysql.get_post")
+    async def get_post(self, post_id: int):
+        """Return (post_title, post_content) of a post, or (None, None)."""
+        rows = await self._fetchall("SELECT post_title, post_content FROM wp_posts WHERE ID = %s", (post_id,))
+        return rows[0] if rows else (None, None)
@@ -0,0 +1,330 @@
+# benchmark.py
+# Reproducible benchmarks for the blog pipeline.
+#
+#   python benchmark.py                          # run everything, write results JSON
+#   python benchmark.py --suite parse --iterations 200
+#   python benchmark.py --mysql-config db.json   # publish against a real MariaDB
+#   python benchmark.py --suite publish --storage stub   # publish without any database (SQL cost only)
+#   python benchmark.py --compare benchmark_results/<previous>.json
+#
+# Results are written to benchmark_results/<timestamp>_<commit>.json so runs can be
+# compared across commits before deploying.
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import metrics
+from blog_parser import BlogContentParser
+from mysql_handler import MySQLHandler
+from openai_handler import BLOG_TYPES, OpenAIHandler
+from storage import SQLiteHandler
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BASE_DIR, "fixtures")
+RESULTS_DIR = os.path.join(BASE_DIR, "benchmark_results")
+
+
+class StubImageHandler:
+    """Stand-in for OpenAIHandler that skips DALL-E, the download and OpenCV."""
+
+    def generate_image(self, prompt: str, save_path: str, month: str, year: str, profile: str = "featured"):
+        return os.path.join(save_path, year, month, "benchmark_image.jpg")
+
+    @staticmethod
+    def resize_image_opencv(input_image_path, output_size=(256, 256)):
+        pass
+
+
+class StubCursor:
+    """Cursor stand-in that accepts every statement and hands out increasing row ids."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.lastrowid = None
+        self.rowcount = 0
+
+    def execute(self, query, params=None):
+        self.connection.statements += 1
+        if query.lstrip().upper().startswith("INSERT"):
+            self.connection.next_id += 1
+            self.lastrowid = self.connection.next_id
+        self.rowcount = 1
+
+    def executemany(self, query, seq_params):
+        for params in seq_params:
+            self.execute(query, params)
+
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class StubConnection:
+    """Connection stand-in used when no MariaDB is available."""
+
+    def __init__(self):
+        self.statements = 0
+        self.next_id = 0
+
+    def cursor(self):
+        return StubCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+
+@contextmanager
+def quiet():
+    """Silence the handlers' progress prints so they stay out of the timings and the report."""
+    stdout = sys.stdout
+    with open(os.devnull, "w") as devnull:
+        sys.stdout = devnull
+        try:
+            yield
+        finally:
+            sys.stdout = stdout
+
+
+def summarize(samples):
+    """Summarize a list of per-iteration durations (seconds)."""
+    samples = sorted(samples)
+    p95_index = max(0, int(round(0.95 * len(samples))) - 1)
+    mean = statistics.mean(samples)
+    return {
+        "iterations": len(samples),
+        "min_ms": samples[0] * 1000,
+        "median_ms": statistics.median(samples) * 1000,
+        "mean_ms": mean * 1000,
+        "p95_ms": samples[p95_index] * 1000,
+        "ops_per_sec": 1 / mean if mean else None,
+    }
+
+
+def time_calls(func, iterations, warmup=3, setup=None):
+    """Call func repeatedly and return the per-call durations."""
+    for _ in range(warmup):
+        if setup:
+            setup()
+        func()
+
+    samples = []
+    for _ in range(iterations):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def load_fixture(blog_type: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, f"{blog_type}.json")) as f:
+        return f.read()
+
+
+def bench_parse(iterations: int) -> dict:
+    """Measure BlogContentParser.parse_blog for every blog type with images stubbed out."""
+    results = {}
+    image_handler = StubImageHandler()
+
+    for blog_type in BLOG_TYPES:
+        blog_content_json = load_fixture(blog_type)
+
+        def run():
+            parser = BlogContentParser(blog_content_json=blog_content_json, blog_type=blog_type,
+                                       category="passive income", openai_handler=image_handler,
+                                       save_path="/tmp/uploads")
+            parser.parse_blog()
+
+        results[blog_type] = summarize(time_calls(run, iterations))
+    return results
+
+
+def make_source_image(path: str, size=(1024, 1024)):
+    """Write a noisy 1024x1024 JPEG so compression has realistic work to do."""
+    from PIL import Image
+
+    width, height = size
+    img = Image.frombytes("RGB", size, os.urandom(width * height * 3))
+    img.save(path, "JPEG", quality=95)
+
+
+def bench_image(iterations: int) -> dict:
+    """Measure compress_image and resize_image_opencv on 1024x1024 inputs."""
+    results = {}
+    work_dir = tempfile.mkdtemp(prefix="blog_bench_")
+    try:
+        source_path = os.path.join(work_dir, "source.jpg")
+        target_path = os.path.join(work_dir, "target.jpg")
+        make_source_image(source_path)
+
+        def reset():
+            shutil.copyfile(source_path, target_path)
+
+        results["compress_image"] = summarize(
+            time_calls(lambda: OpenAIHandler.compress_image(target_path, quality=70), iterations, setup=reset))
+        results["resize_image_opencv"] = summarize(
+            time_calls(lambda: OpenAIHandler.resize_image_opencv(target_path, output_size=(512, 512)), iterations,
+                       setup=reset))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def bench_publish(iterations: int, mysql_config=None, storage: str = "sqlite") -> dict:
+    """Measure the publish sequence main.py runs for every post.
+
+    Runs against MariaDB with mysql_config, otherwise against a temporary SQLite database (storage="sqlite")
+    or the statement-counting StubConnection (storage="stub").
+    """
+    html_content = BlogContentParser(blog_content_json=load_fixture("beginners_guide"), blog_type="beginners_guide",
+                                     category="passive income", openai_handler=StubImageHandler(),
+                                     save_path="/tmp/uploads").parse_blog()[1]
+
+    work_dir = None
+    if mysql_config:
+        backend = "mariadb"
+        handler = MySQLHandler(mysql_config)
+        handler.connect()
+    elif storage == "sqlite":
+        backend = "sqlite"
+        work_dir = tempfile.mkdtemp(prefix="blog_bench_")
+        handler = SQLiteHandler(os.path.join(work_dir, "blog.db"))
+        handler.connect()
+        handler.seed(BLOG_TYPES, categories=1, first_term_id=1)
+    else:
+        backend = "stub"
+        handler = MySQLHandler({})
+        handler.connection = StubConnection()
+
+    month = datetime.now().strftime("%m")
+    year = datetime.now().strftime("%Y")
+
+    def run():
+        post_id = handler.create_blog_post({"title": "Benchmark post", "content": html_content})
+        handler.assign_category_to_post(category_id=1, post_id=post_id)
+        attachment_id = handler.create_image_attachment("benchmark_image.jpg", post_id, month, year)
+        handler.assign_image_to_post(post_id, attachment_id, f"{year}/{month}/benchmark_image.jpg")
+
+    try:
+        samples = time_calls(run, iterations)
+    finally:
+        if backend != "stub":
+            handler.close()
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    result = summarize(samples)
+    result["backend"] = backend
+    return {"publish_post": result}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare_results(current: dict, previous: dict, threshold: float) -> list:
+    """Return (suite, case, previous_ms, current_ms) for cases whose median regressed by more than threshold."""
+    regressions = []
+    for suite, cases in current["suites"].items():
+        for case, stats in cases.items():
+            before = previous.get("suites", {}).get(suite, {}).get(case)
+            if not before:
+                continue
+            if stats["median_ms"] > before["median_ms"] * (1 + threshold):
+                regressions.append((suite, case, before["median_ms"], stats["median_ms"]))
+    return regressions
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark the blog generation pipeline.")
+    arg_parser.add_argument("--suite", choices=["parse", "image", "publish", "all"], default="all")
+    arg_parser.add_argument("--iterations", type=int, default=50)
+    arg_parser.add_argument("--mysql-config", help="JSON file with mysql.connector settings for a local MariaDB")
+    arg_parser.add_argument("--storage", choices=["sqlite", "stub"], default="sqlite",
+                            help="Database for the publish suite without --mysql-config (see storage.py)")
+    arg_parser.add_argument("--output", help="Where to write the results JSON")
+    arg_parser.add_argument("--compare", help="Previous results JSON to check for regressions")
+    arg_parser.add_argument("--threshold", type=float, default=0.10,
+                            help="Allowed median slowdown before a case counts as a regression (default 10%%)")
+    arg_parser.add_argument("--metrics-log", default="off",
+                            help="Where span JSON lines go during the run (default: off, to keep I/O out of the timings)")
+    args = arg_parser.parse_args()
+
+    metrics.configure(log_path=args.metrics_log)
+
+    mysql_config = None
+    if args.mysql_config:
+        with open(args.mysql_config) as f:
+            mysql_config = json.load(f)
+
+    suites = {}
+    with quiet():
+        if args.suite in ("parse", "all"):
+            suites["parse"] = bench_parse(args.iterations)
+        if args.suite in ("image", "all"):
+            suites["image"] = bench_image(args.iterations)
+        if args.suite in ("publish", "all"):
+            suites["publish"] = bench_publish(args.iterations, mysql_config, args.storage)
+
+    commit = git_commit()
+    results = {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "iterations": args.iterations,
+        "suites": suites,
+    }
+
+    output_path = args.output
+    if not output_path:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output_path = os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{commit}.json")
+    with open(output_path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Benchmark results written to {output_path}")
+
+    for suite, cases in suites.items():
+        for case, stats in cases.items():
+            print(f"{suite:8} {case:28} median {stats['median_ms']:9.3f} ms  p95 {stats['p95_ms']:9.3f} ms")
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        regressions = compare_results(results, previous, args.threshold)
+        for suite, case, before, after in regressions:
+            print(f"REGRESSION {suite}/{case}: {before:.3f} ms -> {after:.3f} ms")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import html
 import json
 from typing import Tuple
 from openai_handler import BlogContent, Top10BlogContent, StepByStepGuideContent, ProsAndConsContent, CaseStudyContent, HowToTutorialContent, BeginnersGuideContent, InDepthReviewContent, MythsAndMisconceptionsContent, BenefitsOverviewContent, ExpertOpinionsContent
@@ -5,16 +6,98 @@ import re
 from datetime import datetime
 import os
 
+from metrics import span
+from sites import DEFAULT_BASE_URL
+
+WORDS_PER_MINUTE = 238  # Average silent reading speed for non-fiction
+EXCERPT_WORDS = 55  # WordPress's own excerpt length
+META_DESCRIPTION_LENGTH = 155  # Roughly what search engines show before truncating
+_TAG_RE = re.compile(r"<[^>]+>")
+_HEADING_RE = re.compile(r"(?=<h[23][ >])")
+# Stands in for the inline image when it could not be generated in time; pipeline.backfill_images replaces it
+PENDING_IMAGE_FRAGMENT = "<!--inline-image-pending-->"
+
+
+def inline_image_fragment(base_url: str, image_path: str) -> str:
+    """HTML of the inline image stored at image_path ("YYYY/MM/file.jpg") under the uploads root."""
+    return f'<img alt="" class="size-medium wp-image-2256 aligncenter" src="{base_url.rstrip("/")}/wp-content/uploads/{image_path}"/>'
+
+
+def plain_text(html_content: str) -> str:
+    """Text of an HTML fragment with tags removed and whitespace collapsed."""
+    return " ".join(html.unescape(_TAG_RE.sub(" ", html_content or "")).split())
+
+
+def split_sections(html_content: str):
+    """Split post HTML before each <h2>/<h3>; the first item is whatever precedes the first heading."""
+    return _HEADING_RE.split(html_content)
+
+
+def truncate_words(text: str, limit: int, suffix: str = "") -> str:
+    """Cut text at a word boundary so it is at most `limit` characters long, suffix included."""
+    if len(text) <= limit:
+        return text
+    cut = text[:limit - len(suffix)].rsplit(" ", 1)[0].rstrip(" ,;:-")
+    return cut + suffix
+
+
+def build_summary(html_content: str, intro: str = None) -> dict:
+    """Precompute what WordPress and SEO plugins would otherwise derive from post_content per request.
+
+    Without the intro, the text before <!--more--> is used.
+    """
+    intro_text = plain_text(intro) or plain_text(html_content.split("<!--more-->")[0])
+    words = plain_text(html_content).split()
+
+    excerpt_words = intro_text.split()
+    excerpt = " ".join(excerpt_words[:EXCERPT_WORDS])
+    if len(excerpt_words) > EXCERPT_WORDS:
+        excerpt += " [&hellip;]"
+
+    return {
+        "excerpt": excerpt,
+        "word_count": len(words),
+        "reading_time": max(1, round(len(words) / WORDS_PER_MINUTE)),
+        "meta_description": truncate_words(intro_text, META_DESCRIPTION_LENGTH, "…"),
+    }
+
 class BlogContentParser:
-    def __init__(self, blog_content_json: str, blog_type: str, category: str, openai_handler, save_path: str):
+    def __init__(self, blog_content_json: str, blog_type: str, category: str, openai_handler, save_path: str,
+                 base_url: str = DEFAULT_BASE_URL, image_fragment: str = None, link_index=None, link_terms=(),
+                 max_links: int = 3, image_path: str = None):
         self.blog_content_json = blog_content_json
         self.blog_type = blog_type
         self.category = category
         self.openai_handler = openai_handler
         self.save_path = save_path
+        self.base_url = base_url.rstrip("/")
+        # Inline image HTML; pass one in to reuse an image already generated for this post
+        self.image_fragment = image_fragment
+        # Inline image as "YYYY/MM/file.jpg" under the uploads root; pass one in to render an existing image
+        self.image_path = image_path
+        self.image_prompt = None
+        # Related published posts are linked from a list before the conclusion (see link_index.py)
+        self.link_index = link_index
+        self.link_terms = list(link_terms)
+        self.max_links = max_links
+        # Excerpt, word count, reading time and meta description of the last parse (see build_summary)
+        self.summary = {}
 
     def parse_blog(self) -> Tuple[str, str]:
         """Parse the blog content based on the blog type."""
+        with span("parser.parse_blog", blog_type=self.blog_type):
+            title, html_content = self.render_blog()
+            if self.link_index is not None:
+                html_content = self.add_internal_links(title, html_content)
+            self.summary = self.build_summary(html_content)
+            return title, html_content
+
+    def build_summary(self, html_content: str) -> dict:
+        """Summary of the rendered post, from the intro field of the JSON (see build_summary)."""
+        return build_summary(html_content, json.loads(self.blog_content_json).get("intro") or "")
+
+    def render_blog(self) -> Tuple[str, str]:
+        """Dispatch to the parser for the blog type."""
         if self.blog_type == "top_10_list":
             return self.parse_top_10_blog()
         elif self.blog_type == "step_by_step_guide":
@@ -128,30 +211,56 @@ class BlogContentParser:
         return html_content
 
     def get_image_and_resize(self, prompt: str) -> str:
-        """Generate an image using OpenAI, resize it, and return an HTML fragment."""
-        # Get current month and year
-        current_month = datetime.now().strftime("%m")
-        current_year = datetime.now().strftime("%Y")
-
-        # Generate the image
-        image_path = self.openai_handler.generate_image(prompt, self.save_path, current_month, current_year)
-
-        # If image generation fails, return a placeholder or error message
-        if not image_path:
-            return '<p>Image could not be generated.</p>'
-
-        # Resize the image using OpenAIHandler's resize_image_opencv function
-        self.openai_handler.resize_image_opencv(image_path, output_size=(512, 512))
-        file_name = os.path.basename(image_path)
-        final_path = os.path.join(current_year, current_month, file_name)
-
-        # Extract relative path for HTML (excluding the root save path)
-        # relative_image_path = os.path.relpath(resized_image_path, self.save_path)
+        """Generate the inline image at its published size and return an HTML fragment."""
+        if self.image_fragment is not None:
+            return self.image_fragment
+
+        self.image_prompt = prompt
+        if self.image_path is None:
+            # Get current month and year
+            current_month = datetime.now().strftime("%m")
+            current_year = datetime.now().strftime("%Y")
+
+            # Generate the image
+            with span("parser.inline_image", blog_type=self.blog_type):
+                image_path = self.openai_handler.generate_image(prompt, self.save_path, current_month, current_year,
+                                                                profile="inline")
+
+            # If image generation fails or runs out of time, publish without it; the image is backfilled later.
+            # The placeholder is kept as the fragment so retries and locale variants reuse it instead of
+            # generating images of their own
+            if not image_path:
+                self.image_fragment = PENDING_IMAGE_FRAGMENT
+                return PENDING_IMAGE_FRAGMENT
+
+            # The inline profile already produces 512x512 (see IMAGE_PROFILES)
+            file_name = os.path.basename(image_path)
+            self.image_path = os.path.join(current_year, current_month, file_name)
 
         # Construct and return the HTML fragment with the image URL
-        html_fragment = f'<img alt="" class="size-medium wp-image-2256 aligncenter" src="https://chillandearn.com/wp-content/uploads/{final_path}"/>'
+        html_fragment = inline_image_fragment(self.base_url, self.image_path)
+        self.image_fragment = html_fragment
         return html_fragment
 
+    def add_internal_links(self, title: str, html_content: str) -> str:
+        """Insert a list of links to related published posts before the conclusion."""
+        with span("parser.internal_links", blog_type=self.blog_type) as links_span:
+            related = self.link_index.related(title, self.link_terms, limit=self.max_links)
+            links_span.set(links=len(related))
+        if not related:
+            return html_content
+
+        links_html = "<h2>Related Posts</h2>\n<ul>\n"
+        for post_id, related_title in related:
+            links_html += f'<li><a href="{self.base_url}/?p={post_id}">{html.escape(related_title)}</a></li>\n'
+        links_html += "</ul>\n"
+
+        # Conclusions use <h2> in most layouts and <h3> in the general/top 10 layout
+        position = max(html_content.rfind("<h2>Conclusion</h2>"), html_content.rfind("<h3>Conclusion</h3>"))
+        if position == -1:
+            return html_content + links_html
+        return html_content[:position] + links_html + html_content[position:]
+
 # HELPERS END
 
 # TOP 10 START
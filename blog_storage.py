@@ -0,0 +1,133 @@
+# blog_storage.py
+# The storage interface the pipeline, the worker and the maintenance commands are written against.
+#
+# - MySQLHandler (mysql_handler.py): WordPress on MariaDB, used in production.
+# - SQLiteHandler (storage.py):      the same WordPress subset in one SQLite file, for load tests,
+#                                    benchmarks and the test suite.
+#
+# Arguments and return values are those of MySQLHandler; see its methods for the details. Every method
+# handles its own transaction, and on a database error reports it and returns the "nothing done" value
+# (None, [], 0 or False) instead of raising.
+from abc import ABC, abstractmethod
+
+
+class BlogStorage(ABC):
+    """A WordPress database as the pipeline uses it. Implementations set `base_url` (the site URL)."""
+
+    base_url: str
+
+    @abstractmethod
+    def connect(self):
+        """Open the connection (or borrow one from the pool)."""
+
+    @abstractmethod
+    def close(self):
+        """Close the connection (or hand it back to the pool)."""
+
+    # Term and template rotation
+
+    @abstractmethod
+    def get_next_unprocessed_term(self):
+        """(term_id, name, z_category_description) of the next term not used in this cycle, or Nones."""
+
+    @abstractmethod
+    def update_term_processed(self, term_id: int):
+        """Mark a term as used in the current cycle."""
+
+    @abstractmethod
+    def get_blog_template(self, z_category_description):
+        """(blog_type, user_prompt) of a random template not used in this cycle, or (None, None)."""
+
+    @abstractmethod
+    def mark_blog_type_as_taken(self, blog_type: str):
+        """Mark a blog type's templates as used in the current cycle."""
+
+    # Publishing
+
+    @abstractmethod
+    def create_blog_post(self, blog_content):
+        """Insert a post from {"title", "content", "status", "summary", "meta"}. Returns its ID or None."""
+
+    @abstractmethod
+    def assign_category_to_post(self, category_id, post_id, published: bool = True):
+        """Put a post in a category; published posts are counted in the category right away."""
+
+    @abstractmethod
+    def create_image_attachment(self, image_name: str, post_id: int, month: str, year: str):
+        """Insert the attachment row of an uploaded image. Returns its ID or None."""
+
+    @abstractmethod
+    def assign_image_to_post(self, post_id: int, post_attachment_id: int, image_path: str):
+        """Make an attachment the post's featured image."""
+
+    @abstractmethod
+    def create_post_variants(self, variants, category_id, image=None, status: str = "publish"):
+        """Insert the locale variants of one post in one transaction. Returns their IDs or []."""
+
+    # Publish buffer
+
+    @abstractmethod
+    def add_to_publish_buffer(self, post_id: int):
+        """Queue a finished draft for the scheduled publisher."""
+
+    @abstractmethod
+    def count_buffered_posts(self) -> int:
+        """Number of drafts waiting in the publish buffer."""
+
+    @abstractmethod
+    def publish_buffered_posts(self, limit: int = 1):
+        """Publish the oldest buffered drafts with their variants. Returns the IDs taken from the buffer."""
+
+    # Image backfill
+
+    @abstractmethod
+    def queue_image_backfill(self, post_id: int, kind: str, prompt: str):
+        """Queue an image ("inline" or "featured") a post was published without."""
+
+    @abstractmethod
+    def claim_image_backfills(self, limit: int = 5):
+        """Lease up to `limit` queued images. Returns [(post_id, kind, prompt), ...]."""
+
+    @abstractmethod
+    def complete_inline_backfill(self, post_id: int, fragment: str, image_path: str, placeholder: str) -> bool:
+        """Put a backfilled inline image in place of its placeholder in the post group, and dequeue it."""
+
+    @abstractmethod
+    def complete_featured_backfill(self, post_id: int, image_name: str, month: str, year: str,
+                                   image_path: str) -> bool:
+        """Attach a backfilled featured image to the post group, and dequeue it."""
+
+    # Reads and rewrites of published posts
+
+    @abstractmethod
+    def get_post(self, post_id: int):
+        """(post_title, post_content) of a post, or (None, None)."""
+
+    @abstractmethod
+    def fetch_posts_since(self, last_post_id: int, limit: int = 500):
+        """(ID, post_title, post_content) of posts after last_post_id, oldest first."""
+
+    @abstractmethod
+    def fetch_post_titles_since(self, last_post_id: int, limit: int = 500):
+        """(ID, post_title, category names joined by '|') of published posts after last_post_id."""
+
+    @abstractmethod
+    def fetch_post_titles(self, post_ids):
+        """(ID, post_title, category names joined by '|') of the given posts."""
+
+    @abstractmethod
+    def fetch_stale_posts(self, days: int, per_category: int = 1, limit: int = 20):
+        """(ID, post_title, post_content, term_id, refreshed sections) of posts not modified for `days` days."""
+
+    @abstractmethod
+    def update_post_content(self, post_id: int, post_content: str = None, summary: dict = None,
+                            refreshed_sections: str = None) -> bool:
+        """Write a refreshed post and its rewritten sections (or only stamp post_modified)."""
+
+    @abstractmethod
+    def fetch_raw_contents(self, last_post_id: int, limit: int = 500, blog_type: str = None):
+        """Posts with stored raw content after last_post_id, for rerender.py."""
+
+    @abstractmethod
+    def update_post_contents(self, contents) -> bool:
+        """Write post_id -> post_content for a batch of re-rendered posts."""
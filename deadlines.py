@@ -0,0 +1,61 @@
+# deadlines.py
+# Time budget for one post, split across the pipeline's stages, with cooperative cancellation.
+#
+#   deadline = Deadline(300)                       # five minutes for the whole post
+#   generate_and_publish(job, ..., deadline=deadline)
+#
+# Stages run in STAGES order. Each gets the time that is left minus what is reserved for the stages after
+# it, so a fast stage hands its unused time on and a slow one cannot eat the budget of the next. The
+# timeout of a stage is passed down to the OpenAI client and the image download, which abort the HTTP
+# call; check() between steps stops work that can no longer finish in time. cancel() makes every later
+# check fail, e.g. to abandon the section expansions of an outline once one of them timed out.
+import threading
+import time
+
+# (stage, share of the budget), in the order a post goes through them
+STAGES = (
+    ("generate", 0.5),  # Chat completions: the post, or its outline and sections
+    ("inline_image", 0.15),
+    ("translate", 0.2),  # Locale variants; its reserve passes to the featured image when there are none
+    ("featured_image", 0.15),
+)
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, stage: str):
+        super().__init__(f"Deadline exceeded in stage '{stage}'")
+        self.stage = stage
+
+
+class Deadline:
+    def __init__(self, budget: float, stages=STAGES):
+        self.budget = budget
+        self.stages = [name for name, share in stages]
+        self.shares = dict(stages)
+        self.started = time.monotonic()
+        self._cancelled = threading.Event()
+
+    def remaining(self) -> float:
+        return self.budget - (time.monotonic() - self.started)
+
+    def timeout(self, stage: str) -> float:
+        """Seconds the next call of `stage` may take; 0 once the stage's time is used up."""
+        if self._cancelled.is_set():
+            return 0.0
+        reserved = 0.0
+        if stage in self.stages:
+            later = self.stages[self.stages.index(stage) + 1:]
+            reserved = self.budget * sum(self.shares[name] for name in later)
+        return max(0.0, self.remaining() - reserved)
+
+    def check(self, stage: str):
+        """Raise DeadlineExceeded if `stage` has no time left or the post was cancelled."""
+        if self.timeout(stage) <= 0:
+            raise DeadlineExceeded(stage)
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
@@ -0,0 +1,249 @@
+# dedup_index.py
+# Near-duplicate detection over published posts with MinHash signatures and LSH banding.
+#
+#   python dedup_index.py build --config db.json --index dedup.idx     # incremental from wp_posts
+#   python dedup_index.py check --index dedup.idx --post-id 1234       # similar posts for one post
+#
+# Lookups only compare against posts that share at least one LSH band, so the cost stays in the
+# milliseconds with 100k+ posts. The index is a snapshot file plus an append-only log of posts added
+# since, so recording a new post is a small append rather than rewriting the snapshot. Workers sharing an
+# index file lock <index>.lock around every read and write, and a save first merges in what other
+# processes appended or compacted.
+import argparse
+import fcntl
+import html
+import json
+import os
+import re
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+
+import numpy as np
+
+from mysql_handler import MySQLHandler
+
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS  # 4 rows: candidates from ~0.5 similarity upward
+SHINGLE_SIZE = 5
+DEFAULT_THRESHOLD = 0.8
+MERSENNE_PRIME = (1 << 31) - 1
+COMPACT_AFTER = 1000  # Fold the log into the snapshot after this many appended posts
+
+# Fixed seed so signatures stay comparable across processes and restarts
+_rng = np.random.RandomState(20250101)
+_PERM_A = _rng.randint(1, MERSENNE_PRIME, size=NUM_PERMUTATIONS).astype(np.uint64)
+_PERM_B = _rng.randint(0, MERSENNE_PRIME, size=NUM_PERMUTATIONS).astype(np.uint64)
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def post_text(title: str, content: str) -> str:
+    """Plain text of a post: title plus HTML content without tags and entities."""
+    return f"{title} {html.unescape(_TAG_RE.sub(' ', content or ''))}"
+
+
+def shingles(text: str) -> np.ndarray:
+    """Hashes of the overlapping word n-grams of a text."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        words = words + [""] * (SHINGLE_SIZE - len(words))
+    # crc32 is stable across processes, unlike hash()
+    hashes = {zlib.crc32(" ".join(words[i:i + SHINGLE_SIZE]).encode("utf-8"))
+              for i in range(len(words) - SHINGLE_SIZE + 1)}
+    return np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+
+
+def minhash(text: str) -> np.ndarray:
+    """MinHash signature of a text (NUM_PERMUTATIONS uint32 values)."""
+    values = shingles(text)
+    # (a * x + b) mod p for every permutation and shingle; x < 2^32 and a < 2^31, so uint64 cannot overflow
+    hashed = (np.outer(values, _PERM_A) + _PERM_B) % MERSENNE_PRIME
+    return hashed.min(axis=0).astype(np.uint32)
+
+
+def band_keys(signature: np.ndarray):
+    """One bucket key per LSH band."""
+    rows = signature.reshape(BANDS, ROWS_PER_BAND)
+    return [zlib.crc32(row.tobytes()) for row in rows]
+
+
+class DedupIndex:
+    def __init__(self, path: str = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self.post_ids = np.zeros(0, dtype=np.int64)
+        self.signatures = np.zeros((0, NUM_PERMUTATIONS), dtype=np.uint32)
+        self.size = 0
+        self.buckets = [{} for _ in range(BANDS)]  # band -> bucket key -> [row, ...]
+        self.rows = {}  # post_id -> row
+        self.last_post_id = 0  # Watermark for incremental builds from wp_posts
+        self._logged = 0
+
+    @classmethod
+    def load(cls, path: str):
+        """Load the snapshot and replay the log; a missing file gives an empty index."""
+        index = cls(path)
+        with index._file_lock():
+            index._merge_files()
+        return index
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock on <path>.lock, held around every read and write of the snapshot and the log.
+
+        Several workers share one index file; without it a save could delete records another process
+        appended after it read the log.
+        """
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _merge_files(self):
+        """Add the posts in the snapshot and the log on disk that are not in memory yet."""
+        if os.path.exists(self.path):
+            # Plain arrays only: loading never executes code from the file
+            with open(self.path, "rb") as f, np.load(f, allow_pickle=False) as state:
+                for post_id, signature in zip(state["post_ids"], state["signatures"]):
+                    self._add(int(post_id), signature)
+                self.last_post_id = max(self.last_post_id, int(state["last_post_id"]))
+
+        log_path = f"{self.path}.log"
+        if os.path.exists(log_path):
+            record_size = 8 + NUM_PERMUTATIONS * 4
+            with open(log_path, "rb") as f:
+                data = f.read()
+            # A crash mid-append can leave a partial record at the end; ignore it
+            for offset in range(0, len(data) - record_size + 1, record_size):
+                (post_id,) = struct.unpack_from("<q", data, offset)
+                signature = np.frombuffer(data, dtype=np.uint32, count=NUM_PERMUTATIONS, offset=offset + 8)
+                self._add(post_id, signature)
+                self.last_post_id = max(self.last_post_id, post_id)
+                self._logged += 1
+
+    def save(self):
+        """Write a snapshot and clear the log."""
+        if not self.path:
+            return
+        with self._lock, self._file_lock():
+            # Other processes append to the same log and compact it too: keep what they wrote
+            self._merge_files()
+            tmp_path = f"{self.path}.tmp"
+            # Written through a file object so numpy does not append ".npz" to the name
+            with open(tmp_path, "wb") as f:
+                np.savez(f, post_ids=self.post_ids[:self.size], signatures=self.signatures[:self.size],
+                         last_post_id=np.int64(self.last_post_id))
+            os.replace(tmp_path, self.path)
+            if os.path.exists(f"{self.path}.log"):
+                os.remove(f"{self.path}.log")
+            self._logged = 0
+
+    def _append_log(self, post_id: int, signature: np.ndarray):
+        with self._file_lock(), open(f"{self.path}.log", "ab") as f:
+            f.write(struct.pack("<q", post_id) + signature.astype(np.uint32).tobytes())
+        self._logged += 1
+
+    def __len__(self):
+        return self.size
+
+    def _add(self, post_id: int, signature: np.ndarray):
+        if post_id in self.rows:
+            return
+        if self.size == len(self.post_ids):
+            # Grow geometrically so appends stay amortised O(1)
+            capacity = max(1024, self.size * 2)
+            self.post_ids = np.resize(self.post_ids, capacity)
+            signatures = np.zeros((capacity, NUM_PERMUTATIONS), dtype=np.uint32)
+            signatures[:self.size] = self.signatures[:self.size]
+            self.signatures = signatures
+
+        row = self.size
+        self.post_ids[row] = post_id
+        self.signatures[row] = signature
+        self.rows[post_id] = row
+        self.size += 1
+        for band, key in enumerate(band_keys(signature)):
+            self.buckets[band].setdefault(key, []).append(row)
+
+    def add(self, post_id: int, title: str, content: str, log: bool = True):
+        """Index a newly published post.
+
+        With log=False the post is only added in memory; bulk builds use this and call save() once.
+        """
+        signature = minhash(post_text(title, content))
+        with self._lock:
+            self._add(post_id, signature)
+            self.last_post_id = max(self.last_post_id, post_id)
+            if log and self.path:
+                self._append_log(post_id, signature)
+        if self.path and self._logged >= COMPACT_AFTER:
+            self.save()
+
+    def find_similar(self, title: str, content: str, threshold: float = DEFAULT_THRESHOLD):
+        """Return [(post_id, estimated_similarity), ...] at or above threshold, most similar first."""
+        signature = minhash(post_text(title, content))
+        with self._lock:
+            candidates = set()
+            for band, key in enumerate(band_keys(signature)):
+                candidates.update(self.buckets[band].get(key, ()))
+            if not candidates:
+                return []
+            rows = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            # Fraction of matching MinHash values estimates the Jaccard similarity of the shingle sets
+            similarities = (self.signatures[rows] == signature).mean(axis=1)
+            post_ids = self.post_ids[rows]
+
+        matches = [(int(post_id), float(similarity)) for post_id, similarity in zip(post_ids, similarities)
+                   if similarity >= threshold]
+        return sorted(matches, key=lambda match: match[1], reverse=True)
+
+    def is_duplicate(self, title: str, content: str, threshold: float = DEFAULT_THRESHOLD) -> bool:
+        return bool(self.find_similar(title, content, threshold))
+
+    def update_from_db(self, db_handler, batch_size: int = 500) -> int:
+        """Index posts newer than the watermark and save. Returns how many were added."""
+        added = 0
+        while True:
+            rows = db_handler.fetch_posts_since(self.last_post_id, batch_size)
+            for post_id, title, content in rows:
+                self.add(post_id, title, content, log=False)
+                added += 1
+            if len(rows) < batch_size:
+                break
+        if added:
+            self.save()
+        return added
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Maintain the near-duplicate index of published posts.")
+    arg_parser.add_argument("command", choices=["build", "check"])
+    arg_parser.add_argument("--config", required=True, help="JSON file with mysql.connector settings")
+    arg_parser.add_argument("--index", default="dedup.idx", help="Index file")
+    arg_parser.add_argument("--post-id", type=int, help="Post to check (check)")
+    arg_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = arg_parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+
+    db_handler = MySQLHandler(config)
+    db_handler.connect()
+    dedup_index = DedupIndex.load(args.index)
+    try:
+        if args.command == "build":
+            added = dedup_index.update_from_db(db_handler)
+            print(f"Indexed {added} new posts; {len(dedup_index)} posts in the index.")
+        else:
+            title, content = db_handler.get_post(args.post_id)
+            for post_id, similarity in dedup_index.find_similar(title, content, args.threshold):
+                if post_id != args.post_id:
+                    print(f"Post ID {post_id}: similarity {similarity:.2f}")
+    finally:
+        db_handler.close()
@@ -0,0 +1,254 @@
+# link_index.py
+# Inverted index of published post titles and category names, used to add internal links to new posts.
+#
+#   python link_index.py build --config db.json --index links.idx
+#   python link_index.py query --index links.idx --title "Passive income with dividend ETFs"
+#
+# Tokens are mapped to integer ids and each posting list is an array('I') of document numbers, so
+# 100k posts take a few MB. New posts are added after create_blog_post (and appended to a log file),
+# so rendering never scans wp_posts. Workers sharing an index file lock <index>.lock around every read
+# and write, and a save first merges in what other processes appended or compacted.
+#
+# The snapshot is one line of JSON (vocabulary, titles, watermark and posting lengths) followed by the
+# post ids and the concatenated posting lists as raw arrays.
+import argparse
+import fcntl
+import json
+import math
+import os
+import re
+import threading
+from array import array
+from contextlib import contextmanager
+
+from mysql_handler import MySQLHandler
+
+STOPWORDS = set("""
+a an and are as at be best by can do does for from guide how in into is it its of on or that the their this
+to top vs what when why with without you your ways tips 10 step steps beginners beginner review overview
+""".split())
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+COMPACT_AFTER = 1000  # Fold the log into the snapshot after this many appended posts
+
+
+def tokenize(text: str):
+    """Lowercased words of a title or term name, without stopwords and duplicates."""
+    seen = []
+    for word in _WORD_RE.findall((text or "").lower()):
+        if word not in STOPWORDS and len(word) > 1 and word not in seen:
+            seen.append(word)
+    return seen
+
+
+class LinkIndex:
+    def __init__(self, path: str = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self.vocabulary = {}  # token -> token id
+        self.postings = []  # token id -> array('I') of document numbers
+        self.post_ids = array("Q")  # document number -> post_id
+        self.titles = []  # document number -> title (anchor text)
+        self.documents = {}  # post_id -> document number
+        self.last_post_id = 0  # Watermark for incremental builds from wp_posts
+        self._logged = 0
+
+    def __len__(self):
+        return len(self.post_ids)
+
+    @classmethod
+    def load(cls, path: str):
+        """Load the snapshot and replay the log; a missing file gives an empty index."""
+        index = cls(path)
+        with index._file_lock():
+            index._merge_files()
+        return index
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock on <path>.lock, held around every read and write of the snapshot and the log.
+
+        Several workers share one index file; without it a save could delete log lines another process
+        appended after it read the log.
+        """
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _merge_files(self):
+        """Add the posts in the snapshot and the log on disk that are not in memory yet."""
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                header = json.loads(f.readline())
+                post_ids = array("Q")
+                post_ids.fromfile(f, len(header["titles"]))
+                numbers = array("I")
+                numbers.fromfile(f, sum(header["posting_lengths"]))
+            if not self.post_ids:
+                # Fresh index: take the snapshot's arrays as they are
+                self.vocabulary = {token: token_id for token_id, token in enumerate(header["tokens"])}
+                offset = 0
+                for length in header["posting_lengths"]:
+                    self.postings.append(numbers[offset:offset + length])
+                    offset += length
+                self.post_ids = post_ids
+                self.titles = header["titles"]
+                self.documents = {post_id: number for number, post_id in enumerate(post_ids)}
+            else:
+                # Posts another process compacted into the snapshot since this one loaded it
+                document_tokens = [[] for _ in post_ids]
+                offset = 0
+                for token, length in zip(header["tokens"], header["posting_lengths"]):
+                    for number in numbers[offset:offset + length]:
+                        document_tokens[number].append(token)
+                    offset += length
+                for number, post_id in enumerate(post_ids):
+                    self._add_document(post_id, header["titles"][number], document_tokens[number])
+            self.last_post_id = max(self.last_post_id, header["last_post_id"])
+
+        log_path = f"{self.path}.log"
+        if os.path.exists(log_path):
+            with open(log_path) as f:
+                for line in f:
+                    try:
+                        post_id, title, term_names = json.loads(line)
+                    except ValueError:
+                        # A crash mid-append can leave a partial last line
+                        continue
+                    self._add(post_id, title, term_names)
+                    self._logged += 1
+
+    def save(self):
+        """Write a snapshot and clear the log."""
+        if not self.path:
+            return
+        with self._lock, self._file_lock():
+            # Other processes append to the same log and compact it too: keep what they wrote
+            self._merge_files()
+            header = {
+                "tokens": sorted(self.vocabulary, key=self.vocabulary.get),  # Token ids are list positions
+                "titles": self.titles,
+                "last_post_id": self.last_post_id,
+                "posting_lengths": [len(posting) for posting in self.postings],
+            }
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "wb") as f:
+                # ensure_ascii keeps the header on one line whatever the titles contain
+                f.write(json.dumps(header, ensure_ascii=True).encode("ascii") + b"\n")
+                self.post_ids.tofile(f)
+                for posting in self.postings:
+                    posting.tofile(f)
+            os.replace(tmp_path, self.path)
+            if os.path.exists(f"{self.path}.log"):
+                os.remove(f"{self.path}.log")
+            self._logged = 0
+
+    def _token_id(self, token: str) -> int:
+        token_id = self.vocabulary.get(token)
+        if token_id is None:
+            token_id = len(self.postings)
+            self.vocabulary[token] = token_id
+            self.postings.append(array("I"))
+        return token_id
+
+    def _add(self, post_id: int, title: str, term_names):
+        tokens = tokenize(title)
+        for term_name in term_names:
+            tokens.extend(token for token in tokenize(term_name) if token not in tokens)
+        self._add_document(post_id, title, tokens)
+
+    def _add_document(self, post_id: int, title: str, tokens):
+        if post_id in self.documents:
+            return
+        number = len(self.post_ids)
+        self.post_ids.append(post_id)
+        self.titles.append(title)
+        self.documents[post_id] = number
+        for token in tokens:
+            self.postings[self._token_id(token)].append(number)
+        self.last_post_id = max(self.last_post_id, post_id)
+
+    def add(self, post_id: int, title: str, term_names=(), log: bool = True):
+        """Index a newly published post with the names of its categories."""
+        term_names = list(term_names)
+        with self._lock:
+            self._add(post_id, title, term_names)
+            if log and self.path:
+                with self._file_lock(), open(f"{self.path}.log", "a") as f:
+                    f.write(json.dumps([post_id, title, term_names]) + "\n")
+                self._logged += 1
+        if self.path and self._logged >= COMPACT_AFTER:
+            self.save()
+
+    def related(self, title: str, term_names=(), limit: int = 3, exclude=()):
+        """Return [(post_id, title), ...] of the posts sharing the most informative words."""
+        query_tokens = tokenize(title)
+        for term_name in term_names:
+            query_tokens.extend(token for token in tokenize(term_name) if token not in query_tokens)
+
+        with self._lock:
+            total = len(self.post_ids)
+            scores = {}
+            for token in query_tokens:
+                token_id = self.vocabulary.get(token)
+                if token_id is None:
+                    continue
+                posting = self.postings[token_id]
+                # Rare words say more about relatedness than words every post shares
+                idf = math.log(1 + total / len(posting))
+                for number in posting:
+                    scores[number] = scores.get(number, 0.0) + idf
+
+            excluded = set(exclude)
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+            results = []
+            for number, score in ranked:
+                post_id = self.post_ids[number]
+                if post_id in excluded or self.titles[number] == title:
+                    continue
+                results.append((post_id, self.titles[number]))
+                if len(results) == limit:
+                    break
+        return results
+
+    def update_from_db(self, db_handler, batch_size: int = 500) -> int:
+        """Index posts newer than the watermark and save. Returns how many were added."""
+        added = 0
+        while True:
+            rows = db_handler.fetch_post_titles_since(self.last_post_id, batch_size)
+            for post_id, title, term_names in rows:
+                self.add(post_id, title, term_names.split("|") if term_names else [], log=False)
+                added += 1
+            if len(rows) < batch_size:
+                break
+        if added:
+            self.save()
+        return added
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Maintain the internal-link index of published posts.")
+    arg_parser.add_argument("command", choices=["build", "query"])
+    arg_parser.add_argument("--config", help="JSON file with mysql.connector settings (build)")
+    arg_parser.add_argument("--index", default="links.idx", help="Index file")
+    arg_parser.add_argument("--title", help="Title to find related posts for (query)")
+    arg_parser.add_argument("--limit", type=int, default=5)
+    args = arg_parser.parse_args()
+
+    link_index = LinkIndex.load(args.index)
+    if args.command == "build":
+        with open(args.config) as f:
+            config = json.load(f)
+        db_handler = MySQLHandler(config)
+        db_handler.connect()
+        try:
+            added = link_index.update_from_db(db_handler)
+        finally:
+            db_handler.close()
+        print(f"Indexed {added} new posts; {len(link_index)} posts in the index.")
+    else:
+        for post_id, title in link_index.related(args.title, limit=args.limit):
+            print(f"Post ID {post_id}: {title}")
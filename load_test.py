@@ -0,0 +1,216 @@
+# load_test.py
+# Offline end-to-end load test of the main.py flow (generate, render, image pipeline, publish).
+#
+#   python load_test.py --posts 2000 --concurrency 16 --latency-scale 0.01
+#   python load_test.py --backend replay --cassettes cassettes/ --posts 500
+#   python load_test.py --posts 20 --concurrency 1 --profile profiles/   (see profiling.py)
+#   python load_test.py --storage stub --posts 2000                      (no database, SQL counted only)
+#   python load_test.py --tokens-per-second 60 --outline all             (outline-first vs one completion)
+#   python load_test.py --invalid-rate 0.2                                (field-level repair of bad responses)
+#   python load_test.py --deadline 30 --image-latency lognormal:20,0.5    (images left for backfill)
+#
+# OpenAI calls are served by SyntheticBackend or ReplayBackend (see openai_backends.py) and storage by a
+# temporary SQLite database (see storage.py), so nothing touches the network. With SQLite every post
+# claims its term and template from the database like the worker does, on its own connection. Record cassettes from real runs
+# by constructing OpenAIHandler with RecordingBackend("cassettes/", LiveBackend(api_key)).
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+
+from pydantic import ValidationError
+
+import metrics
+from benchmark import RESULTS_DIR, StubConnection, git_commit, quiet, summarize
+from deadlines import Deadline, DeadlineExceeded
+from mysql_handler import MySQLHandler
+from openai_backends import HedgedBackend, LatencyModel, ReplayBackend, SyntheticBackend
+from openai_handler import BLOG_TYPES, OUTLINE_MAX_WORKERS, OpenAIHandler
+from pipeline import claim_next_job, generate_and_publish
+from profiling import Profiler
+from routing import ModelRouter
+from storage import SQLiteHandler
+from usage_ledger import UsageLedger
+
+
+def make_backend(args):
+    synthetic = SyntheticBackend(
+        chat_latency=LatencyModel.from_spec(args.chat_latency, args.latency_scale),
+        image_latency=LatencyModel.from_spec(args.image_latency, args.latency_scale),
+        download_latency=LatencyModel.from_spec(args.download_latency, args.latency_scale),
+        image_path=args.image,
+        seed=args.seed,
+        tokens_per_second=args.tokens_per_second / args.latency_scale if args.tokens_per_second else None,
+        invalid_rate=args.invalid_rate,
+    )
+    backend = synthetic
+    if args.backend == "replay":
+        backend = ReplayBackend(args.cassettes, match="schema", fallback=synthetic)
+    if args.hedge_percentile:
+        backend = HedgedBackend(backend, percentile=args.hedge_percentile, budget_per_hour=args.hedge_budget,
+                                max_workers=2 * args.concurrency * OUTLINE_MAX_WORKERS)
+    return backend
+
+
+def make_job(index: int) -> dict:
+    blog_type = BLOG_TYPES[index % len(BLOG_TYPES)]
+    category = f"passive income topic {index % 50}"
+    return {
+        "term_id": 89 + index % 50,
+        "name": category,
+        "category": category,
+        "blog_type": blog_type,
+        "user_prompt": f"Write a {blog_type.replace('_', ' ')} blog post about {category}.",
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Offline end-to-end load test of the publishing pipeline.")
+    arg_parser.add_argument("--posts", type=int, default=200)
+    arg_parser.add_argument("--concurrency", type=int, default=8)
+    arg_parser.add_argument("--backend", choices=["synthetic", "replay"], default="synthetic")
+    arg_parser.add_argument("--cassettes", default="cassettes", help="Cassette directory for --backend replay")
+    arg_parser.add_argument("--chat-latency", default="lognormal:15,0.5", help="Seconds, e.g. lognormal:15,0.5")
+    arg_parser.add_argument("--image-latency", default="lognormal:10,0.4")
+    arg_parser.add_argument("--download-latency", default="lognormal:0.5,0.5")
+    arg_parser.add_argument("--latency-scale", type=float, default=1.0,
+                            help="Multiply every simulated latency, e.g. 0.01 for a quick run")
+    arg_parser.add_argument("--tokens-per-second", type=float,
+                            help="Add output length / this rate to every chat latency, e.g. 60")
+    arg_parser.add_argument("--outline", help="Generate these blog types outline-first, e.g. beginners_guide or all")
+    arg_parser.add_argument("--invalid-rate", type=float, default=0.0,
+                            help="Share of chat responses with a missing, mistyped or cut-off field")
+    arg_parser.add_argument("--image", help="Local JPEG to serve as every generated image")
+    arg_parser.add_argument("--seed", type=int, default=1)
+    arg_parser.add_argument("--hedge-percentile", type=float,
+                            help="Hedge OpenAI calls slower than this latency percentile, e.g. 0.95")
+    arg_parser.add_argument("--hedge-budget", type=int, default=1000, help="Hedged requests allowed per hour")
+    arg_parser.add_argument("--locales", help="Publish every post in these languages, e.g. en,de,es")
+    arg_parser.add_argument("--storage", choices=["sqlite", "stub"], default="sqlite",
+                            help="SQLite stand-in for WordPress, or a stub that only counts statements")
+    arg_parser.add_argument("--deadline", type=float,
+                            help="Seconds per post, before --latency-scale, split across stages (see deadlines.py)")
+    arg_parser.add_argument("--output", help="Where to write the results JSON")
+    arg_parser.add_argument("--profile", metavar="DIR", help="Write CPU/allocation profiles and a trace to DIR")
+    args = arg_parser.parse_args()
+
+    metrics.configure(log_path="off")
+    save_path = tempfile.mkdtemp(prefix="blog_load_")
+    router = ModelRouter()
+    if args.outline:
+        for blog_type in BLOG_TYPES if args.outline == "all" else args.outline.split(","):
+            router.routes[blog_type] = router.route(blog_type).model_copy(update={"outline": True})
+    openai_handler = OpenAIHandler(backend=make_backend(args), ledger=UsageLedger(":memory:"), router=router)
+
+    locales = args.locales.split(",") if args.locales else None
+    connection = StubConnection()
+    db_path = os.path.join(save_path, "blog.db")
+    if args.storage == "sqlite":
+        seed_handler = SQLiteHandler(db_path)
+        seed_handler.connect()
+        seed_handler.seed(BLOG_TYPES, categories=50)
+        seed_handler.close()
+    results_lock = threading.Lock()
+    post_latencies = []
+    sql_statements = []
+    timed_out = []
+    unrepaired = []
+
+    def publish(job, db_handler, deadline):
+        """Publish a job; False when its text stages ran out of time (image stages only leave backfills)."""
+        try:
+            generate_and_publish(job, db_handler, openai_handler, save_path, locales=locales, deadline=deadline)
+            return True
+        except (DeadlineExceeded, TimeoutError):
+            return False
+        except ValidationError:
+            # Still invalid after OpenAIHandler.repair gave up
+            with results_lock:
+                unrepaired.append(job["term_id"])
+            return True
+
+    def run(index: int):
+        start = time.perf_counter()
+        deadline = Deadline(args.deadline * args.latency_scale) if args.deadline else None
+        published = True
+        if args.storage == "sqlite":
+            db_handler = SQLiteHandler(db_path)
+            db_handler.connect()
+            try:
+                job = claim_next_job(db_handler)
+                if job:
+                    published = publish(job, db_handler, deadline)
+            finally:
+                db_handler.close()
+            statements = db_handler.statements
+        else:
+            db_handler = MySQLHandler({})
+            db_handler.connection = connection
+            published = publish(make_job(index), db_handler, deadline)
+            statements = 0
+        with results_lock:
+            post_latencies.append(time.perf_counter() - start)
+            sql_statements.append(statements)
+            timed_out.append(not published)
+
+    profiler = Profiler(args.profile) if args.profile else nullcontext()
+    try:
+        with profiler, quiet():
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                list(executor.map(run, range(args.posts)))
+            elapsed = time.perf_counter() - start
+        image_backfills = 0
+        if args.storage == "sqlite":
+            count_handler = SQLiteHandler(db_path)
+            count_handler.connect()
+            cursor = count_handler.cursor()
+            cursor.execute("SELECT COUNT(*) FROM z_image_backfill")
+            image_backfills = cursor.fetchone()[0]
+            cursor.close()
+            count_handler.close()
+    finally:
+        shutil.rmtree(save_path, ignore_errors=True)
+
+    result = summarize(post_latencies)
+    result.update({
+        "posts": args.posts,
+        "concurrency": args.concurrency,
+        "elapsed_sec": elapsed,
+        "posts_per_sec": args.posts / elapsed,
+        "storage": args.storage,
+        "sql_statements": sum(sql_statements) or connection.statements,
+        "timed_out": sum(timed_out),
+        "image_backfills": image_backfills,
+        "unrepaired": len(unrepaired),
+        "repair_calls": sum(len(entry["latency_ms"]) for (route_name, model), entry
+                            in openai_handler.ledger.chat_stats().items() if route_name == "repair"),
+    })
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "backend": args.backend,
+        "latency_scale": args.latency_scale,
+        "suites": {"load_test": {"end_to_end_post": result}},
+    }
+
+    output_path = args.output
+    if not output_path:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output_path = os.path.join(RESULTS_DIR, f"load_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{results['commit']}.json")
+    with open(output_path, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"{args.posts} posts in {elapsed:.1f}s ({args.posts / elapsed:.2f} posts/sec), "
+          f"post latency median {result['median_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms")
+    print(f"Load test results written to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+# metrics.py
+# Lightweight span/timer API shared by OpenAIHandler, BlogContentParser and MySQLHandler.
+#
+# Every finished span is written as one JSON line, e.g.
+#   {"ts": "2025-01-01T10:00:00.123", "event": "span", "stage": "openai.image_generate",
+#    "duration_ms": 8123.4, "status": "ok", "model": "dall-e-3"}
+#
+# Configuration (environment variables or configure()):
+#   BLOG_METRICS_LOG       file to append JSON lines to (default: stderr, "off" to disable)
+#   BLOG_METRICS_TEXTFILE  Prometheus textfile written by flush() and at exit
+import atexit
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+# Upper bounds in seconds; covers quick SQL statements up to slow DALL-E calls
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_lock = threading.Lock()
+# Active spans, innermost last. A context variable rather than a thread-local so that asyncio tasks
+# sharing one thread (async_mysql_handler.py) each see their own stack.
+_span_stack = ContextVar("metrics_span_stack", default=())
+_hooks = []  # Objects with on_start(span)/on_end(span), e.g. profiling.Profiler
+_histograms = {}  # stage -> {"buckets": [...], "sum": float, "count": int}
+_errors = {}  # stage -> count
+
+_config = {
+    "log_path": os.environ.get("BLOG_METRICS_LOG"),
+    "textfile_path": os.environ.get("BLOG_METRICS_TEXTFILE"),
+}
+
+
+def configure(log_path=None, textfile_path=None):
+    """Override where JSON lines and the Prometheus textfile are written."""
+    if log_path is not None:
+        _config["log_path"] = log_path
+    if textfile_path is not None:
+        _config["textfile_path"] = textfile_path
+
+
+def log_event(event: str, **fields):
+    """Write a single structured JSON log line."""
+    log_path = _config["log_path"]
+    if log_path == "off":
+        return
+
+    record = {"ts": datetime.now().isoformat(timespec="milliseconds"), "event": event}
+    record.update(fields)
+    line = json.dumps(record, default=str)
+
+    with _lock:
+        if log_path:
+            with open(log_path, "a") as f:
+                f.write(line + "\n")
+        else:
+            sys.stderr.write(line + "\n")
+
+
+def add_hook(hook):
+    """Call hook.on_start(span) and hook.on_end(span) around every span (used by profiling.py)."""
+    with _lock:
+        _hooks.append(hook)
+
+
+def remove_hook(hook):
+    with _lock:
+        if hook in _hooks:
+            _hooks.remove(hook)
+
+
+def hooks_active() -> bool:
+    return bool(_hooks)
+
+
+def _observe(stage: str, duration: float, failed: bool):
+    with _lock:
+        histogram = _histograms.get(stage)
+        if histogram is None:
+            histogram = {"buckets": [0] * len(HISTOGRAM_BUCKETS), "sum": 0.0, "count": 0}
+            _histograms[stage] = histogram
+        for index, upper_bound in enumerate(HISTOGRAM_BUCKETS):
+            if duration <= upper_bound:
+                histogram["buckets"][index] += 1
+        histogram["sum"] += duration
+        histogram["count"] += 1
+        if failed:
+            _errors[stage] = _errors.get(stage, 0) + 1
+
+
+class Span:
+    """A running timer for one pipeline stage."""
+
+    def __init__(self, stage: str, fields: dict):
+        self.stage = stage
+        self.fields = fields
+        self.error = None
+        self.start = None
+        self.duration = None
+
+    def set(self, **fields):
+        """Attach extra fields to the log line, e.g. a post_id known only after an INSERT."""
+        self.fields.update(fields)
+
+    def fail(self, err):
+        """Mark the span as failed without raising (for handlers that catch and print their errors)."""
+        self.error = err
+
+
+@contextmanager
+def span(stage: str, **fields):
+    """Time a block of work as `stage`, recording failures whether they are raised or caught."""
+    current = Span(stage, fields)
+    token = _span_stack.set(_span_stack.get() + (current,))
+    hooks = list(_hooks)
+    for hook in hooks:
+        hook.on_start(current)
+    current.start = time.perf_counter()
+    try:
+        yield current
+    except BaseException as err:
+        current.error = err
+        raise
+    finally:
+        duration = time.perf_counter() - current.start
+        current.duration = duration
+        for hook in hooks:
+            hook.on_end(current)
+        _span_stack.reset(token)
+        _observe(stage, duration, current.error is not None)
+
+        record = {"stage": stage, "duration_ms": round(duration * 1000, 3),
+                  "status": "error" if current.error is not None else "ok"}
+        if current.error is not None:
+            record["error"] = f"{type(current.error).__name__}: {current.error}"
+        record.update(current.fields)
+        log_event("span", **record)
+
+
+def timed(stage: str):
+    """Decorator form of span() for whole methods (plain or async)."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_error(err):
+    """Mark the innermost active span on this thread (or asyncio task) as failed."""
+    stack = _span_stack.get()
+    if stack:
+        stack[-1].fail(err)
+
+
+def current_span():
+    """Return the innermost active span on this thread (or asyncio task), or None."""
+    stack = _span_stack.get()
+    return stack[-1] if stack else None
+
+
+def _metric_name(stage: str) -> str:
+    return stage.replace(".", "_").replace("-", "_")
+
+
+def render_prometheus() -> str:
+    """Render per-stage latency histograms and error counters in Prometheus text format."""
+    lines = [
+        "# HELP blog_stage_duration_seconds Latency of each pipeline stage.",
+        "# TYPE blog_stage_duration_seconds histogram",
+    ]
+    with _lock:
+        for stage in sorted(_histograms):
+            histogram = _histograms[stage]
+            label = _metric_name(stage)
+            for upper_bound, count in zip(HISTOGRAM_BUCKETS, histogram["buckets"]):
+                lines.append(f'blog_stage_duration_seconds_bucket{{stage="{label}",le="{upper_bound}"}} {count}')
+            lines.append(f'blog_stage_duration_seconds_bucket{{stage="{label}",le="+Inf"}} {histogram["count"]}')
+            lines.append(f'blog_stage_duration_seconds_sum{{stage="{label}"}} {histogram["sum"]:.6f}')
+            lines.append(f'blog_stage_duration_seconds_count{{stage="{label}"}} {histogram["count"]}')
+
+        lines.append("# HELP blog_stage_errors_total Failed executions of each pipeline stage.")
+        lines.append("# TYPE blog_stage_errors_total counter")
+        for stage in sorted(_histograms):
+            lines.append(f'blog_stage_errors_total{{stage="{_metric_name(stage)}"}} {_errors.get(stage, 0)}')
+
+    return "\n".join(lines) + "\n"
+
+
+def flush():
+    """Write the Prometheus textfile, if one is configured."""
+    textfile_path = _config["textfile_path"]
+    if not textfile_path:
+        return
+
+    # Write to a temporary file and rename so node_exporter never reads a partial file
+    tmp_path = f"{textfile_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, textfile_path)
+
+
+atexit.register(flush)
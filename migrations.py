@@ -0,0 +1,112 @@
+# migrations.py
+# Schema changes for the custom columns and tables used by MySQLHandler.
+#
+#   python migrations.py --config db.json
+#
+# Every statement is idempotent (MariaDB IF NOT EXISTS), so the script can be re-run safely.
+import argparse
+import json
+
+import mysql.connector
+
+from mysql_handler import MySQLHandler
+
+# Rotation is tracked with cycle numbers: z_rotation holds the current epoch per rotation, and a row
+# is available while its own epoch is below it. Starting a new cycle is a single-row UPDATE instead of
+# resetting z_processed / is_taken on every row.
+ROTATION_MIGRATION = [
+    """
+    CREATE TABLE IF NOT EXISTS z_rotation (
+        name VARCHAR(64) NOT NULL PRIMARY KEY,
+        epoch INT UNSIGNED NOT NULL DEFAULT 1
+    )
+    """,
+    "INSERT IGNORE INTO z_rotation (name, epoch) VALUES ('terms', 1), ('templates', 1)",
+    "ALTER TABLE wp_terms ADD COLUMN IF NOT EXISTS z_epoch INT UNSIGNED NOT NULL DEFAULT 0",
+    "ALTER TABLE blog_templates ADD COLUMN IF NOT EXISTS last_epoch INT UNSIGNED NOT NULL DEFAULT 0",
+    # Carry over the current cycle: rows already processed/taken count as used in epoch 1
+    "UPDATE wp_terms SET z_epoch = 1 WHERE z_processed = TRUE AND z_epoch = 0",
+    "UPDATE blog_templates SET last_epoch = 1 WHERE is_taken = TRUE AND last_epoch = 0",
+    # get_next_unprocessed_term: range on z_epoch, ordered by term_id, stops at the first match. Covering:
+    # the description filter and the selected name and description are read from the index, not the rows
+    # (z_category_description is a VARCHAR, so it can be a key part in full)
+    "DROP INDEX IF EXISTS idx_z_epoch_term ON wp_terms",
+    "CREATE INDEX IF NOT EXISTS idx_z_epoch_term_cover ON wp_terms (z_epoch, term_id, name, z_category_description)",
+    # get_blog_template draws the blog type from this index alone (InnoDB: the covering part of the query),
+    # then reads user_prompt only for that type's rows; mark_blog_type_as_taken looks up by blog_type
+    "CREATE INDEX IF NOT EXISTS idx_last_epoch_type ON blog_templates (last_epoch, blog_type)",
+    "CREATE INDEX IF NOT EXISTS idx_blog_type ON blog_templates (blog_type)",
+]
+
+# Fully rendered drafts waiting for the scheduled publisher (worker.py --mode publish-buffer)
+PUBLISH_BUFFER_MIGRATION = [
+    """
+    CREATE TABLE IF NOT EXISTS z_publish_buffer (
+        post_id BIGINT UNSIGNED NOT NULL PRIMARY KEY,
+        created_at DATETIME NOT NULL
+    )
+    """,
+]
+
+# Images a post was published without because their stage ran out of time (worker.py --mode backfill)
+IMAGE_BACKFILL_MIGRATION = [
+    """
+    CREATE TABLE IF NOT EXISTS z_image_backfill (
+        post_id BIGINT UNSIGNED NOT NULL,
+        kind VARCHAR(16) NOT NULL,
+        prompt VARCHAR(255) NOT NULL,
+        attempts INT UNSIGNED NOT NULL DEFAULT 0,
+        created_at DATETIME NOT NULL,
+        PRIMARY KEY (post_id, kind)
+    )
+    """,
+    # Lease of the worker generating the image; other workers skip the row until it expires
+    "ALTER TABLE z_image_backfill ADD COLUMN IF NOT EXISTS claimed_at DATETIME NULL",
+]
+
+MIGRATIONS = {
+    "rotation": ROTATION_MIGRATION,
+    "publish_buffer": PUBLISH_BUFFER_MIGRATION,
+    "image_backfill": IMAGE_BACKFILL_MIGRATION,
+}
+
+
+def apply_migration(db_handler, statements) -> bool:
+    """Run a list of DDL/DML statements on a connected MySQLHandler."""
+    cursor = db_handler.connection.cursor()
+    try:
+        for statement in statements:
+            cursor.execute(statement)
+        db_handler.connection.commit()
+        return True
+    except mysql.connector.Error as err:
+        print(f"Error: {err}")
+        db_handler.connection.rollback()
+        return False
+    finally:
+        cursor.close()
+
+
+def apply_all(db_handler) -> bool:
+    for name, statements in MIGRATIONS.items():
+        if not apply_migration(db_handler, statements):
+            print(f"Migration '{name}' failed.")
+            return False
+        print(f"Migration '{name}' applied.")
+    return True
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Apply the blog pipeline's schema migrations.")
+    arg_parser.add_argument("--config", required=True, help="JSON file with mysql.connector settings")
+    args = arg_parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+
+    db_handler = MySQLHandler(config)
+    db_handler.connect()
+    try:
+        apply_all(db_handler)
+    finally:
+        db_handler.close()
@@ -1,48 +1,228 @@
 import mysql.connector
-from datetime import datetime
+from datetime import datetime, timedelta
 import re
+import threading
+from collections import Counter
 
-class MySQLHandler:
-    def __init__(self, config):
-        self.config = config
+import metrics
+from blog_storage import BlogStorage
+from metrics import span, timed, record_error
+from sites import DEFAULT_BASE_URL, DEFAULT_MIN_TERM_ID
+
+# term_id -> term_taxonomy_id of every category, per database. Loaded once per process and shared by
+# all handlers of a site, since the worker creates a handler per post.
+_category_taxonomy_ids = {}
+_category_taxonomy_lock = threading.Lock()
+
+
+def generate_slug(title: str) -> str:
+    # Remove all special characters except for letters, numbers, and spaces
+    slug = re.sub(r'[^a-zA-Z0-9\s]', '', title)
+
+    # Replace spaces with hyphens
+    slug = slug.replace(" ", "-")
+
+    # Limit the length to 200 characters
+    if len(slug) > 200:
+        slug = slug[:200]
+
+    return slug
+
+
+# Post meta written from the parser's summary: our own keys plus the ones Yoast SEO and Rank Math read,
+# so neither plugin has to derive a description from post_content
+SUMMARY_META_KEYS = {
+    "word_count": ("_blog_word_count",),
+    "reading_time": ("_blog_reading_time",),
+    "meta_description": ("_yoast_wpseo_metadesc", "rank_math_description"),
+}
+
+
+# Post meta holding what a post was rendered from, so its HTML can be rebuilt without regenerating it
+# (see rerender.py): the blog type, the validated JSON (compressed) and the inline image path
+RAW_CONTENT_META_KEYS = ("_blog_type", "_blog_content", "_blog_inline_image")
+# Sections refresh.py rewrote, as JSON {section index: HTML}; rerender.py puts them back over the rendered JSON
+REFRESHED_SECTIONS_META_KEY = "_blog_refreshed_sections"
+
+
+MAX_BACKFILL_ATTEMPTS = 3  # Image backfills still failing after this many tries are left in z_image_backfill
+BACKFILL_LEASE_SECONDS = 600  # A claimed backfill is skipped by other workers for this long
+
+
+def term_count_update(deltas):
+    """Build the single UPDATE applying term_taxonomy_id -> delta to wp_term_taxonomy.count.
+
+    Returns (query, params), or None when there is nothing to change.
+    """
+    deltas = {term_taxonomy_id: delta for term_taxonomy_id, delta in deltas.items() if delta}
+    if not deltas:
+        return None
+    cases = " ".join(["WHEN %s THEN %s"] * len(deltas))
+    placeholders = ", ".join(["%s"] * len(deltas))
+    update_query = f"""
+        UPDATE wp_term_taxonomy
+        SET count = GREATEST(CAST(count AS SIGNED) + CASE term_taxonomy_id {cases} ELSE 0 END, 0)
+        WHERE term_taxonomy_id IN ({placeholders})
+    """
+    params = [value for item in deltas.items() for value in item] + list(deltas)
+    return update_query, params
+
+
+def post_content_update(contents):
+    """Build the single UPDATE writing post_id -> post_content for a batch of posts. Returns (query, params)."""
+    cases = " ".join(["WHEN %s THEN %s"] * len(contents))
+    placeholders = ", ".join(["%s"] * len(contents))
+    update_query = f"""
+        UPDATE wp_posts
+        SET post_content = CASE ID {cases} ELSE post_content END
+        WHERE ID IN ({placeholders})
+    """
+    params = [value for item in contents.items() for value in item] + list(contents)
+    return update_query, params
+
+
+class TracedCursor:
+    """Cursor wrapper that times every statement as its own span while a profiler is attached."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, params=None):
+        with span("mysql.statement", sql=" ".join(query.split())[:120]):
+            return self._cursor.execute(query, params)
+
+    def executemany(self, query, seq_params):
+        with span("mysql.statement", sql=" ".join(query.split())[:120]):
+            return self._cursor.executemany(query, seq_params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class MySQLHandler(BlogStorage):
+    def __init__(self, config, pool_size=None, pool_name="blog_pool", base_url=DEFAULT_BASE_URL,
+                 min_term_id=DEFAULT_MIN_TERM_ID, max_term_id=None):
+        self.config = dict(config)
+        if pool_size:
+            # mysql.connector keeps one pool per pool_name for the whole process: connect() borrows a
+            # connection from it and close() hands it back instead of tearing down the TCP session.
+            # Each site uses its own pool_name so sites never share connections.
+            self.config.setdefault("pool_name", pool_name)
+            self.config["pool_size"] = pool_size
+        self.base_url = base_url.rstrip("/")
+        self.min_term_id = min_term_id
+        # No upper bound by default; term_id is an unsigned BIGINT in WordPress
+        self.max_term_id = max_term_id if max_term_id is not None else 2 ** 63
         self.connection = None
+        # term_taxonomy_id -> change of wp_term_taxonomy.count, written with the next commit
+        self.pending_term_counts = Counter()
 
+    @timed("mysql.connect")
     def connect(self):
         try:
             self.connection = mysql.connector.connect(**self.config)
             if self.connection.is_connected():
                 print("Connected to MariaDB")
         except mysql.connector.Error as err:
+            record_error(err)
             print(f"Error connecting: {err}")
 
+    @timed("mysql.close")
     def close(self):
         if self.connection and self.connection.is_connected():
             self.connection.close()
             print("MariaDB connection is closed")
 
-    def get_next_unprocessed_term(self):
+    def cursor(self):
         cursor = self.connection.cursor()
+        # Per-statement spans only when profiling; they would flood the normal metrics log
+        return TracedCursor(cursor) if metrics.hooks_active() else cursor
+
+    def get_rotation_epoch(self, cursor, name: str) -> int:
+        """Return the current cycle number for a rotation ('terms' or 'templates')."""
+        cursor.execute("SELECT epoch FROM z_rotation WHERE name = %s", (name,))
+        record = cursor.fetchone()
+        return record[0] if record else 1
+
+    def start_new_rotation(self, cursor, name: str, epoch: int):
+        """Begin the next cycle with a single-row update.
+
+        Rows whose last-used epoch is below the new value become available again, so nothing in
+        wp_terms or blog_templates has to be rewritten. The epoch = %s guard stops two workers that
+        both ran out of rows from skipping a whole cycle.
+        """
+        cursor.execute("UPDATE z_rotation SET epoch = epoch + 1 WHERE name = %s AND epoch = %s", (name, epoch))
+        self.connection.commit()
+
+    def database_key(self):
+        return self.config.get("host"), str(self.config.get("port")), self.config.get("database")
+
+    def load_category_taxonomy_ids(self, cursor) -> dict:
+        """Return the cached term_id -> term_taxonomy_id map of categories, loading it on first use."""
+        key = self.database_key()
+        with _category_taxonomy_lock:
+            taxonomy_ids = _category_taxonomy_ids.get(key)
+        if taxonomy_ids is None:
+            cursor.execute("SELECT term_id, term_taxonomy_id FROM wp_term_taxonomy WHERE taxonomy = 'category'")
+            taxonomy_ids = dict(cursor.fetchall())
+            with _category_taxonomy_lock:
+                _category_taxonomy_ids[key] = taxonomy_ids
+        return taxonomy_ids
+
+    def get_category_taxonomy_id(self, cursor, term_id: int):
+        """Resolve a category's term_id to its term_taxonomy_id (they differ on most installs)."""
+        taxonomy_ids = self.load_category_taxonomy_ids(cursor)
+        term_taxonomy_id = taxonomy_ids.get(term_id)
+        if term_taxonomy_id is None:
+            # Category created after the map was loaded
+            cursor.execute(
+                "SELECT term_taxonomy_id FROM wp_term_taxonomy WHERE term_id = %s AND taxonomy = 'category'",
+                (term_id,),
+            )
+            record = cursor.fetchone()
+            if record:
+                term_taxonomy_id = record[0]
+                with _category_taxonomy_lock:
+                    taxonomy_ids[term_id] = term_taxonomy_id
+        return term_taxonomy_id
+
+    def apply_term_counts(self, cursor):
+        """Write the pending count deltas in one UPDATE; call right before commit().
+
+        WordPress only counts published posts, so deltas are queued when a post goes live rather than
+        recounting wp_term_relationships per post.
+        """
+        update = term_count_update(self.pending_term_counts)
+        self.pending_term_counts.clear()
+        if update:
+            cursor.execute(*update)
+
+    @timed("mysql.get_next_unprocessed_term")
+    def get_next_unprocessed_term(self):
+        cursor = self.cursor()
         try:
             select_query = """
             SELECT term_id, name, z_category_description 
             FROM wp_terms 
-            WHERE term_id >= 89 
-            AND z_processed = FALSE 
+            WHERE z_epoch < %s 
+            AND term_id BETWEEN %s AND %s 
             AND z_category_description != '' 
+            ORDER BY z_epoch, term_id 
             LIMIT 1
             """
-            cursor.execute(select_query)
+            epoch = self.get_rotation_epoch(cursor, "terms")
+            cursor.execute(select_query, (epoch, self.min_term_id, self.max_term_id))
             record = cursor.fetchone()
 
             if record:
                 term_id, name, z_category_description = record
                 return term_id, name, z_category_description
             else:
-                update_query = "UPDATE wp_terms SET z_processed = FALSE WHERE term_id >= 89 AND z_category_description != ''"
-                cursor.execute(update_query)
-                self.connection.commit()
+                # Every term has been used in this cycle; start the next one
+                self.start_new_rotation(cursor, "terms", epoch)
 
-                cursor.execute(select_query)
+                epoch = self.get_rotation_epoch(cursor, "terms")
+                cursor.execute(select_query, (epoch, self.min_term_id, self.max_term_id))
                 updated_record = cursor.fetchone()
 
                 if updated_record:
@@ -52,23 +232,38 @@ class MySQLHandler:
                     return None, None, None
 
         except mysql.connector.Error as err:
+            record_error(err)
             print(f"Error: {err}")
             return None, None, None
         finally:
             cursor.close()
 
+    @staticmethod
+    def pick_template(cursor, epoch: int):
+        """A random template not used in this cycle, as (blog_type, user_prompt), or None.
+
+        The random draw reads only idx_last_epoch_type; user_prompt is then read for the drawn type's rows
+        only, instead of for every candidate ORDER BY RAND() sorts. Every template stays equally likely.
+        """
+        cursor.execute("SELECT blog_type FROM blog_templates WHERE last_epoch < %s ORDER BY RAND() LIMIT 1", (epoch,))
+        record = cursor.fetchone()
+        if not record:
+            return None
+        cursor.execute("""
+            SELECT blog_type, user_prompt
+            FROM blog_templates
+            WHERE blog_type = %s AND last_epoch < %s
+            ORDER BY RAND()
+            LIMIT 1
+        """, (record[0], epoch))
+        return cursor.fetchone()
+
+    @timed("mysql.get_blog_template")
     def get_blog_template(self, z_category_description):
-        cursor = self.connection.cursor()
+        cursor = self.cursor()
         try:
-            select_query = """
-                SELECT blog_type, user_prompt 
-                FROM blog_templates 
-                WHERE is_taken = FALSE 
-                ORDER BY RAND() 
-                LIMIT 1
-            """
-            cursor.execute(select_query)
-            record = cursor.fetchone()
+            epoch = self.get_rotation_epoch(cursor, "templates")
+            record = self.pick_template(cursor, epoch)
 
             if record:
                 blog_type, user_prompt = record  # Extract values directly from the tuple
@@ -78,13 +273,11 @@ class MySQLHandler:
 
                 return blog_type, user_prompt
             else:
-                # Reset all prompts to is_taken = FALSE
-                update_query = "UPDATE blog_templates SET is_taken = FALSE"
-                cursor.execute(update_query)
-                self.connection.commit()
+                # Every template has been used in this cycle; start the next one
+                self.start_new_rotation(cursor, "templates", epoch)
 
-                cursor.execute(select_query)  # Retry selecting a user prompt
-                updated_record = cursor.fetchone()
+                epoch = self.get_rotation_epoch(cursor, "templates")
+                updated_record = self.pick_template(cursor, epoch)  # Retry selecting a user prompt
 
                 if updated_record:
                     blog_type, user_prompt = updated_record  # Extract values directly from the tuple
@@ -97,18 +290,20 @@ class MySQLHandler:
                     return None, None  # Return None for both values if no record found
 
         except mysql.connector.Error as err:
+            record_error(err)
             print(f"Error: {err}")
             return None, None  # Return None for both values on error
         finally:
             cursor.close()
 
+    @timed("mysql.mark_blog_type_as_taken")
     def mark_blog_type_as_taken(self, blog_type: str):
-        cursor = self.connection.cursor()
+        cursor = self.cursor()
         try:
-            # Update the is_taken status to TRUE for the specified blog_type
+            # Stamp the template with the current cycle so it is skipped until the next one
             update_query = """
             UPDATE blog_templates 
-            SET is_taken = TRUE 
+            SET last_epoch = (SELECT epoch FROM z_rotation WHERE name = 'templates') 
             WHERE blog_type = %s
             """
             cursor.execute(update_query, (blog_type,))
@@ -116,77 +311,81 @@ class MySQLHandler:
 
             # Check how many rows were updated
             if cursor.rowcount > 0:
-                print(f"Successfully updated {cursor.rowcount} rows to is_taken = TRUE for blog_type: {blog_type}.")
+                print(f"Successfully marked {cursor.rowcount} rows as used in this cycle for blog_type: {blog_type}.")
             else:
                 print("No rows were updated. Check if the blog_type exists.")
 
         except mysql.connector.Error as err:
+            record_error(err)
             print(f"Error: {err}")
         finally:
             cursor.close()
 
+    @timed("mysql.create_blog_post")
     def create_blog_post(self, blog_content):
-
-        def generate_slug(title: str) -> str:
-            # Remove all special characters except for letters, numbers, and spaces
-            slug = re.sub(r'[^a-zA-Z0-9\s]', '', title)
-
-            # Replace spaces with hyphens
-            slug = slug.replace(" ", "-")
-
-            # Limit the length to 200 characters
-            if len(slug) > 200:
-                slug = slug[:200]
-
-            return slug
-
         if not self.connection:
             print("No active connection to MariaDB")
             return
 
-        cursor = self.connection.cursor()
+        cursor = self.cursor()
 
         try:
-            post_title = blog_content["title"]
-            post_content = blog_content["content"]
-            post_status = "publish"
-            post_parent = 0
-            post_type = "post"
-            post_author = 1
-            post_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            post_excerpt = ""
-            post_name = generate_slug(blog_content["title"])
-            to_ping = ""
-            pinged = ""
-            post_content_filtered = ""
-
-            insert_query = """
-            INSERT INTO wp_posts (
-                post_author, post_date, post_content, post_title, post_status, 
-                post_name, post_parent, post_type, post_modified, post_modified_gmt, 
-                post_excerpt, to_ping, pinged, post_content_filtered
-            )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-
-            post_data = (
-                post_author, post_date, post_content, post_title, post_status, post_name, post_parent, post_type,
-                post_date, post_date, post_excerpt, to_ping, pinged, post_content_filtered
-            )
-
-            cursor.execute(insert_query, post_data)
-            post_id = cursor.lastrowid
+            post_id = self.insert_post(cursor, blog_content)
 
             self.connection.commit()
-            print(f"Blog post created with ID: {post_id}")
+            print(f"Blog post created with ID: {post_id} ({blog_content.get('status', 'publish')})")
             return post_id
 
         except mysql.connector.Error as err:
+            record_error(err)
             print(f"Error: {err}")
             self.connection.rollback()
         finally:
             cursor.close()
 
+    def insert_post(self, cursor, blog_content) -> int:
+        """INSERT a post row without committing. Returns the new post ID."""
+        post_title = blog_content["title"]
+        post_content = blog_content["content"]
+        post_status = blog_content.get("status", "publish")  # "draft" for the pre-generation buffer
+        post_parent = 0
+        post_type = "post"
+        post_author = 1
+        post_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        summary = blog_content.get("summary") or {}
+        post_excerpt = summary.get("excerpt", "")
+        post_name = blog_content.get("slug") or generate_slug(blog_content["title"])
+        to_ping = ""
+        pinged = ""
+        post_content_filtered = ""
+
+        insert_query = """
+        INSERT INTO wp_posts (
+            post_author, post_date, post_content, post_title, post_status, 
+            post_name, post_parent, post_type, post_modified, post_modified_gmt, 
+            post_excerpt, to_ping, pinged, post_content_filtered
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """
+
+        post_data = (
+            post_author, post_date, post_content, post_title, post_status, post_name, post_parent, post_type,
+            post_date, post_date, post_excerpt, to_ping, pinged, post_content_filtered
+        )
+
+        cursor.execute(insert_query, post_data)
+        post_id = cursor.lastrowid
+
+        # Same transaction as the post, so a post never goes live without its meta
+        meta = [(post_id, meta_key, summary[field])
+                for field, meta_keys in SUMMARY_META_KEYS.items() if summary.get(field) is not None
+                for meta_key in meta_keys]
+        meta += [(post_id, meta_key, meta_value) for meta_key, meta_value in (blog_content.get("meta") or {}).items()]
+        if meta:
+            cursor.executemany("INSERT INTO wp_postmeta (post_id, meta_key, meta_value) VALUES (%s, %s, %s)", meta)
+        return post_id
+
+    @timed("mysql.create_image_attachment")
     def create_image_attachment(self, image_name: str, post_id: int, month: str, year: str):
         """Create an image attachment in the wp_posts table."""
 
@@ -194,106 +393,195 @@ class MySQLHandler:
             print("No active connection to MariaDB")
             return
 
-        cursor = self.connection.cursor()
+        cursor = self.cursor()
 
         try:
-            # Prepare the post title and post name
-            post_title = image_name.rsplit('.', 1)[0]  # Using the image name as post title
-            post_name = image_name.rsplit('.', 1)[0].lower()  # Remove the extension for post_name
-            post_status = "inherit"  # As specified
-            comment_status = "open"  # As specified
-            ping_status = "closed"  # As specified
-            guid = f"https://chillandearn.com/wp-content/uploads/{year}/{month}/{image_name}"  # Construct GUID
-            post_mime_type = "image/jpeg"  # As specified
-            post_type = "attachment"  # As specified
-            post_parent = post_id  # Using input parameter post_id
-            post_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')  # Current date
-
-            insert_query = """
-            INSERT INTO wp_posts (
-                post_author, post_date, post_content, post_title, post_status, 
-                post_name, post_parent, post_type, post_modified, post_modified_gmt, 
-                post_excerpt, to_ping, pinged, post_content_filtered, guid, post_mime_type
-            )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-
-            # Post data to insert
-            post_data = (
-                1,  # Assuming the author ID is 1
-                post_date,  # post_date
-                "",  # post_content (not needed for attachments)
-                post_title,  # post_title
-                post_status,  # post_status
-                post_name,  # post_name without extension
-                post_parent,  # post_parent
-                post_type,  # post_type
-                post_date,  # post_modified
-                post_date,  # post_modified_gmt
-                "",  # post_excerpt
-                "",  # to_ping
-                "",  # pinged
-                "",  # post_content_filtered
-                guid,  # guid
-                post_mime_type  # post_mime_type
-            )
-
-            cursor.execute(insert_query, post_data)
-            attachment_id = cursor.lastrowid
+            attachment_id = self.insert_attachment(cursor, image_name, post_id, month, year)
 
             self.connection.commit()
             print(f"Image attachment created with ID: {attachment_id}")
             return attachment_id
 
         except mysql.connector.Error as err:
+            record_error(err)
             print(f"Error: {err}")
             self.connection.rollback()
         finally:
             cursor.close()
 
-    def assign_category_to_post(self, category_id, post_id):
-        """Assign a category to a post in the wp_term_relationships table."""
+    def insert_attachment(self, cursor, image_name: str, post_id: int, month: str, year: str) -> int:
+        """INSERT an image attachment row without committing. Returns the attachment ID."""
+        # Prepare the post title and post name
+        post_title = image_name.rsplit('.', 1)[0]  # Using the image name as post title
+        post_name = image_name.rsplit('.', 1)[0].lower()  # Remove the extension for post_name
+        post_status = "inherit"  # As specified
+        comment_status = "open"  # As specified
+        ping_status = "closed"  # As specified
+        guid = f"{self.base_url}/wp-content/uploads/{year}/{month}/{image_name}"  # Construct GUID
+        post_mime_type = "image/jpeg"  # As specified
+        post_type = "attachment"  # As specified
+        post_parent = post_id  # Using input parameter post_id
+        post_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')  # Current date
+
+        insert_query = """
+        INSERT INTO wp_posts (
+            post_author, post_date, post_content, post_title, post_status, 
+            post_name, post_parent, post_type, post_modified, post_modified_gmt, 
+            post_excerpt, to_ping, pinged, post_content_filtered, guid, post_mime_type
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """
+
+        # Post data to insert
+        post_data = (
+            1,  # Assuming the author ID is 1
+            post_date,  # post_date
+            "",  # post_content (not needed for attachments)
+            post_title,  # post_title
+            post_status,  # post_status
+            post_name,  # post_name without extension
+            post_parent,  # post_parent
+            post_type,  # post_type
+            post_date,  # post_modified
+            post_date,  # post_modified_gmt
+            "",  # post_excerpt
+            "",  # to_ping
+            "",  # pinged
+            "",  # post_content_filtered
+            guid,  # guid
+            post_mime_type  # post_mime_type
+        )
+
+        cursor.execute(insert_query, post_data)
+        return cursor.lastrowid
+
+    @timed("mysql.create_post_variants")
+    def create_post_variants(self, variants, category_id, image=None, status: str = "publish"):
+        """Insert the locale variants of one post together in a single transaction.
+
+        variants is a list of {"locale", "title", "content", "summary", "meta"} dicts, source locale first; image is
+        {"name", "month", "year", "path"} of the featured image or None. All variants get the category and
+        share one attachment row as their featured image. Each post is tagged with _blog_locale, and every
+        variant with _blog_translation_of pointing to the first post. Drafts are queued in the publish
+        buffer as a group: only the first post gets a buffer row and the publisher brings the rest along.
+
+        Returns the post IDs in the order of variants, or [] if nothing was written.
+        """
+        if not self.connection:
+            print("No active connection to MariaDB")
+            return []
+
+        cursor = self.cursor()
+        try:
+            post_ids = []
+            primary_slug = generate_slug(variants[0]["title"])
+            for index, variant in enumerate(variants):
+                slug = primary_slug
+                if index > 0:
+                    # Translated titles may have no ASCII left (e.g. Japanese), so variants derive their slug
+                    # from the source post: its slug, or its ID when even that is empty
+                    slug = f"{primary_slug[:190] or post_ids[0]}-{variant['locale']}"
+                post_ids.append(self.insert_post(cursor, {"title": variant["title"], "content": variant["content"],
+                                                          "status": status, "slug": slug,
+                                                          "summary": variant.get("summary"),
+                                                          "meta": variant.get("meta")}))
+            primary_id = post_ids[0]
+
+            term_taxonomy_id = self.get_category_taxonomy_id(cursor, category_id)
+            if term_taxonomy_id is not None:
+                cursor.executemany(
+                    "INSERT INTO wp_term_relationships (object_id, term_taxonomy_id, term_order) VALUES (%s, %s, %s)",
+                    [(post_id, term_taxonomy_id, 0) for post_id in post_ids],
+                )
+                if status == "publish":
+                    self.pending_term_counts[term_taxonomy_id] += len(post_ids)
+            else:
+                print(f"Error: no category taxonomy for term ID {category_id}; posts left uncategorized.")
+
+            meta = [(post_id, "_blog_locale", variant["locale"]) for post_id, variant in zip(post_ids, variants)]
+            meta += [(post_id, "_blog_translation_of", primary_id) for post_id in post_ids[1:]]
+            if image:
+                attachment_id = self.insert_attachment(cursor, image["name"], primary_id, image["month"], image["year"])
+                meta += [(post_id, "_thumbnail_id", attachment_id) for post_id in post_ids]
+                meta.append((attachment_id, "_wp_attached_file", image["path"]))
+            cursor.executemany("INSERT INTO wp_postmeta (post_id, meta_key, meta_value) VALUES (%s, %s, %s)", meta)
+
+            if status == "draft":
+                cursor.execute("INSERT INTO z_publish_buffer (post_id, created_at) VALUES (%s, %s)",
+                               (primary_id, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+
+            self.apply_term_counts(cursor)
+            self.connection.commit()
+            print(f"Created {len(post_ids)} locale variants ({status}): {post_ids}")
+            return post_ids
+        except mysql.connector.Error as err:
+            record_error(err)
+            print(f"Error: {err}")
+            self.connection.rollback()
+            self.pending_term_counts.clear()
+            return []
+        finally:
+            cursor.close()
+
+    @timed("mysql.assign_category_to_post")
+    def assign_category_to_post(self, category_id, post_id, published: bool = True):
+        """Assign a category to a post in the wp_term_relationships table.
+
+        category_id is the term_id; the row needs the category's term_taxonomy_id. The category's count
+        is bumped in the same transaction for published posts (drafts are counted when published).
+        """
         term_order = 0
         insert_query = """
             INSERT INTO wp_term_relationships (object_id, term_taxonomy_id, term_order)
             VALUES (%s, %s, %s)
         """
-        category_data = (post_id, category_id, term_order)
 
-        cursor = self.connection.cursor()
+        cursor = self.cursor()
         try:
-            cursor.execute(insert_query, category_data)
+            term_taxonomy_id = self.get_category_taxonomy_id(cursor, category_id)
+            if term_taxonomy_id is None:
+                print(f"Error: no category taxonomy for term ID {category_id}; Post ID {post_id} left uncategorized.")
+                return
+            cursor.execute(insert_query, (post_id, term_taxonomy_id, term_order))
+            if published:
+                self.pending_term_counts[term_taxonomy_id] += 1
+            self.apply_term_counts(cursor)
             self.connection.commit()
             print(f"Category ID {category_id} assigned to Post ID {post_id}.")
         except mysql.connector.Error as err:
+            record_error(err)
             print(f"Error: {err}")
             self.connection.rollback()
+            self.pending_term_counts.clear()
         finally:
             cursor.close()
 
+    @timed("mysql.update_term_processed")
     def update_term_processed(self, term_id: int):
-        """Update the z_processed column to true in the wp_terms table based on the term_id."""
+        """Stamp the term with the current cycle so it is skipped until the next one."""
         update_query = """
             UPDATE wp_terms
-            SET z_processed = TRUE
+            SET z_epoch = (SELECT epoch FROM z_rotation WHERE name = 'terms')
             WHERE term_id = %s
         """
 
-        cursor = self.connection.cursor()
+        cursor = self.cursor()
         try:
             cursor.execute(update_query, (term_id,))
             self.connection.commit()
-            print(f"Term ID {term_id} updated to z_processed = TRUE.")
+            print(f"Term ID {term_id} marked as processed in this cycle.")
         except mysql.connector.Error as err:
+            record_error(err)
             print(f"Error: {err}")
             self.connection.rollback()
         finally:
             cursor.close()
 
+    @timed("mysql.assign_image_to_post")
     def assign_image_to_post(self, post_id: int, post_attachment_id: int, image_path: str):
         """Assign image details to a post in the wp_postmeta table."""
 
-        cursor = self.connection.cursor()
+        cursor = self.cursor()
 
         try:
             # Insert the _thumbnail_id record
@@ -320,8 +608,472 @@ class MySQLHandler:
                 f"Image assigned to Post ID {post_id} with attachment ID {post_attachment_id} and image path '{image_path}'.")
 
         except mysql.connector.Error as err:
+            record_error(err)
+            print(f"Error: {err}")
+            self.connection.rollback()
+        finally:
+            cursor.close()
+
+    @timed("mysql.add_to_publish_buffer")
+    def add_to_publish_buffer(self, post_id: int):
+        """Queue a fully rendered draft for the scheduled publisher."""
+        insert_query = """
+            INSERT INTO z_publish_buffer (post_id, created_at)
+            VALUES (%s, %s)
+        """
+
+        cursor = self.cursor()
+        try:
+            cursor.execute(insert_query, (post_id, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            self.connection.commit()
+            print(f"Post ID {post_id} added to the publish buffer.")
+        except mysql.connector.Error as err:
+            record_error(err)
+            print(f"Error: {err}")
+            self.connection.rollback()
+        finally:
+            cursor.close()
+
+    @timed("mysql.count_buffered_posts")
+    def count_buffered_posts(self) -> int:
+        """Return how many drafts are waiting in the publish buffer."""
+        cursor = self.cursor()
+        try:
+            cursor.execute("SELECT COUNT(*) FROM z_publish_buffer")
+            return cursor.fetchone()[0]
+        except mysql.connector.Error as err:
+            record_error(err)
+            print(f"Error: {err}")
+            return 0
+        finally:
+            cursor.close()
+
+    @timed("mysql.publish_buffered_posts")
+    def publish_buffered_posts(self, limit: int = 1):
+        """Publish the oldest buffered drafts. Returns the IDs taken from the buffer.
+
+        All generation work already happened, so publishing is one UPDATE of wp_posts plus removing the
+        rows from the buffer, in a single transaction.
+        """
+        cursor = self.cursor()
+        try:
+            # FOR UPDATE keeps two publishers from flipping the same drafts
+            cursor.execute("SELECT post_id FROM z_publish_buffer ORDER BY post_id LIMIT %s FOR UPDATE", (limit,))
+            post_ids = [record[0] for record in cursor.fetchall()]
+            if not post_ids:
+                self.connection.rollback()
+                return []
+
+            placeholders = ", ".join(["%s"] * len(post_ids))
+            cursor.execute(f"DELETE FROM z_publish_buffer WHERE post_id IN ({placeholders})", tuple(post_ids))
+
+            # Locale variants (see create_post_variants) go live together with their source post
+            cursor.execute(f"""
+                SELECT post_id FROM wp_postmeta
+                WHERE meta_key = '_blog_translation_of' AND meta_value IN ({placeholders})
+            """, tuple(str(post_id) for post_id in post_ids))
+            variant_ids = [record[0] for record in cursor.fetchall()]
+            all_ids = post_ids + variant_ids
+            placeholders = ", ".join(["%s"] * len(all_ids))
+
+            # Only posts still in draft are flipped and counted; one an admin already published or trashed
+            # keeps its status and is already counted (or never will be)
+            cursor.execute(f"SELECT ID FROM wp_posts WHERE ID IN ({placeholders}) AND post_status = 'draft' FOR UPDATE",
+                           tuple(all_ids))
+            draft_ids = [record[0] for record in cursor.fetchall()]
+            if draft_ids:
+                placeholders = ", ".join(["%s"] * len(draft_ids))
+                post_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                update_query = f"""
+                    UPDATE wp_posts
+                    SET post_status = 'publish', post_date = %s, post_modified = %s, post_modified_gmt = %s
+                    WHERE ID IN ({placeholders})
+                """
+                cursor.execute(update_query, (post_date, post_date, post_date, *draft_ids))
+
+                # The drafts' categories were not counted while they were unpublished
+                cursor.execute(f"""
+                    SELECT tr.term_taxonomy_id, COUNT(*)
+                    FROM wp_term_relationships tr
+                    JOIN wp_term_taxonomy tt ON tt.term_taxonomy_id = tr.term_taxonomy_id AND tt.taxonomy = 'category'
+                    WHERE tr.object_id IN ({placeholders})
+                    GROUP BY tr.term_taxonomy_id
+                """, tuple(draft_ids))
+                for term_taxonomy_id, count in cursor.fetchall():
+                    self.pending_term_counts[term_taxonomy_id] += count
+                self.apply_term_counts(cursor)
+
+            self.connection.commit()
+            print(f"Published buffered posts: {post_ids}" + (f" with locale variants {variant_ids}" if variant_ids else ""))
+            return post_ids
+        except mysql.connector.Error as err:
+            record_error(err)
+            print(f"Error: {err}")
+            self.connection.rollback()
+            self.pending_term_counts.clear()
+            return []
+        finally:
+            cursor.close()
+
+    @timed("mysql.fetch_posts_since")
+    def fetch_posts_since(self, last_post_id: int, limit: int = 500):
+        """Return (ID, post_title, post_content) of posts newer than last_post_id, oldest first."""
+        select_query = """
+            SELECT ID, post_title, post_content
+            FROM wp_posts
+            WHERE ID > %s
+            AND post_type = 'post'
+            AND post_status IN ('publish', 'future', 'draft')
+            ORDER BY ID
+            LIMIT %s
+        """
+
+        cursor = self.cursor()
+        try:
+            cursor.execute(select_query, (last_post_id, limit))
+            return cursor.fetchall()
+        except mysql.connector.Error as err:
+            record_error(err)
+            print(f"Error: {err}")
+            return []
+        finally:
+            cursor.close()
+
+    @timed("mysql.fetch_post_titles_since")
+    def fetch_post_titles_since(self, last_post_id: int, limit: int = 500):
+        """Return (ID, post_title, category names joined by '|') of published posts newer than last_post_id."""
+        select_query = """
+            SELECT p.ID, p.post_title, GROUP_CONCAT(t.name SEPARATOR '|')
+            FROM wp_posts p
+            LEFT JOIN wp_term_relationships tr ON tr.object_id = p.ID
+            LEFT JOIN wp_term_taxonomy tt ON tt.term_taxonomy_id = tr.term_taxonomy_id AND tt.taxonomy = 'category'
+            LEFT JOIN wp_terms t ON t.term_id = tt.term_id
+            WHERE p.ID > %s
+            AND p.post_type = 'post'
+            AND p.post_status = 'publish'
+            GROUP BY p.ID, p.post_title
+            ORDER BY p.ID
+            LIMIT %s
+        """
+
+        cursor = self.cursor()
+        try:
+            cursor.execute(select_query, (last_post_id, limit))
+            return cursor.fetchall()
+        except mysql.connector.Error as err:
+            record_error(err)
+            print(f"Error: {err}")
+            return []
+        finally:
+            cursor.close()
+
+    @timed("mysql.fetch_post_titles")
+    def fetch_post_titles(self, post_ids):
+        """Return (ID, post_title, category names joined by '|') for the given posts."""
+        if not post_ids:
+            return []
+        placeholders = ", ".join(["%s"] * len(post_ids))
+        select_query = f"""
+            SELECT p.ID, p.post_title, GROUP_CONCAT(t.name SEPARATOR '|')
+            FROM wp_posts p
+            LEFT JOIN wp_term_relationships tr ON tr.object_id = p.ID
+            LEFT JOIN wp_term_taxonomy tt ON tt.term_taxonomy_id = tr.term_taxonomy_id AND tt.taxonomy = 'category'
+            LEFT JOIN wp_terms t ON t.term_id = tt.term_id
+            WHERE p.ID IN ({placeholders})
+            GROUP BY p.ID, p.post_title
+        """
+
+        cursor = self.cursor()
+        try:
+            cursor.execute(select_query, tuple(post_ids))
+            return cursor.fetchall()
+        except mysql.connector.Error as err:
+            record_error(err)
+            print(f"Error: {err}")
+            return []
+        finally:
+            cursor.close()
+
+    @timed("mysql.fetch_stale_posts")
+    def fetch_stale_posts(self, days: int, per_category: int = 1, limit: int = 20):
+        """Return (ID, post_title, post_content, term_id, refreshed sections JSON or None) of published posts
+        not modified for `days` days.
+
+        At most per_category posts per category are returned, least recently modified first, so a refresh
+        run spreads over the categories instead of rewriting one category's backlog.
+        """
+        select_query = """
+            SELECT stale.ID, post_title, post_content, term_id, m.meta_value AS refreshed_sections
+            FROM (
+                SELECT p.ID, p.post_title, p.post_content, p.post_modified, tt.term_id,
+                       ROW_NUMBER() OVER (PARTITION BY tt.term_id ORDER BY p.post_modified, p.ID) AS category_rank
+                FROM wp_posts p
+                JOIN wp_term_relationships tr ON tr.object_id = p.ID
+                JOIN wp_term_taxonomy tt ON tt.term_taxonomy_id = tr.term_taxonomy_id AND tt.taxonomy = 'category'
+                WHERE p.post_type = 'post'
+                AND p.post_status = 'publish'
+                AND p.post_modified < NOW() - INTERVAL %s DAY
+            ) stale
+            LEFT JOIN wp_postmeta m ON m.post_id = stale.ID AND m.meta_key = %s
+            WHERE category_rank <= %s
+            ORDER BY post_modified
+            LIMIT %s
+        """
+
+        cursor = self.cursor()
+        try:
+            cursor.execute(select_query, (days, REFRESHED_SECTIONS_META_KEY, per_category, limit))
+            return cursor.fetchall()
+        except mysql.connector.Error as err:
+            record_error(err)
+            print(f"Error: {err}")
+            return []
+        finally:
+            cursor.close()
+
+    @timed("mysql.update_post_content")
+    def update_post_content(self, post_id: int, post_content: str = None, summary: dict = None,
+                            refreshed_sections: str = None) -> bool:
+        """Replace a post's content in place (featured image untouched) and stamp post_modified.
+
+        With post_content=None only post_modified is stamped, e.g. after a refresh found nothing outdated.
+        A summary (see blog_parser.build_summary) of the new content replaces the excerpt and SUMMARY_META_KEYS.
+        The raw content stays: refreshed_sections (see REFRESHED_SECTIONS_META_KEY) replaces the stored
+        rewrites, so rerender.py renders the post with them.
+        """
+        post_modified = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        cursor = self.cursor()
+        try:
+            if post_content is None:
+                cursor.execute("UPDATE wp_posts SET post_modified = %s, post_modified_gmt = %s WHERE ID = %s",
+                               (post_modified, post_modified, post_id))
+            else:
+                cursor.execute(
+                    "UPDATE wp_posts SET post_content = %s, post_modified = %s, post_modified_gmt = %s WHERE ID = %s",
+                    (post_content, post_modified, post_modified, post_id),
+                )
+                if refreshed_sections is not None:
+                    cursor.execute("DELETE FROM wp_postmeta WHERE post_id = %s AND meta_key = %s",
+                                   (post_id, REFRESHED_SECTIONS_META_KEY))
+                    cursor.execute("INSERT INTO wp_postmeta (post_id, meta_key, meta_value) VALUES (%s, %s, %s)",
+                                   (post_id, REFRESHED_SECTIONS_META_KEY, refreshed_sections))
+            if post_content is not None and summary:
+                cursor.execute("UPDATE wp_posts SET post_excerpt = %s WHERE ID = %s", (summary.get("excerpt", ""), post_id))
+                meta_keys = [meta_key for field_keys in SUMMARY_META_KEYS.values() for meta_key in field_keys]
+                placeholders = ", ".join(["%s"] * len(meta_keys))
+                cursor.execute(f"DELETE FROM wp_postmeta WHERE post_id = %s AND meta_key IN ({placeholders})",
+                               (post_id, *meta_keys))
+                cursor.executemany("INSERT INTO wp_postmeta (post_id, meta_key, meta_value) VALUES (%s, %s, %s)",
+                                   [(post_id, meta_key, summary[field])
+                                    for field, field_keys in SUMMARY_META_KEYS.items() if summary.get(field) is not None
+                                    for meta_key in field_keys])
+            self.connection.commit()
+            return True
+        except mysql.connector.Error as err:
+            record_error(err)
+            print(f"Error: {err}")
+            self.connection.rollback()
+            return False
+        finally:
+            cursor.close()
+
+    @timed("mysql.fetch_raw_contents")
+    def fetch_raw_contents(self, last_post_id: int, limit: int = 500, blog_type: str = None):
+        """Return (ID, post_content, blog type, compressed JSON, inline image path, refreshed sections JSON) of
+        posts newer than last_post_id that have stored raw content (see RAW_CONTENT_META_KEYS), oldest first."""
+        select_query = """
+            SELECT p.ID, p.post_content,
+                   MAX(CASE WHEN m.meta_key = '_blog_type' THEN m.meta_value END) AS blog_type,
+                   MAX(CASE WHEN m.meta_key = '_blog_content' THEN m.meta_value END) AS raw_content,
+                   MAX(CASE WHEN m.meta_key = '_blog_inline_image' THEN m.meta_value END) AS inline_image,
+                   MAX(CASE WHEN m.meta_key = '_blog_refreshed_sections' THEN m.meta_value END) AS refreshed_sections
+            FROM wp_posts p
+            JOIN wp_postmeta m ON m.post_id = p.ID
+                AND m.meta_key IN ('_blog_type', '_blog_content', '_blog_inline_image', '_blog_refreshed_sections')
+            WHERE p.ID > %s
+            AND p.post_type = 'post'
+            GROUP BY p.ID, p.post_content
+            HAVING raw_content IS NOT NULL AND (%s IS NULL OR blog_type = %s)
+            ORDER BY p.ID
+            LIMIT %s
+        """
+
+        cursor = self.cursor()
+        try:
+            cursor.execute(select_query, (last_post_id, blog_type, blog_type, limit))
+            return cursor.fetchall()
+        except mysql.connector.Error as err:
+            record_error(err)
+            print(f"Error: {err}")
+            return []
+        finally:
+            cursor.close()
+
+    @timed("mysql.update_post_contents")
+    def update_post_contents(self, contents) -> bool:
+        """Write post_id -> post_content for a batch of posts with one UPDATE.
+
+        Used for re-rendering, which changes markup only, so post_modified is left alone and the posts do
+        not look recently edited to refresh.py or to readers.
+        """
+        if not contents:
+            return True
+        cursor = self.cursor()
+        try:
+            cursor.execute(*post_content_update(contents))
+            self.connection.commit()
+            return True
+        except mysql.connector.Error as err:
+            record_error(err)
+            print(f"Error: {err}")
+            self.connection.rollback()
+            return False
+        finally:
+            cursor.close()
+
+    @timed("mysql.queue_image_backfill")
+    def queue_image_backfill(self, post_id: int, kind: str, prompt: str):
+        """Queue an image a post was published without ("inline" or "featured") for pipeline.backfill_images."""
+        insert_query = """
+            INSERT INTO z_image_backfill (post_id, kind, prompt, attempts, created_at)
+            VALUES (%s, %s, %s, 0, %s)
+        """
+
+        cursor = self.cursor()
+        try:
+            cursor.execute(insert_query, (post_id, kind, prompt[:255], datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            self.connection.commit()
+            print(f"Post ID {post_id}: {kind} image queued for backfill.")
+        except mysql.connector.Error as err:
+            record_error(err)
+            print(f"Error: {err}")
+            self.connection.rollback()
+        finally:
+            cursor.close()
+
+    @timed("mysql.claim_image_backfills")
+    def claim_image_backfills(self, limit: int = 5):
+        """Lease the oldest queued backfills and count an attempt for each. Returns (post_id, kind, prompt).
+
+        A claimed row is skipped by other workers for BACKFILL_LEASE_SECONDS. It stays queued until
+        complete_inline_backfill/complete_featured_backfill, so a failed attempt is retried once the lease
+        expires, up to MAX_BACKFILL_ATTEMPTS.
+        """
+        now = datetime.now()
+        cursor = self.cursor()
+        try:
+            cursor.execute("""
+                SELECT post_id, kind, prompt FROM z_image_backfill
+                WHERE attempts < %s AND (claimed_at IS NULL OR claimed_at < %s)
+                ORDER BY created_at, post_id
+                LIMIT %s
+                FOR UPDATE
+            """, (MAX_BACKFILL_ATTEMPTS,
+                  (now - timedelta(seconds=BACKFILL_LEASE_SECONDS)).strftime('%Y-%m-%d %H:%M:%S'), limit))
+            records = cursor.fetchall()
+            for post_id, kind, prompt in records:
+                cursor.execute("""
+                    UPDATE z_image_backfill SET attempts = attempts + 1, claimed_at = %s
+                    WHERE post_id = %s AND kind = %s
+                """, (now.strftime('%Y-%m-%d %H:%M:%S'), post_id, kind))
+            self.connection.commit()
+            return records
+        except mysql.connector.Error as err:
+            record_error(err)
             print(f"Error: {err}")
             self.connection.rollback()
+            return []
+        finally:
+            cursor.close()
+
+    def fetch_variant_group(self, cursor, post_id: int):
+        """The post and its locale variants (see create_post_variants), which share their images."""
+        cursor.execute("SELECT post_id FROM wp_postmeta WHERE meta_key = '_blog_translation_of' AND meta_value = %s",
+                       (str(post_id),))
+        return [post_id] + [record[0] for record in cursor.fetchall()]
+
+    def dequeue_image_backfill(self, cursor, post_id: int, kind: str) -> bool:
+        """Delete a queued backfill without committing. False (and rolled back) if it is no longer queued.
+
+        The DELETE locks the row, so of two workers completing the same backfill only the first writes.
+        """
+        cursor.execute("DELETE FROM z_image_backfill WHERE post_id = %s AND kind = %s", (post_id, kind))
+        if cursor.rowcount:
+            return True
+        self.connection.rollback()
+        print(f"Post ID {post_id}: {kind} image backfill was already completed.")
+        return False
+
+    @timed("mysql.complete_inline_backfill")
+    def complete_inline_backfill(self, post_id: int, fragment: str, image_path: str, placeholder: str) -> bool:
+        """Put a backfilled inline image in place of the placeholder, in the post and its variants, and dequeue it.
+
+        Only posts that still hold the placeholder are changed; one that already has an inline image keeps it.
+        Returns False without writing anything if the backfill was already completed by another worker.
+        """
+        cursor = self.cursor()
+        try:
+            if not self.dequeue_image_backfill(cursor, post_id, "inline"):
+                return False
+            post_ids = self.fetch_variant_group(cursor, post_id)
+            placeholders = ", ".join(["%s"] * len(post_ids))
+            cursor.execute(f"SELECT ID, post_content FROM wp_posts WHERE ID IN ({placeholders})", tuple(post_ids))
+            contents = {record[0]: record[1].replace(placeholder, fragment, 1) for record in cursor.fetchall()
+                        if placeholder in record[1]}
+            # Markup only: post_modified stays, as with rerender.py
+            if contents:
+                cursor.execute(*post_content_update(contents))
+                cursor.executemany("INSERT INTO wp_postmeta (post_id, meta_key, meta_value) VALUES (%s, %s, %s)",
+                                   [(group_id, "_blog_inline_image", image_path) for group_id in contents])
+            self.connection.commit()
+            print(f"Inline image backfilled for Post IDs {sorted(contents)}.")
+            return True
+        except mysql.connector.Error as err:
+            record_error(err)
+            print(f"Error: {err}")
+            self.connection.rollback()
+            return False
+        finally:
+            cursor.close()
+
+    @timed("mysql.complete_featured_backfill")
+    def complete_featured_backfill(self, post_id: int, image_name: str, month: str, year: str, image_path: str) -> bool:
+        """Attach a backfilled featured image to the post and its variants, and dequeue it.
+
+        Returns False without writing anything if the backfill was already completed by another worker.
+        """
+        cursor = self.cursor()
+        try:
+            if not self.dequeue_image_backfill(cursor, post_id, "featured"):
+                return False
+            post_ids = self.fetch_variant_group(cursor, post_id)
+            attachment_id = self.insert_attachment(cursor, image_name, post_id, month, year)
+            meta = [(group_id, "_thumbnail_id", attachment_id) for group_id in post_ids]
+            meta.append((attachment_id, "_wp_attached_file", image_path))
+            cursor.executemany("INSERT INTO wp_postmeta (post_id, meta_key, meta_value) VALUES (%s, %s, %s)", meta)
+            self.connection.commit()
+            print(f"Featured image backfilled for Post IDs {post_ids} with attachment ID {attachment_id}.")
+            return True
+        except mysql.connector.Error as err:
+            record_error(err)
+            print(f"Error: {err}")
+            self.connection.rollback()
+            return False
+        finally:
+            cursor.close()
+
+    @timed("mysql.get_post")
+    def get_post(self, post_id: int):
+        """Return (post_title, post_content) of a post, or (None, None)."""
+        cursor = self.cursor()
+        try:
+            cursor.execute("SELECT post_title, post_content FROM wp_posts WHERE ID = %s", (post_id,))
+            record = cursor.fetchone()
+            return record if record else (None, None)
+        except mysql.connector.Error as err:
+            record_error(err)
+            print(f"Error: {err}")
+            return None, None
         finally:
             cursor.close()
 
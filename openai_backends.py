@@ -0,0 +1,542 @@
+# openai_backends.py
+# Pluggable backends for OpenAIHandler.
+#
+# - LiveBackend:      the real OpenAI API (default).
+# - RecordingBackend: calls the API and saves every chat and image response to a cassette directory.
+# - ReplayBackend:    serves recorded cassettes with no network access.
+# - HedgedBackend:    wraps another backend and re-sends calls that run past the usual latency.
+# - SyntheticBackend: generates schema-valid content for any blog type, with configurable latency
+#                     distributions and local image bytes, for offline load testing.
+#
+# A backend exposes three calls:
+#   chat_completion(model, messages, response_format, **options) -> ChatResult
+#   generate_image(model, prompt, size, quality, timeout=None) -> image URL
+#   download_image(url, timeout=None) -> bytes
+# A timeout (seconds; options["timeout"] for chat) aborts the call with an exception when it runs longer.
+# chat_completion returns the content as the model wrote it, even when it does not validate against
+# response_format (e.g. cut off at max_tokens); OpenAIHandler.chat repairs it.
+import base64
+import functools
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import threading
+import time
+import typing
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FuturesTimeout
+from types import SimpleNamespace
+from typing import List, Dict
+
+import requests
+from pydantic import BaseModel
+
+from metrics import log_event
+from usage_ledger import usage_fields
+
+
+class ChatResult:
+    """The parts of a chat completion the pipeline uses: the JSON content and the usage."""
+
+    def __init__(self, content: str, usage):
+        self.content = content
+        self.usage = usage
+
+
+def make_usage(prompt_tokens: int = 0, completion_tokens: int = 0, cached_tokens: int = 0):
+    """Build a usage object shaped like the SDK's `completion.usage`."""
+    return SimpleNamespace(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=prompt_tokens + completion_tokens,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=cached_tokens),
+    )
+
+
+DEFAULT_TIMEOUT = 600  # Seconds; calls without a deadline still may not hang forever
+DOWNLOAD_TIMEOUT = 60
+
+
+def strict_schema(node, defs: dict) -> dict:
+    """A Pydantic JSON schema node in the form structured outputs require with "strict": true.
+
+    Every object lists all its properties as required and allows no others, None defaults are dropped,
+    and a $ref with sibling keys (e.g. a description) is inlined, since the API rejects those.
+    """
+    node = dict(node)
+    if "$ref" in node and len(node) > 1:
+        ref = node.pop("$ref")
+        node = {**defs[ref.rsplit("/", 1)[-1]], **node}
+    if node.get("type") == "object":
+        node.setdefault("additionalProperties", False)
+    if "properties" in node:
+        node["properties"] = {name: strict_schema(prop, defs) for name, prop in node["properties"].items()}
+        node["required"] = list(node["properties"])
+    if isinstance(node.get("items"), dict):
+        node["items"] = strict_schema(node["items"], defs)
+    for key in ("anyOf", "allOf", "prefixItems"):
+        if key in node:
+            node[key] = [strict_schema(entry, defs) for entry in node[key]]
+    if "$defs" in node:
+        node["$defs"] = {name: strict_schema(definition, defs) for name, definition in node["$defs"].items()}
+    if "default" in node and node["default"] is None:
+        del node["default"]
+    return node
+
+
+@functools.lru_cache(maxsize=None)
+def json_schema_format(response_format: typing.Type[BaseModel]) -> dict:
+    """The structured-output `response_format` for a Pydantic model."""
+    schema = response_format.model_json_schema()
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": response_format.__name__,
+            "schema": strict_schema(schema, schema.get("$defs", {})),
+            "strict": True,
+        },
+    }
+
+
+class LiveBackend:
+    def __init__(self, api_key, timeout: float = DEFAULT_TIMEOUT, download_timeout: float = DOWNLOAD_TIMEOUT):
+        from openai import OpenAI
+
+        self.client = OpenAI(api_key=api_key, timeout=timeout)
+        self.download_timeout = download_timeout
+
+    def chat_completion(self, model: str, messages: List[Dict[str, str]], response_format, **options) -> ChatResult:
+        prompt_cache_key = options.pop("prompt_cache_key", None)
+        extra_body = {"prompt_cache_key": prompt_cache_key} if prompt_cache_key else None
+
+        completion = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            response_format=json_schema_format(response_format),
+            extra_body=extra_body,
+            **options
+        )
+        # Not parsed here: truncated, refused or malformed output goes back to OpenAIHandler.chat to repair
+        return ChatResult(completion.choices[0].message.content or "", completion.usage)
+
+    def generate_image(self, model: str, prompt: str, size: str, quality: str, timeout: float = None) -> str:
+        client = self.client.with_options(timeout=timeout) if timeout is not None else self.client
+        response = client.images.generate(
+            model=model,
+            prompt=prompt,
+            size=size,
+            quality=quality,
+            n=1
+        )
+        return response.data[0].url
+
+    def download_image(self, url: str, timeout: float = None) -> bytes:
+        response = requests.get(url, timeout=timeout if timeout is not None else self.download_timeout)
+        response.raise_for_status()
+        return response.content
+
+
+def cassette_key(kind: str, request: dict) -> str:
+    """Stable name for a request, so identical requests map to the same cassette."""
+    payload = json.dumps({"kind": kind, "request": request}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def chat_request(model: str, messages, response_format) -> dict:
+    return {"model": model, "messages": messages, "response_format": response_format.__name__}
+
+
+class RecordingBackend:
+    """Forward calls to another backend and save each response as a cassette."""
+
+    def __init__(self, cassette_dir: str, inner):
+        self.cassette_dir = cassette_dir
+        self.inner = inner
+        self._image_keys = {}  # url -> cassette key, so download_image knows where to save the bytes
+        os.makedirs(cassette_dir, exist_ok=True)
+
+    def _save(self, key: str, cassette: dict):
+        with open(os.path.join(self.cassette_dir, f"{key}.json"), "w") as f:
+            json.dump(cassette, f, indent=2)
+
+    def chat_completion(self, model, messages, response_format, **options) -> ChatResult:
+        request = chat_request(model, messages, response_format)
+        result = self.inner.chat_completion(model, messages, response_format, **options)
+        self._save(cassette_key("chat", request), {
+            "kind": "chat",
+            "request": request,
+            "content": result.content,
+            "usage": usage_fields(result.usage),
+        })
+        return result
+
+    def generate_image(self, model, prompt, size, quality, timeout: float = None) -> str:
+        url = self.inner.generate_image(model, prompt, size, quality, timeout=timeout)
+        request = {"model": model, "prompt": prompt, "size": size, "quality": quality}
+        self._image_keys[url] = (cassette_key("image", request), request)
+        return url
+
+    def download_image(self, url: str, timeout: float = None) -> bytes:
+        data = self.inner.download_image(url, timeout=timeout)
+        if url in self._image_keys:
+            key, request = self._image_keys.pop(url)
+            self._save(key, {"kind": "image", "request": request, "data": base64.b64encode(data).decode("ascii")})
+        return data
+
+
+class ReplayBackend:
+    """Serve recorded cassettes without touching the network.
+
+    match="exact" looks cassettes up by request; match="schema" hands out any recorded response for the
+    same response model (round-robin), which lets a small recording drive thousands of posts. Requests
+    with no cassette raise KeyError unless a fallback backend (e.g. SyntheticBackend) is given.
+    """
+
+    def __init__(self, cassette_dir: str, match: str = "exact", fallback=None):
+        self.cassette_dir = cassette_dir
+        self.match = match
+        self.fallback = fallback
+        self._lock = threading.Lock()
+        self._cassettes = {}
+        self._by_schema = {}
+        self._images = []
+        self._counter = 0
+
+        for file_name in sorted(os.listdir(cassette_dir)):
+            if not file_name.endswith(".json"):
+                continue
+            with open(os.path.join(cassette_dir, file_name)) as f:
+                cassette = json.load(f)
+            key = file_name[:-len(".json")]
+            self._cassettes[key] = cassette
+            if cassette["kind"] == "chat":
+                self._by_schema.setdefault(cassette["request"]["response_format"], []).append(cassette)
+            else:
+                self._images.append(key)
+
+    def _next(self, candidates):
+        with self._lock:
+            self._counter += 1
+            return candidates[self._counter % len(candidates)]
+
+    def chat_completion(self, model, messages, response_format, **options) -> ChatResult:
+        cassette = self._cassettes.get(cassette_key("chat", chat_request(model, messages, response_format)))
+        if cassette is None and self.match == "schema" and self._by_schema.get(response_format.__name__):
+            cassette = self._next(self._by_schema[response_format.__name__])
+        if cassette is None:
+            if self.fallback:
+                return self.fallback.chat_completion(model, messages, response_format, **options)
+            raise KeyError(f"No cassette for {response_format.__name__} request")
+        return ChatResult(cassette["content"], make_usage(**cassette["usage"]))
+
+    def generate_image(self, model, prompt, size, quality, timeout: float = None) -> str:
+        key = cassette_key("image", {"model": model, "prompt": prompt, "size": size, "quality": quality})
+        if key not in self._cassettes and self.match == "schema" and self._images:
+            key = self._next(self._images)
+        if key not in self._cassettes:
+            if self.fallback:
+                return self.fallback.generate_image(model, prompt, size, quality, timeout=timeout)
+            raise KeyError(f"No cassette for image prompt '{prompt}'")
+        return f"cassette://{key}"
+
+    def download_image(self, url: str, timeout: float = None) -> bytes:
+        if not url.startswith("cassette://"):
+            return self.fallback.download_image(url, timeout=timeout)
+        return base64.b64decode(self._cassettes[url[len("cassette://"):]]["data"])
+
+
+class HedgedBackend:
+    """Fire a duplicate request when a call runs past the usual latency; the first result wins.
+
+    The hedge delay is the chosen percentile of recent latencies for the same call kind and model
+    (initial_delay until min_samples calls have been seen). At most budget_per_hour duplicates are sent
+    per rolling hour, which bounds the extra spend. A losing request cannot be aborted mid-HTTP-call; its
+    result is discarded when it arrives, but it is still paid for: set on_hedge to record it. download_image
+    is passed through, since downloads are cheap.
+
+    The delay is measured from when a request starts running, so time queued for a free thread in the pool
+    does not trigger hedges; a call still queued after the delay is not hedged and raises TimeoutError if it
+    cannot start within its timeout. Size max_workers to twice the calls the caller can have in flight.
+    """
+
+    def __init__(self, inner, percentile: float = 0.95, budget_per_hour: int = 20, min_samples: int = 20,
+                 initial_delay: float = None, window: int = 200, max_workers: int = 32):
+        self.inner = inner
+        self.percentile = percentile
+        self.budget_per_hour = budget_per_hour
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.window = window
+        self._lock = threading.Lock()
+        self._latencies = {}  # (kind, model) -> recent latencies in seconds
+        self._hedges = []  # monotonic times of hedges sent in the last hour
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+        # on_hedge(kind, model, args) is called in the calling thread when a hedge is sent. It may return a
+        # callable(result, duration) that gets the losing request's result if that request succeeds.
+        self.on_hedge = None
+
+    def chat_completion(self, model, messages, response_format, **options) -> ChatResult:
+        return self._hedged(("chat", model), self.inner.chat_completion, model, messages, response_format, **options)
+
+    def generate_image(self, model, prompt, size, quality, timeout: float = None) -> str:
+        return self._hedged(("image", model), self.inner.generate_image, model, prompt, size, quality,
+                            timeout=timeout)
+
+    def download_image(self, url: str, timeout: float = None) -> bytes:
+        return self.inner.download_image(url, timeout=timeout)
+
+    def hedge_delay(self, key):
+        """Seconds to wait before hedging a call, or None while there is too little data."""
+        with self._lock:
+            latencies = sorted(self._latencies.get(key, ()))
+        if len(latencies) < self.min_samples:
+            return self.initial_delay
+        index = max(0, min(len(latencies) - 1, int(round(self.percentile * len(latencies))) - 1))
+        return latencies[index]
+
+    def _observe(self, key, duration: float):
+        with self._lock:
+            latencies = self._latencies.setdefault(key, [])
+            latencies.append(duration)
+            if len(latencies) > self.window:
+                del latencies[0]
+
+    def _take_budget(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            self._hedges = [sent for sent in self._hedges if now - sent < 3600]
+            if len(self._hedges) >= self.budget_per_hour:
+                return False
+            self._hedges.append(now)
+            return True
+
+    def _submit(self, key, call, *args, **kwargs):
+        """Run a call in the pool. Returns its future, which gives (result, duration), and a start marker."""
+        started = SimpleNamespace(event=threading.Event(), at=None)
+
+        def timed_call():
+            started.at = time.monotonic()
+            started.event.set()
+            start = time.perf_counter()
+            result = call(*args, **kwargs)
+            # Every finished request counts, winners and losers, so hedging doesn't skew the percentile
+            duration = time.perf_counter() - start
+            self._observe(key, duration)
+            return result, duration
+        return self._executor.submit(timed_call), started
+
+    def _hedged(self, key, call, *args, **kwargs):
+        delay = self.hedge_delay(key)
+        if delay is None:
+            # Too little data to hedge yet; the latency still counts towards min_samples
+            start = time.perf_counter()
+            result = call(*args, **kwargs)
+            self._observe(key, time.perf_counter() - start)
+            return result
+
+        submitted = time.monotonic()
+        primary, primary_started = self._submit(key, call, *args, **kwargs)
+        # Time queued for a free thread does not count towards the delay, but the wait for one is bounded
+        if not primary_started.event.wait(delay):
+            # The pool is full, so a hedge would only queue behind the primary. Give the primary until the
+            # caller's timeout to start, which its own timeout then bounds.
+            timeout = kwargs.get("timeout")
+            remaining = None if timeout is None else max(0.0, timeout - (time.monotonic() - submitted))
+            if not primary_started.event.wait(remaining) and primary.cancel():
+                raise TimeoutError(f"Request still queued for a free thread after {timeout:.3f}s")
+            return primary.result()[0]
+        try:
+            return primary.result(timeout=max(0.0, primary_started.at + delay - time.monotonic()))[0]
+        except FuturesTimeout:
+            pass
+        if kwargs.get("timeout") is not None:
+            # The hedge must end when the primary's timeout does, or it would overrun the caller's deadline
+            remaining = kwargs["timeout"] - (time.monotonic() - primary_started.at)
+            if remaining <= 0:
+                return primary.result()[0]
+            kwargs = dict(kwargs, timeout=remaining)
+        if not self._take_budget():
+            log_event("hedge_skipped", kind=key[0], model=key[1], reason="budget")
+            return primary.result()[0]
+
+        log_event("hedge_sent", kind=key[0], model=key[1], delay_ms=round(delay * 1000, 1))
+        record_loser = self.on_hedge(key[0], key[1], args) if self.on_hedge else None
+
+        def record(finished):
+            if finished.exception() is None:
+                record_loser(*finished.result())
+        hedge, _ = self._submit(key, call, *args, **kwargs)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        # A loser that already started is paid for; record it once it finishes
+                        if not loser.cancel() and record_loser is not None:
+                            loser.add_done_callback(record)
+                    log_event("hedge_won", kind=key[0], model=key[1], winner="hedge" if future is hedge else "primary")
+                    return future.result()[0]
+                error = future.exception()
+        raise error
+
+
+class LatencyModel:
+    """Latency distribution in seconds.
+
+    kind="lognormal" (median, sigma) matches the long tail of real API calls; "uniform" (low, high)
+    and "fixed" (median) are also available. `scale` multiplies every sample, e.g. 0.01 to run a
+    thousand-post load test in seconds while keeping the shape of the distribution.
+    """
+
+    def __init__(self, kind: str = "lognormal", median: float = 1.0, sigma: float = 0.5, low: float = 0.0,
+                 high: float = 0.0, scale: float = 1.0):
+        self.kind = kind
+        self.median = median
+        self.sigma = sigma
+        self.low = low
+        self.high = high
+        self.scale = scale
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            value = self.median
+        elif self.kind == "uniform":
+            value = rng.uniform(self.low, self.high)
+        else:
+            value = rng.lognormvariate(math.log(self.median), self.sigma)
+        return value * self.scale
+
+    @classmethod
+    def from_spec(cls, spec: str, scale: float = 1.0):
+        """Parse "lognormal:12,0.6", "uniform:2,8" or "fixed:3"."""
+        kind, _, params = spec.partition(":")
+        values = [float(value) for value in params.split(",")] if params else []
+        if kind == "uniform":
+            return cls("uniform", low=values[0], high=values[1], scale=scale)
+        if kind == "fixed":
+            return cls("fixed", median=values[0], scale=scale)
+        return cls("lognormal", median=values[0] if values else 1.0, sigma=values[1] if len(values) > 1 else 0.5,
+                   scale=scale)
+
+
+WORDS = ("passive income investing portfolio dividend savings budget automation growth strategy risk "
+         "compound interest market index fund rental property side hustle online course royalties app "
+         "subscription cash flow diversification retirement goal plan review").split()
+
+
+class SyntheticBackend:
+    """Generate schema-valid responses locally for any Pydantic response model."""
+
+    def __init__(self, chat_latency: LatencyModel = None, image_latency: LatencyModel = None,
+                 download_latency: LatencyModel = None, image_path: str = None, list_length=(3, 8), seed=None,
+                 tokens_per_second: float = None, invalid_rate: float = 0.0):
+        self.chat_latency = chat_latency or LatencyModel(median=15.0, sigma=0.5)
+        # With a decode rate, chat latency is the sampled time to first token plus output length / rate
+        self.tokens_per_second = tokens_per_second
+        self.image_latency = image_latency or LatencyModel(median=10.0, sigma=0.4)
+        self.download_latency = download_latency or LatencyModel(median=0.5, sigma=0.5)
+        self.list_length = list_length
+        # Share of chat responses with a defect (see _corrupt), to exercise OpenAIHandler.repair
+        self.invalid_rate = invalid_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._image_bytes = {}
+        self.image_path = image_path
+
+    def _random(self):
+        # random.Random is not thread-safe for reproducible sequences; draw under a lock
+        with self._lock:
+            return random.Random(self._rng.random())
+
+    def _sentence(self, rng, words=12) -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+    def _value(self, annotation, rng):
+        origin = typing.get_origin(annotation)
+        if origin in (list, List):
+            (item_type,) = typing.get_args(annotation)
+            return [self._value(item_type, rng) for _ in range(rng.randint(*self.list_length))]
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            return self.build(annotation, rng)
+        if annotation is bool:
+            return rng.random() < 0.5
+        if annotation is int:
+            return rng.randint(1, 100)
+        if annotation is float:
+            return round(rng.uniform(1, 100), 2)
+        return " ".join(self._sentence(rng) for _ in range(rng.randint(1, 3)))
+
+    def build(self, model, rng=None) -> dict:
+        """Build a dict that validates against `model`."""
+        rng = rng or self._random()
+        return {name: self._value(field.annotation, rng) for name, field in model.model_fields.items()}
+
+    def chat_completion(self, model, messages, response_format, **options) -> ChatResult:
+        rng = self._random()
+        content = response_format(**self.build(response_format, rng)).model_dump_json()
+        if self.invalid_rate and rng.random() < self.invalid_rate:
+            content = self._corrupt(json.loads(content), rng)
+        # Roughly four characters per token
+        prompt_tokens = len(json.dumps(messages)) // 4 + len(json.dumps(response_format.model_json_schema())) // 4
+        completion_tokens = len(content) // 4
+        latency = self.chat_latency.sample(rng)
+        if self.tokens_per_second:
+            latency += completion_tokens / self.tokens_per_second
+        self._wait(latency, options.get("timeout"))
+        return ChatResult(content, make_usage(prompt_tokens, completion_tokens))
+
+    def generate_image(self, model, prompt, size, quality, timeout: float = None) -> str:
+        self._wait(self.image_latency.sample(self._random()), timeout)
+        return f"synthetic://{size}"
+
+    def download_image(self, url: str, timeout: float = None) -> bytes:
+        self._wait(self.download_latency.sample(self._random()), timeout)
+        return self._load_image(url[len("synthetic://"):])
+
+    @staticmethod
+    def _corrupt(data: dict, rng) -> str:
+        """Serialize a response with one defect real ones have: a missing field, a wrong type or a cut-off."""
+        name = rng.choice(list(data))
+        defect = rng.choice(("missing", "type", "truncated"))
+        if defect == "missing":
+            del data[name]
+        elif defect == "type":
+            data[name] = {"unexpected": True}
+        content = json.dumps(data)
+        if defect == "truncated":
+            return content[:rng.randint(len(content) // 2, len(content) - 1)]
+        return content
+
+    @staticmethod
+    def _wait(latency: float, timeout: float = None):
+        # Behave like a client timeout: give up after `timeout` seconds instead of returning late
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"Request timed out after {timeout:.3f}s")
+        time.sleep(latency)
+
+    def _load_image(self, size: str) -> bytes:
+        with self._lock:
+            if size not in self._image_bytes:
+                if self.image_path:
+                    with open(self.image_path, "rb") as f:
+                        self._image_bytes[size] = f.read()
+                else:
+                    self._image_bytes[size] = make_test_image(size)
+            return self._image_bytes[size]
+
+
+def make_test_image(size: str = "1024x1024") -> bytes:
+    """A gradient JPEG of the requested size, so Pillow and OpenCV have real pixels to work on."""
+    from PIL import Image
+
+    width, height = (int(value) for value in size.split("x"))
+    img = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
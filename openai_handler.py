@@ -1,14 +1,22 @@
 # openai_handler.py
+import json
 import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 
-import requests
-from pydantic import BaseModel
-from typing import List, Dict
-from openai import OpenAI
+from pydantic import BaseModel, TypeAdapter, ValidationError, create_model
+from typing import List, Dict, Optional, Tuple
 from PIL import Image
 import cv2
 
+from metrics import span, timed, record_error
+from openai_backends import LiveBackend
+from routing import ModelRouter
+from usage_ledger import UsageLedger, usage_fields
+
 # Define the response model using Pydantic
 class BlogSection(BaseModel):
     heading: str  # Each section will have a heading
@@ -132,119 +140,474 @@ class ExpertOpinionsContent(BaseModel):
     further_reading: List[str]
     conclusion: str
 
+class OutdatedSection(BaseModel):
+    index: int  # Number of the section, as given in the prompt
+    reason: str  # What is outdated
+
+
+class OutdatedSections(BaseModel):
+    sections: List[OutdatedSection]  # Only the outdated sections; empty if the post is still current
+
+
+class SectionUpdate(BaseModel):
+    index: int  # Number of the section being replaced, as given in the prompt
+    reason: str  # What was outdated
+    content: str  # Replacement HTML for the whole section, heading included
+
+
+class PostRefresh(BaseModel):
+    updates: List[SectionUpdate]  # One per section sent for rewriting
+
+
+class SectionBody(BaseModel):
+    content: str  # Body of one section of an outline; the heading is fixed by the outline
+
+# Maps each blog_type to the Pydantic model its response must follow
+RESPONSE_FORMATS = {
+    "top_10_list": Top10BlogContent,
+    "step_by_step_guide": StepByStepGuideContent,
+    "pros_and_cons": ProsAndConsContent,
+    "case_study": CaseStudyContent,
+    "how_to_tutorial": HowToTutorialContent,
+    "beginners_guide": BeginnersGuideContent,
+    "in_depth_review": InDepthReviewContent,
+    "myths_and_misconceptions": MythsAndMisconceptionsContent,
+    "benefits_overview": BenefitsOverviewContent,
+    "expert_opinions": ExpertOpinionsContent,
+    # Not a template type: partial rewrites of published posts (see refresh.py)
+    "refresh": PostRefresh,
+}
+# The template types, as seeded into blog_templates by `storage.py init`, the benchmarks and the load test
+BLOG_TYPES = [blog_type for blog_type in RESPONSE_FORMATS if blog_type != "refresh"]
+
+PROMPT_CACHE_KEY_PREFIX = "blog"
+OUTLINE_MAX_WORKERS = 8  # Section expansions in flight per post
+MAX_REPAIR_ATTEMPTS = 2  # Repair calls for one invalid response before giving up
+
+# OpenAI caches prompts by exact prefix: the response schema (identical per blog type) and this system
+# prompt come first and must stay byte-identical between calls, so nothing per-post may be added here.
+# Everything that varies (category, template wording) belongs in the user message at the end.
+SYSTEM_PROMPT = "You are an expert blog writer with a deep understanding of finance, technology, and investment strategies. Your task is to create highly engaging and informative content for an audience interested in passive income opportunities."
+
+
+class ImageProfile(BaseModel):
+    """How to generate the image for one use: the API call, and the local resize if the API can't match."""
+    model: str
+    size: str  # Requested from the API, e.g. "512x512"
+    quality: str = "standard"
+    output_size: Optional[Tuple[int, int]] = None  # Resize to this after download; None keeps the API size
+    jpeg_quality: int = 70
+
+
+# Generate at the smallest size each use publishes: DALL-E 3 only goes down to 1024x1024, so the
+# smaller images come from DALL-E 2, which returns 512x512/256x256 directly with no OpenCV resize.
+IMAGE_PROFILES = {
+    "featured": ImageProfile(model="dall-e-3", size="1024x1024"),
+    "inline": ImageProfile(model="dall-e-2", size="512x512"),
+    "thumbnail": ImageProfile(model="dall-e-2", size="256x256"),
+}
+
+
+# Languages for locale variants (pipeline.generate_and_publish(locales=...)); other codes are passed as-is
+LOCALE_NAMES = {
+    "en": "English",
+    "de": "German",
+    "es": "Spanish",
+    "fr": "French",
+    "it": "Italian",
+    "nl": "Dutch",
+    "pt": "Portuguese",
+    "pl": "Polish",
+    "ja": "Japanese",
+}
+
+
+def section_fields(resp_format) -> List[str]:
+    """Names of the List[BlogSection] fields of a response model, the ones outline mode expands."""
+    return [name for name, field in resp_format.model_fields.items() if field.annotation == List[BlogSection]]
+
+
+@lru_cache(maxsize=None)
+def outline_model(resp_format):
+    """resp_format with every List[BlogSection] field reduced to its headings; other fields stay as they are."""
+    expanded = section_fields(resp_format)
+    fields = {name: (List[str] if name in expanded else field.annotation, ...)
+              for name, field in resp_format.model_fields.items()}
+    return create_model(f"{resp_format.__name__}Outline", **fields)
+
+
+@lru_cache(maxsize=None)
+def repair_model(resp_format, fields: Tuple[str, ...]):
+    """resp_format reduced to the given fields, for regenerating only those."""
+    return create_model(f"{resp_format.__name__}Repair",
+                        **{name: (resp_format.model_fields[name].annotation, ...) for name in fields})
+
+
+def salvage_fields(content: str) -> dict:
+    """The top-level fields of a JSON object that parse, up to the first one that does not.
+
+    A response cut off at max_tokens keeps every field completed before the cut.
+    """
+    decoder = json.JSONDecoder()
+    fields = {}
+    position = content.find("{") + 1
+    try:
+        while position:
+            position = len(content) - len(content[position:].lstrip(" \t\r\n,"))
+            if position >= len(content) or content[position] == "}":
+                break
+            key, position = decoder.raw_decode(content, position)
+            position = content.index(":", position) + 1
+            position = len(content) - len(content[position:].lstrip())
+            fields[key], position = decoder.raw_decode(content, position)
+    except ValueError:
+        pass
+    return fields
+
+
+def invalid_fields(resp_format, fields: dict) -> Dict[str, str]:
+    """Validate fields one by one. Returns field name -> problem for each missing or invalid field."""
+    problems = {}
+    for name, field in resp_format.model_fields.items():
+        if name not in fields:
+            problems[name] = "missing"
+            continue
+        try:
+            TypeAdapter(field.annotation).validate_python(fields[name])
+        except ValidationError as e:
+            problems[name] = "; ".join(
+                f"{'.'.join(str(part) for part in (name,) + error['loc'])}: {error['msg']}" for error in e.errors()
+            )
+    return problems
+
+
+def build_messages(user_prompt: str) -> List[Dict[str, str]]:
+    """Build the chat messages with the static prefix first and the per-post prompt last."""
+    return [
+        {
+            "role": "system",
+            "content": SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": user_prompt
+        }
+    ]
+
+
 # Define OpenAIHandler class
 class OpenAIHandler:
-    def __init__(self, api_key):
-        # Initialize OpenAI client with the provided API key
-        self.client = OpenAI(api_key=api_key)
-
-    def generate_blog_post(self, category: str, blog_type: str, user_prompt: str) -> str:
+    def __init__(self, api_key=None, ledger=None, backend=None, image_profiles=None, router=None):
+        # Calls go through a backend: the real API by default, or a recorder/replayer/synthetic generator
+        # (see openai_backends.py) for offline runs
+        self.backend = backend if backend is not None else LiveBackend(api_key=api_key)
+        # Every call is recorded in the usage ledger, tagged with the post being generated
+        self.ledger = ledger if ledger is not None else UsageLedger()
+        # The worker daemon shares one handler between threads, so each thread tags its own post
+        self._local = threading.local()
+        # Model, max_tokens and temperature per blog type (see routing.py)
+        self.router = router if router is not None else ModelRouter()
+        # Overrides per use, e.g. {"inline": {"model": "dall-e-3", "size": "1024x1024", "output_size": [512, 512]}}
+        self.image_profiles = dict(IMAGE_PROFILES)
+        for name, profile in (image_profiles or {}).items():
+            self.image_profiles[name] = profile if isinstance(profile, ImageProfile) else ImageProfile(**profile)
+        # HedgedBackend pays for the losing request of every hedge; record those in the ledger too
+        if hasattr(self.backend, "on_hedge"):
+            self.backend.on_hedge = self.hedge_recorder
+
+    @property
+    def usage_context(self) -> dict:
+        if not hasattr(self._local, "usage_context"):
+            self._local.usage_context = {}
+        return self._local.usage_context
+
+    @usage_context.setter
+    def usage_context(self, value: dict):
+        self._local.usage_context = value
+
+    def begin_post(self, term_id=None, blog_type=None, deadline=None):
+        """Start tagging ledger entries for a new post; calls for it are limited by `deadline` (see deadlines.py)."""
+        self.usage_context = {"run_id": UsageLedger.new_run_id(), "term_id": term_id, "blog_type": blog_type,
+                              "deadline": deadline}
+
+    def stage_timeout(self, stage: str):
+        """Timeout for the next call of a stage under the current post's deadline; None without a deadline.
+
+        Raises DeadlineExceeded when the stage has no time left.
+        """
+        deadline = self.usage_context.get("deadline")
+        if deadline is None:
+            return None
+        deadline.check(stage)
+        return deadline.timeout(stage)
+
+    def hedge_recorder(self, kind: str, model: str, args):
+        """HedgedBackend.on_hedge: record the losing request of a hedge under the current post, tagged as a hedge."""
+        context = dict(self.usage_context, hedge=True)
+        if kind == "chat":
+            return lambda completion, duration: self.ledger.record_chat(model, completion.usage, duration, context)
+        model, prompt, size, quality = args
+        return lambda url, duration: self.ledger.record_image(model, size, quality, 1, duration, context)
+
+    def assign_post(self, post_id: int):
+        """Attach the post_id to the calls already made for the current post (and to later ones)."""
+        self.usage_context["post_id"] = post_id
+        if self.usage_context.get("run_id"):
+            self.ledger.assign_post(self.usage_context["run_id"], post_id)
+
+    def generate_blog_post(self, category: str, blog_type: str, user_prompt: str, prompt_cache_key: str = None) -> str:
         """Generate a blog post with a given category using OpenAI."""
-        # Call the OpenAI API for blog generation
-        resp_format = "BlogContent"
-        if blog_type == "top_10_list":
-            resp_format = Top10BlogContent
-        if blog_type == "step_by_step_guide":
-            resp_format = StepByStepGuideContent
-        if blog_type == "pros_and_cons":
-            resp_format = ProsAndConsContent
-        if blog_type == "case_study":
-            resp_format = CaseStudyContent
-        if blog_type == "how_to_tutorial":
-            resp_format = HowToTutorialContent
-        if blog_type == "beginners_guide":
-            resp_format = BeginnersGuideContent
-        if blog_type == "in_depth_review":
-            resp_format = InDepthReviewContent
-        if blog_type == "myths_and_misconceptions":
-            resp_format = MythsAndMisconceptionsContent
-        if blog_type == "benefits_overview":
-            resp_format = BenefitsOverviewContent
-        if blog_type == "expert_opinions":
-            resp_format = ExpertOpinionsContent
-
-
-        completion = self.client.beta.chat.completions.parse(
-            model="gpt-4o-mini",  # Adjust the model if needed
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert blog writer with a deep understanding of finance, technology, and investment strategies. Your task is to create highly engaging and informative content for an audience interested in passive income opportunities."
-                },
-                {
-                    "role": "user",
-                    "content": user_prompt
-                }
-            ],
-            response_format=resp_format,  # Parse response directly into the Pydantic model
-        )
+        resp_format = RESPONSE_FORMATS.get(blog_type, BlogContent)
+        if self.router.route(blog_type).outline and section_fields(resp_format):
+            return self.generate_outlined_post(blog_type, user_prompt)
+        return self.chat(blog_type, resp_format, user_prompt, prompt_cache_key)
+
+    def chat(self, route_name: str, resp_format, user_prompt: str, prompt_cache_key: str = None,
+             stage: str = "generate") -> str:
+        """Run one structured completion on the route's model and record it in the ledger under route_name.
+
+        Returns the JSON content matching resp_format. A response that does not validate is repaired: the
+        valid fields are kept and only the missing or invalid ones are generated again (see repair).
+        """
+        content = self.complete(route_name, resp_format, user_prompt, prompt_cache_key, stage)
+        try:
+            resp_format.model_validate_json(content or "")
+            return content
+        except ValidationError:
+            return self.repair(resp_format, user_prompt, content or "", stage)
+
+    def complete(self, route_name: str, resp_format, user_prompt: str, prompt_cache_key: str = None,
+                 stage: str = "generate") -> str:
+        """One chat completion as returned by the backend, not validated."""
+        # Requests that share a key are routed to the same cache shard; one key per blog type keeps the
+        # schema prefix warm without concentrating all traffic on a single shard
+        if prompt_cache_key is None:
+            prompt_cache_key = f"{PROMPT_CACHE_KEY_PREFIX}-{route_name}"
+
+        route = self.router.route(route_name)
+        options = route.options()
+        timeout = self.stage_timeout(stage)
+        if timeout is not None:
+            options["timeout"] = timeout
+        with span("openai.chat_completion", model=route.model, blog_type=route_name) as chat_span:
+            completion = self.backend.chat_completion(
+                model=route.model,
+                messages=build_messages(user_prompt),
+                response_format=resp_format,  # Parse response directly into the Pydantic model
+                prompt_cache_key=prompt_cache_key,
+                **options
+            )
+            chat_span.set(**usage_fields(completion.usage))
 
-        # Extract the parsed BlogContent model (no need to manually subscript)
-        blog_content_json = completion.choices[0].message.content
+        self.ledger.record_chat(route.model, completion.usage, chat_span.duration,
+                                dict(self.usage_context, blog_type=route_name))
+        return completion.content
 
-        # print(blog_content_json)
+    def repair(self, resp_format, user_prompt: str, content: str, stage: str = "generate") -> str:
+        """Regenerate only the missing or invalid fields of a response and merge them into the valid ones.
 
-        # Return the structured blog content
-        return blog_content_json
-        # return user_prompt
+        The repair prompt repeats the original prompt and the fields that are kept, so the new fields fit
+        them. Calls are recorded under the "repair" route. Raises ValidationError if the response is still
+        invalid after MAX_REPAIR_ATTEMPTS.
+        """
+        fields = salvage_fields(content)
+        for attempt in range(MAX_REPAIR_ATTEMPTS):
+            problems = invalid_fields(resp_format, fields)
+            if not problems:
+                break
+            kept = {name: value for name, value in fields.items()
+                    if name in resp_format.model_fields and name not in problems}
+            repair_prompt = (
+                f"{user_prompt}\n\nPart of your previous answer was missing or invalid. These fields are final; "
+                f"keep them as they are:\n{json.dumps(kept, ensure_ascii=False)}\n\nWrite only the following fields "
+                f"again, consistent with the fields above:\n"
+                + "\n".join(f"- {name}: {problem}" for name, problem in problems.items())
+            )
+            with span("openai.repair", response_model=resp_format.__name__, fields=len(problems), kept=len(kept)):
+                repaired = self.complete("repair", repair_model(resp_format, tuple(problems)), repair_prompt,
+                                         f"{PROMPT_CACHE_KEY_PREFIX}-repair", stage)
+            print(f"Repaired {', '.join(problems)} of a {resp_format.__name__} response (attempt {attempt + 1}).")
+            fields = dict(kept, **{name: value for name, value in salvage_fields(repaired or "").items()
+                                   if name in problems})
+        # Field order of the model, as a complete response would have it
+        return resp_format.model_validate({name: fields.get(name) for name in resp_format.model_fields
+                                           if name in fields}).model_dump_json()
+
+    def generate_outlined_post(self, blog_type: str, user_prompt: str) -> str:
+        """Generate a post as an outline first, then write every section body in parallel.
+
+        The outline call returns the full response model except that each List[BlogSection] holds only
+        headings. Each heading is then expanded by its own call and the bodies are put back in place, so
+        the wall-clock time is the outline plus the slowest section instead of one long completion.
+        Returns JSON matching the blog type's response model, like generate_blog_post.
+        """
+        resp_format = RESPONSE_FORMATS[blog_type]
+        expanded = section_fields(resp_format)
+
+        outline_prompt = (
+            f"{user_prompt}\n\nWrite the outline of this post first. Give the title, intro and conclusion in full "
+            f"and every other field in full, except {', '.join(expanded)}: for those, list only the section "
+            f"headings, in order, without any body text."
+        )
+        with span("openai.outline", blog_type=blog_type):
+            outline = json.loads(self.chat("outline", outline_model(resp_format), outline_prompt,
+                                           f"{PROMPT_CACHE_KEY_PREFIX}-outline-{blog_type}"))
+
+        # The same outline opens every section prompt, so the calls of one post share a cacheable prefix
+        outline_text = "\n".join(
+            f"{name.replace('_', ' ').capitalize()}:\n" + "\n".join(f"- {heading}" for heading in outline[name])
+            for name in expanded
+        )
+        context = (
+            f"You are writing the blog post \"{outline['title']}\".\n\nIntro:\n{outline['intro']}\n\n"
+            f"Outline:\n{outline_text}\n\n"
+        )
+        usage_context = self.usage_context
+        deadline = usage_context.get("deadline")
+
+        def expand(name: str, heading: str) -> str:
+            # Worker threads tag their ledger entries with the post, like the calling thread
+            self.usage_context = usage_context
+            section_prompt = (
+                f"{context}Write the body of the section \"{heading}\" under "
+                f"\"{name.replace('_', ' ')}\". Cover only this section, in the tone of the intro; do not "
+                f"repeat the heading or write an introduction or conclusion."
+            )
+            try:
+                body = self.chat("section", SectionBody, section_prompt, f"{PROMPT_CACHE_KEY_PREFIX}-section")
+            except Exception:
+                # The post fails without this section; sections still queued stop at their deadline check
+                if deadline is not None:
+                    deadline.cancel()
+                raise
+            return SectionBody.model_validate_json(body).content
+
+        jobs = [(name, heading) for name in expanded for heading in outline[name]]
+        with span("openai.expand_sections", blog_type=blog_type, sections=len(jobs)):
+            with ThreadPoolExecutor(max_workers=OUTLINE_MAX_WORKERS) as executor:
+                bodies = iter(list(executor.map(lambda job: expand(*job), jobs)))
+
+        for name in expanded:
+            outline[name] = [{"heading": heading, "content": next(bodies)} for heading in outline[name]]
+        return resp_format(**outline).model_dump_json()
+
+    def translate_blog_post(self, blog_content_json: str, blog_type: str, locale: str) -> str:
+        """Translate generated blog content into another locale, keeping the same response model.
+
+        The system prompt, schema and cache key are the ones generate_blog_post used, so the variant
+        requests hit the same cached prefix.
+        """
+        language = LOCALE_NAMES.get(locale, locale)
+        user_prompt = (
+            f"Translate the following blog post into {language}. Keep every field and the number of items in "
+            f"every list, translate all text, and leave numbers, names of products and URLs unchanged.\n\n"
+            f"{blog_content_json}"
+        )
+        with span("openai.translate", blog_type=blog_type, locale=locale):
+            return self.chat(blog_type, RESPONSE_FORMATS.get(blog_type, BlogContent), user_prompt, stage="translate")
+
+    def outdated_sections(self, title: str, section_texts: List[str]) -> OutdatedSections:
+        """Ask which sections of a published post are outdated, given their plain text (no markup)."""
+        numbered = "\n\n".join(f"[{index}]\n{text}" for index, text in enumerate(section_texts))
+        user_prompt = (
+            f"Today is {datetime.now().strftime('%B %Y')}. Below is the text of the published blog post "
+            f"\"{title}\", in numbered sections. List only the sections whose facts, figures, dates, products "
+            f"or advice are outdated or wrong today, with what is outdated; leave out sections that are still "
+            f"accurate.\n\n{numbered}"
+        )
+        content = self.chat("refresh_triage", OutdatedSections, user_prompt)
+        return OutdatedSections.model_validate_json(content)
+
+    def refresh_sections(self, title: str, sections: Dict[int, str], outdated: List[OutdatedSection]) -> PostRefresh:
+        """Get replacements for the outdated sections of a published post; only those sections are sent."""
+        numbered = "\n\n".join(f"[{section.index}] Outdated: {section.reason}\n{sections[section.index]}"
+                                for section in outdated)
+        user_prompt = (
+            f"Today is {datetime.now().strftime('%B %Y')}. Below are outdated HTML sections of the published "
+            f"blog post \"{title}\", numbered and each with what is outdated in it. Rewrite each one so it is "
+            f"accurate today. Each replacement keeps the section's heading, HTML structure, length and tone, "
+            f"and keeps <img> tags unchanged.\n\n{numbered}"
+        )
+        content = self.chat("refresh", PostRefresh, user_prompt)
+        return PostRefresh.model_validate_json(content)
+
+    @timed("image.generate_and_save")
+    def generate_image(self, prompt: str, save_path: str, month: str, year: str, profile: str = "featured"):
+        """Generate an image using OpenAI API, save it, and compress the image.
+
+        `profile` names an entry of image_profiles ("featured", "inline" or "thumbnail"). Under a post deadline
+        the call and the download get the "<profile>_image" stage's time, and None is returned when it runs out.
+        """
+        image_profile = self.image_profiles[profile]
 
-    def generate_image(self, prompt: str, save_path: str, month: str, year: str):
-        """Generate an image using OpenAI API, save it, and compress the image."""
         # Create directory if it does not exist
         full_path = os.path.join(save_path, year, month)
         os.makedirs(full_path, exist_ok=True)
 
         try:
             # Call OpenAI API to generate the image
-            response = self.client.images.generate(
-                model="dall-e-3",
-                prompt=prompt,
-                size="1024x1024",
-                quality="standard",
-                n=1
-            )
-
-            # Get the image URL from the response
-            image_url = response.data[0].url
+            with span("openai.image_generate", model=image_profile.model, size=image_profile.size,
+                      profile=profile) as image_span:
+                image_url = self.backend.generate_image(
+                    model=image_profile.model,
+                    prompt=prompt,
+                    size=image_profile.size,
+                    quality=image_profile.quality,
+                    timeout=self.stage_timeout(f"{profile}_image")
+                )
+
+            self.ledger.record_image(image_profile.model, image_profile.size, image_profile.quality, 1,
+                                     image_span.duration, self.usage_context)
 
             # Download the image
-            image_data = requests.get(image_url).content
+            with span("image.download") as download_span:
+                image_data = self.backend.download_image(image_url, timeout=self.stage_timeout(f"{profile}_image"))
+                download_span.set(bytes=len(image_data))
 
             # Create a valid filename by removing spaces and special characters
             safe_prompt = prompt.replace("&amp;", "").replace(" ", "_")  # Replace spaces with underscores
             timestamp = int(datetime.now().timestamp())  # Get current timestamp
-            image_file_name = f"{safe_prompt}_{timestamp}.jpg"  # Construct the filename as .jpg
+            # Images for the same prompt can be generated in the same second (e.g. concurrent posts on one term)
+            image_file_name = f"{safe_prompt}_{timestamp}_{uuid.uuid4().hex[:8]}.jpg"  # Construct the filename as .jpg
 
             # Specify the full image path where you want to save the image
             image_file_path = os.path.join(full_path, image_file_name)
 
             # Save the image to the specified path (as JPEG first)
-            with open(image_file_path, 'wb') as handler:
-                handler.write(image_data)
+            with span("image.save"):
+                with open(image_file_path, 'wb') as handler:
+                    handler.write(image_data)
 
             # print(f"Image saved to {image_file_path}")
 
+            # Only resize when the API has no size matching the output
+            if image_profile.output_size:
+                self.resize_image_opencv(image_file_path, output_size=tuple(image_profile.output_size))
+
             # Compress the saved image
-            self.compress_image(image_file_path, quality=70)
+            self.compress_image(image_file_path, quality=image_profile.jpeg_quality)
 
             # print(f"Compressed image saved to {image_file_path}")  # Confirm it's the same path
             return image_file_path  # Return the path for further processing if needed
 
         except Exception as e:
+            record_error(e)
             print(f"An error occurred while generating the image: {e}")
             return None
 
     @staticmethod
     def compress_image(input_image_path, quality=70):
         """Compress the image using Pillow and overwrite the original."""
-        try:
-            # Open the image file
-            with Image.open(input_image_path) as img:
-                # Convert to RGB and save as JPEG, overwriting the original file
-                img.convert('RGB').save(input_image_path, 'JPEG', optimize=True, quality=quality)
-            print(f"Image compressed and saved to {input_image_path}")
-        except Exception as e:
-            print(f"An error occurred while compressing the image: {e}")
+        with span("image.compress", quality=quality):
+            try:
+                # Open the image file
+                with Image.open(input_image_path) as img:
+                    # Convert to RGB and save as JPEG, overwriting the original file
+                    img.convert('RGB').save(input_image_path, 'JPEG', optimize=True, quality=quality)
+                print(f"Image compressed and saved to {input_image_path}")
+            except Exception as e:
+                record_error(e)
+                print(f"An error occurred while compressing the image: {e}")
 
     @staticmethod
     def resize_image_opencv(input_image_path, output_size=(256, 256)):
@@ -254,6 +617,7 @@ class OpenAIHandler:
             input_image_path: Path to the input image file.
             output_size: Target size of the resized image (width, height) as a tuple. Defaults to (512, 512).
         """
-        img = cv2.imread(input_image_path)
-        resized_img = cv2.resize(img, output_size)
-        cv2.imwrite(input_image_path, resized_img)
+        with span("image.resize", width=output_size[0], height=output_size[1]):
+            img = cv2.imread(input_image_path)
+            resized_img = cv2.resize(img, output_size)
+            cv2.imwrite(input_image_path, resized_img)
@@ -0,0 +1,285 @@
+# pipeline.py
+# The per-post flow shared by main.py (one post per cron run) and worker.py (long-running daemon).
+#
+# 1. Claim the next unprocessed term and a blog template.
+# 2. Generate the blog content and render it to HTML (with an inline image).
+# 3. Insert the post and assign its category.
+# 4. Generate the featured image, insert the attachment and link it to the post.
+#
+# With several locales, steps 3-4 become: translate the post into the other locales while the featured
+# image is generated, then insert every variant, its category and the shared attachment in one transaction.
+#
+# With a Deadline (see deadlines.py) each stage gets a share of the post's time. An image stage that runs
+# out publishes the post without that image and queues it in z_image_backfill; backfill_images adds it later.
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from blog_parser import PENDING_IMAGE_FRAGMENT, BlogContentParser, inline_image_fragment
+from metrics import span
+from rerender import NoImages, raw_content_meta
+from sites import DEFAULT_UPLOAD_ROOT
+
+DEFAULT_SAVE_PATH = DEFAULT_UPLOAD_ROOT
+
+
+def claim_next_job(db_handler):
+    """Pick the next term and template and mark both as used, so concurrent workers skip them.
+
+    Returns a dict with term_id, name, category, blog_type and user_prompt, or None when nothing is available.
+    """
+    # Get next unprocessed term (term_id, name, z_category_description)
+    term_id, name, z_category_description = db_handler.get_next_unprocessed_term()
+    if not term_id:
+        print("Error: No term could be fetched.")
+        return None
+
+    print(f"Next unprocessed Term: ID={term_id}, Name={name}, Description={z_category_description}")
+
+    blog_type, user_prompt = db_handler.get_blog_template(z_category_description=z_category_description)
+    if not blog_type:
+        print("Error: No blog template could be fetched.")
+        return None
+
+    # mark blog template and term used
+    db_handler.mark_blog_type_as_taken(blog_type=blog_type)
+    db_handler.update_term_processed(term_id=term_id)
+
+    return {
+        "term_id": term_id,
+        "name": name,
+        "category": z_category_description,
+        "blog_type": blog_type,
+        "user_prompt": user_prompt,
+    }
+
+
+def variation_prompt(user_prompt: str, titles) -> str:
+    """The template prompt plus a hint to differ from already published posts, for a near-duplicate retry."""
+    differ_from = "\n".join(f"- {title}" for title in titles)
+    return (f"{user_prompt}\n\nA very similar post is already published. Use a different angle, structure and "
+            f"examples, and a different title. Differ from:\n{differ_from}")
+
+
+def generate_and_publish(job: dict, db_handler, openai_handler, save_path: str = DEFAULT_SAVE_PATH,
+                         dedup_index=None, max_regenerations: int = 2, link_index=None, buffer: bool = False,
+                         locales=None, deadline=None):
+    """Generate, render and publish the post for a claimed job. Returns the new post_id.
+
+    With a dedup_index, a post that is nearly identical to one already published is regenerated (up to
+    max_regenerations times, reusing the inline image, with the similar posts' titles added to the prompt)
+    and skipped if it is still a duplicate.
+    With a link_index, related published posts are linked from the new post, and the new post is added
+    to the index once it is published.
+    With buffer=True the post is stored as a draft and queued in the publish buffer instead of going live;
+    the scheduled publisher flips it later.
+    With two or more locales (e.g. ["en", "de"]; the first is the language the prompt produces), the post is
+    also published in the other languages, see publish_locale_variants.
+    With a deadline, images that could not be generated in time are queued for backfill_images.
+    """
+    openai_handler.begin_post(term_id=job["term_id"], blog_type=job["blog_type"], deadline=deadline)
+
+    image_fragment = None
+    image_path = None
+    image_prompt = None
+    user_prompt = job["user_prompt"]
+    for attempt in range(max_regenerations + 1):
+        # Call the method to generate blog content with the specified category
+        blog_content_json = openai_handler.generate_blog_post(category=job["category"], blog_type=job["blog_type"],
+                                                              user_prompt=user_prompt)
+
+        # Instantiate the parser and parse the blog content
+        parser = BlogContentParser(blog_content_json=blog_content_json, blog_type=job["blog_type"],
+                                   category=job["category"], openai_handler=openai_handler, save_path=save_path,
+                                   base_url=db_handler.base_url, image_fragment=image_fragment,
+                                   image_path=image_path, link_index=link_index, link_terms=[job["name"]])
+        title, html_content = parser.parse_blog()
+        image_fragment = parser.image_fragment
+        image_path = parser.image_path
+        # Retries reuse the first attempt's image (or its placeholder), so keep the prompt it was made from
+        image_prompt = image_prompt or parser.image_prompt
+        print("Title:", title)
+
+        if dedup_index is None:
+            break
+        with span("dedup.check", blog_type=job["blog_type"]) as check_span:
+            similar = dedup_index.find_similar(title, html_content)
+            check_span.set(matches=len(similar))
+        if not similar:
+            break
+        print(f"Post is a near-duplicate of Post ID {similar[0][0]} (similarity {similar[0][1]:.2f}).")
+        # The same prompt tends to produce the same post again; name what it has to differ from
+        similar_titles = [row[1] for row in db_handler.fetch_post_titles([post_id for post_id, _ in similar[:3]])]
+        user_prompt = variation_prompt(job["user_prompt"], similar_titles or [title])
+    else:
+        print(f"Skipping term ID {job['term_id']}: still a near-duplicate after {max_regenerations} regenerations.")
+        return None
+
+    if locales and len(locales) > 1:
+        return publish_locale_variants(job, db_handler, openai_handler, save_path, blog_content_json, title,
+                                       html_content, image_fragment, locales, dedup_index=dedup_index,
+                                       link_index=link_index, buffer=buffer, summary=parser.summary,
+                                       image_path=image_path, image_prompt=image_prompt)
+
+    # Create the blog post in the database using the generated title and content
+    post_id = db_handler.create_blog_post({
+        "title": title,
+        "content": html_content,
+        "status": "draft" if buffer else "publish",
+        "summary": parser.summary,
+        # Kept so markup changes can be applied later without regenerating (see rerender.py)
+        "meta": raw_content_meta(job["blog_type"], blog_content_json, image_path),
+    })
+    if not post_id:
+        return None
+
+    if dedup_index is not None:
+        dedup_index.add(post_id, title, html_content)
+    # Drafts are linked to once the publisher makes them live
+    if link_index is not None and not buffer:
+        link_index.add(post_id, title, [job["name"]])
+
+    # Tag the usage ledger entries for this run with the new post
+    openai_handler.assign_post(post_id)
+
+    # Assign a category to the newly created post
+    db_handler.assign_category_to_post(category_id=job["term_id"], post_id=post_id, published=not buffer)
+
+    # Generate the featured image from the term name
+    current_month = datetime.now().strftime("%m")  # Current month as a two-digit number
+    current_year = datetime.now().strftime("%Y")  # Current year as a four-digit number
+
+    image_file_path = openai_handler.generate_image(job["name"], save_path, current_month, current_year,
+                                                   profile="featured")
+    if image_file_path:
+        attachment_id = db_handler.create_image_attachment(os.path.basename(image_file_path), post_id,
+                                                           current_month, current_year)
+        db_handler.assign_image_to_post(post_id, attachment_id, image_file_path)
+    queue_missing_images(db_handler, post_id, job, image_path, image_prompt, image_file_path)
+
+    # Only queue the draft once it is complete, so the publisher never exposes a half-built post
+    if buffer:
+        db_handler.add_to_publish_buffer(post_id)
+
+    return post_id
+
+
+def publish_locale_variants(job: dict, db_handler, openai_handler, save_path: str, blog_content_json: str, title: str,
+                            html_content: str, image_fragment, locales, dedup_index=None, link_index=None,
+                            buffer: bool = False, summary=None, image_path: str = None, image_prompt: str = None):
+    """Translate a generated post into locales[1:] and publish every variant in one transaction.
+
+    The translations reuse the post's response model and run concurrently with the featured image. All
+    variants share the inline image, the featured image and its attachment row. A locale whose translation
+    fails is left out. Returns the post_id of the source-locale post.
+    """
+    current_month = datetime.now().strftime("%m")
+    current_year = datetime.now().strftime("%Y")
+    # The ledger tags calls through a thread-local context; the helper threads work for the same post
+    usage_context = openai_handler.usage_context
+
+    def in_post_context(func, *args):
+        def call():
+            openai_handler.usage_context = usage_context
+            return func(*args)
+        return call
+
+    def render_variant(locale: str) -> dict:
+        variant_json = openai_handler.translate_blog_post(blog_content_json, job["blog_type"], locale)
+        # Internal links point at posts in the source language, so variants go without them. Variants use the
+        # source's inline image or its pending placeholder and never generate one of their own
+        parser = BlogContentParser(blog_content_json=variant_json, blog_type=job["blog_type"],
+                                   category=job["category"], openai_handler=NoImages(), save_path=save_path,
+                                   base_url=db_handler.base_url, image_fragment=image_fragment)
+        variant_title, variant_html = parser.parse_blog()
+        return {"locale": locale, "title": variant_title, "content": variant_html, "summary": parser.summary,
+                "meta": raw_content_meta(job["blog_type"], variant_json, image_path)}
+
+    variants = [{"locale": locales[0], "title": title, "content": html_content, "summary": summary,
+                 "meta": raw_content_meta(job["blog_type"], blog_content_json, image_path)}]
+    with span("pipeline.locale_variants", locales=len(locales)):
+        with ThreadPoolExecutor(max_workers=len(locales), thread_name_prefix="variant") as executor:
+            image_future = executor.submit(in_post_context(openai_handler.generate_image, job["name"], save_path,
+                                                           current_month, current_year, "featured"))
+            variant_futures = [(locale, executor.submit(in_post_context(render_variant, locale)))
+                               for locale in locales[1:]]
+            for locale, future in variant_futures:
+                try:
+                    variants.append(future.result())
+                except Exception as e:
+                    print(f"An error occurred while translating to {locale}; publishing without it: {e}")
+            image_file_path = image_future.result()
+
+    image = None
+    if image_file_path:
+        image = {"name": os.path.basename(image_file_path), "month": current_month, "year": current_year,
+                 "path": image_file_path}
+    post_ids = db_handler.create_post_variants(variants, job["term_id"], image=image,
+                                               status="draft" if buffer else "publish")
+    if not post_ids:
+        return None
+    post_id = post_ids[0]
+    queue_missing_images(db_handler, post_id, job, image_path, image_prompt, image_file_path)
+
+    if dedup_index is not None:
+        dedup_index.add(post_id, title, html_content)
+    if link_index is not None and not buffer:
+        link_index.add(post_id, title, [job["name"]])
+    openai_handler.assign_post(post_id)
+    return post_id
+
+
+def queue_missing_images(db_handler, post_id: int, job: dict, image_path: str, image_prompt: str,
+                         image_file_path: str):
+    """Queue the inline and featured images a post went out without (the variants share them)."""
+    if image_path is None and image_prompt:
+        db_handler.queue_image_backfill(post_id, "inline", image_prompt)
+    if not image_file_path:
+        db_handler.queue_image_backfill(post_id, "featured", job["name"])
+
+
+def backfill_images(db_handler, openai_handler, save_path: str = DEFAULT_SAVE_PATH, limit: int = 5):
+    """Generate queued images without a deadline and add them to their posts. Returns the images added."""
+    added = 0
+    for post_id, kind, prompt in db_handler.claim_image_backfills(limit):
+        openai_handler.begin_post(blog_type="backfill")
+        openai_handler.assign_post(post_id)
+        current_month = datetime.now().strftime("%m")
+        current_year = datetime.now().strftime("%Y")
+        with span("pipeline.backfill_image", post_id=post_id, kind=kind) as backfill_span:
+            image_file_path = openai_handler.generate_image(prompt, save_path, current_month, current_year,
+                                                           profile=kind)
+            if not image_file_path:
+                print(f"Could not backfill the {kind} image of Post ID {post_id}; it stays queued.")
+                continue
+            image_name = os.path.basename(image_file_path)
+            if kind == "inline":
+                image_path = os.path.join(current_year, current_month, image_name)
+                done = db_handler.complete_inline_backfill(post_id, inline_image_fragment(db_handler.base_url,
+                                                                                          image_path),
+                                                           image_path, PENDING_IMAGE_FRAGMENT)
+            else:
+                done = db_handler.complete_featured_backfill(post_id, image_name, current_month, current_year,
+                                                             image_file_path)
+            backfill_span.set(done=done)
+            added += bool(done)
+    return added
+
+
+def publish_next_post(db_handler, openai_handler, save_path: str = DEFAULT_SAVE_PATH, dedup_index=None,
+                      link_index=None, buffer: bool = False, locales=None, deadline=None):
+    """Claim the next job and publish it. Returns the new post_id, or None."""
+    job = claim_next_job(db_handler)
+    if not job:
+        return None
+    return generate_and_publish(job, db_handler, openai_handler, save_path, dedup_index=dedup_index,
+                                link_index=link_index, buffer=buffer, locales=locales, deadline=deadline)
+
+
+def publish_from_buffer(db_handler, limit: int = 1, link_index=None):
+    """Publish the oldest buffered drafts and make them linkable. Returns the published post IDs."""
+    post_ids = db_handler.publish_buffered_posts(limit)
+    if link_index is not None and post_ids:
+        for post_id, title, term_names in db_handler.fetch_post_titles(post_ids):
+            link_index.add(post_id, title, term_names.split("|") if term_names else [])
+    return post_ids
@@ -0,0 +1,157 @@
+# profiling.py
+# Profile a whole pipeline run: CPU (cProfile), allocations (tracemalloc) and a timeline of every span.
+#
+#   python load_test.py --posts 20 --profile profiles/
+#   python worker.py --config worker.json --max-posts 3 --profile profiles/
+#
+# Writes to the output directory:
+#   trace.json   Chrome trace events; open in chrome://tracing or https://ui.perfetto.dev
+#   stages.json  per stage: calls, wall time and CPU time of the thread running it
+#   cpu.prof     cProfile stats for snakeviz / pstats, merged over the threads that finished
+#   cpu.txt      top functions by cumulative time
+#   alloc.txt    top allocation sites still held at the end of the run
+#
+# tracemalloc only counts the whole process, so memory is not attributed to spans: the trace gets a
+# process-wide "traced memory" counter track instead, sampled whenever a span ends.
+#
+# While a Profiler is active every MySQL statement gets its own "mysql.statement" span.
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+import metrics
+
+TOP_FUNCTIONS = 60
+TOP_ALLOCATIONS = 40
+
+
+class Profiler:
+    """Context manager that profiles everything run inside it, on every thread."""
+
+    def __init__(self, output_dir: str, trace_allocations: bool = True):
+        self.output_dir = output_dir
+        self.trace_allocations = trace_allocations
+        self._lock = threading.Lock()
+        self._profiles = {}  # thread -> its cProfile.Profile
+        self._events = []
+        self._thread_names = {}
+        self._stages = {}
+        self._origin = None
+
+    def _start_thread_profile(self, *args):
+        # Installed with threading.setprofile: runs once in each new thread, then hands over to cProfile
+        sys.setprofile(None)
+        self._enable_profile()
+
+    def _enable_profile(self):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ allows one active profiler per interpreter; it already sees this thread
+            return
+        with self._lock:
+            self._profiles[threading.current_thread()] = profile
+
+    def _finished_profiles(self):
+        """Disable this thread's profile and return it with those of threads that have ended.
+
+        Before Python 3.12 a profile only unhooks the thread it is disabled in, so another thread's profile is
+        neither disabled nor safe to read while that thread runs. A thread's profiling ends with the thread;
+        threads still alive (e.g. a HedgedBackend pool) are left out.
+        """
+        current = threading.current_thread()
+        with self._lock:
+            profiles = dict(self._profiles)
+        if current in profiles:
+            profiles[current].disable()
+        running = [thread for thread in profiles if thread is not current and thread.is_alive()]
+        if running:
+            print(f"CPU profile leaves out {len(running)} threads still running: "
+                  f"{', '.join(sorted(thread.name for thread in running))}")
+        return [profile for thread, profile in profiles.items() if thread not in running]
+
+    def __enter__(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._origin = time.perf_counter()
+        if self.trace_allocations:
+            tracemalloc.start(10)
+        threading.setprofile(self._start_thread_profile)
+        self._enable_profile()
+        metrics.add_hook(self)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        metrics.remove_hook(self)
+        threading.setprofile(None)
+        profiles = self._finished_profiles()
+        snapshot = tracemalloc.take_snapshot() if self.trace_allocations else None
+        if self.trace_allocations:
+            tracemalloc.stop()
+        self.write(snapshot, profiles)
+        return False
+
+    def on_start(self, span):
+        span.profile_cpu = time.thread_time()
+
+    def on_end(self, span):
+        cpu = time.thread_time() - span.profile_cpu
+        thread = threading.current_thread()
+        event = {
+            "name": span.stage,
+            "cat": span.stage.split(".", 1)[0],
+            "ph": "X",
+            "ts": round((span.start - self._origin) * 1e6, 1),
+            "dur": round(span.duration * 1e6, 1),
+            "pid": os.getpid(),
+            "tid": thread.ident,
+            "args": dict(span.fields, cpu_ms=round(cpu * 1000, 3)),
+        }
+        if span.error is not None:
+            event["args"]["error"] = f"{type(span.error).__name__}: {span.error}"
+        with self._lock:
+            self._events.append(event)
+            if self.trace_allocations:
+                # Every thread's allocations, not this span's: a counter track of its own in the trace
+                self._events.append({"name": "traced memory (process)", "ph": "C", "ts": event["ts"] + event["dur"],
+                                     "pid": event["pid"],
+                                     "args": {"kb": round(tracemalloc.get_traced_memory()[0] / 1024, 1)}})
+            self._thread_names[thread.ident] = thread.name
+            stage = self._stages.setdefault(span.stage, {"calls": 0, "wall_ms": 0.0, "cpu_ms": 0.0})
+            stage["calls"] += 1
+            stage["wall_ms"] += span.duration * 1000
+            stage["cpu_ms"] += cpu * 1000
+
+    def write(self, snapshot=None, profiles=()):
+        """Write the trace, stage summary, CPU profile and allocation report."""
+        metadata = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+                    for tid, name in self._thread_names.items()]
+        with open(os.path.join(self.output_dir, "trace.json"), "w") as f:
+            json.dump({"traceEvents": metadata + self._events, "displayTimeUnit": "ms"}, f)
+
+        stages = {}
+        for name, stage in sorted(self._stages.items(), key=lambda item: -item[1]["wall_ms"]):
+            stages[name] = {key: round(value, 3) if isinstance(value, float) else value for key, value in stage.items()}
+        with open(os.path.join(self.output_dir, "stages.json"), "w") as f:
+            json.dump(stages, f, indent=2)
+
+        if profiles:
+            stats = pstats.Stats(*profiles)
+            stats.dump_stats(os.path.join(self.output_dir, "cpu.prof"))
+            text = io.StringIO()
+            pstats.Stats(*profiles, stream=text).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+            with open(os.path.join(self.output_dir, "cpu.txt"), "w") as f:
+                f.write(text.getvalue())
+
+        if snapshot is not None:
+            with open(os.path.join(self.output_dir, "alloc.txt"), "w") as f:
+                for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+                    f.write(f"{stat}\n")
+
+        print(f"Profile written to {self.output_dir} (open trace.json in https://ui.perfetto.dev)")
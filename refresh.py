@@ -0,0 +1,125 @@
+# refresh.py
+# Bring old posts up to date by rewriting only their outdated sections.
+#
+#   python refresh.py --config db.json --days 180 --per-category 1 --limit 20
+#   python refresh.py --config db.json --days 365 --dry-run
+#
+# A post's HTML is split at its <h2>/<h3> headings. A first call gets the plain text of the numbered
+# sections and names the outdated ones; a second gets the HTML of those sections only and rewrites them,
+# so the rewrite scales with what changed rather than with the post. The changed sections are spliced back
+# and written with a single UPDATE of post_content; the featured image, attachment and categories are left
+# untouched. The rewritten sections are also kept in post meta, so rerender.py renders them over the raw
+# content instead of reverting them.
+import argparse
+import difflib
+import json
+import os
+import re
+
+import metrics
+from blog_parser import PENDING_IMAGE_FRAGMENT, build_summary, plain_text, split_sections
+from metrics import span
+from mysql_handler import MySQLHandler
+from openai_handler import OpenAIHandler
+
+# Images, and the placeholder of an inline image still waiting for its backfill (see pipeline.backfill_images)
+_IMG_RE = re.compile(r"<img\b[^>]*>|" + re.escape(PENDING_IMAGE_FRAGMENT))
+_HEADING_END_RE = re.compile(r"</h[23]>")
+UNCHANGED_RATIO = 0.98  # Rewrites at least this similar to the stored section are not worth an update
+
+
+def keep_images(old_section: str, new_section: str) -> str:
+    """Put back <img> tags (and the pending inline image placeholder) the rewrite dropped, after the section heading."""
+    missing = [tag for tag in _IMG_RE.findall(old_section) if tag not in new_section]
+    if not missing:
+        return new_section
+    match = _HEADING_END_RE.search(new_section)
+    position = match.end() if match else 0
+    return new_section[:position] + "\n" + "\n".join(missing) + new_section[position:]
+
+
+def refresh_post(db_handler, openai_handler, post_id: int, title: str, html_content: str, dry_run: bool = False,
+                 refreshed_sections: str = None):
+    """Rewrite the outdated sections of one post. Returns the indexes of the sections that changed.
+
+    refreshed_sections is the JSON of the post's earlier rewrites, as fetch_stale_posts returns it.
+    """
+    openai_handler.begin_post(blog_type="refresh")
+    openai_handler.assign_post(post_id)
+
+    with span("refresh.post", post_id=post_id) as post_span:
+        sections = split_sections(html_content)
+        triage = openai_handler.outdated_sections(title, [plain_text(section) for section in sections])
+        outdated = list({section.index: section for section in triage.sections
+                         if 0 <= section.index < len(sections)}.values())
+        post_span.set(sections=len(sections), outdated=len(outdated))
+        changed = []
+        if outdated:
+            refresh = openai_handler.refresh_sections(title, sections, outdated)
+            targeted = {section.index for section in outdated}
+            with span("refresh.diff"):
+                for update in refresh.updates:
+                    if update.index not in targeted:
+                        continue
+                    new_section = keep_images(sections[update.index], update.content.strip() + "\n")
+                    # A rewrite must stay one section, or the indexes of the stored rewrites would shift
+                    if len(split_sections(new_section)) != len(split_sections(sections[update.index])):
+                        continue
+                    ratio = difflib.SequenceMatcher(None, sections[update.index], new_section, autojunk=False).ratio()
+                    if ratio >= UNCHANGED_RATIO:
+                        continue
+                    print(f"Post ID {post_id} section {update.index}: {update.reason} (similarity {ratio:.2f})")
+                    sections[update.index] = new_section
+                    changed.append(update.index)
+        post_span.set(changed=len(changed))
+
+        if dry_run:
+            return changed
+        # Stamp post_modified either way so the post leaves the stale set until it is due again
+        if changed:
+            # The intro and length may have changed; excerpt, meta description and reading time follow them
+            html_content = "".join(sections)
+            rewrites = json.loads(refreshed_sections) if refreshed_sections else {}
+            rewrites.update({str(index): sections[index] for index in changed})
+            db_handler.update_post_content(post_id, html_content, build_summary(html_content), json.dumps(rewrites))
+        else:
+            db_handler.update_post_content(post_id)
+        return changed
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Rewrite the outdated sections of old posts.")
+    arg_parser.add_argument("--config", required=True, help="JSON file with db and openai_api_key")
+    arg_parser.add_argument("--days", type=int, default=180, help="Refresh posts not modified for this many days")
+    arg_parser.add_argument("--per-category", type=int, default=1, help="Posts per category in this run")
+    arg_parser.add_argument("--limit", type=int, default=20, help="Posts in this run")
+    arg_parser.add_argument("--dry-run", action="store_true", help="Report changes without updating posts")
+    args = arg_parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+
+    openai_handler = OpenAIHandler(api_key=config.get("openai_api_key") or os.environ.get("OPENAI_API_KEY"))
+    db_handler = MySQLHandler(config.get("db", config))
+    db_handler.connect()
+    try:
+        refreshed = 0
+        for post_id, title, html_content, term_id, refreshed_sections in db_handler.fetch_stale_posts(
+                args.days, args.per_category, args.limit):
+            try:
+                changed = refresh_post(db_handler, openai_handler, post_id, title, html_content, args.dry_run,
+                                       refreshed_sections)
+            except Exception as e:
+                # One bad response must not stop the run
+                print(f"An error occurred while refreshing Post ID {post_id}: {e}")
+                continue
+            refreshed += bool(changed)
+            print(f"Post ID {post_id} (term ID {term_id}): {len(changed)} sections updated.")
+        print(f"{refreshed} posts refreshed.")
+    finally:
+        db_handler.close()
+        metrics.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+# rerender.py
+# Rebuild the HTML of published posts from their stored raw content, without calling OpenAI.
+#
+#   python rerender.py --config db.json                           # every post with stored raw content
+#   python rerender.py --config db.json --blog-type how_to_tutorial --dry-run
+#   python rerender.py --config db.json --workers 8 --chunk-size 100
+#
+# Every new post keeps the validated JSON it was rendered from in wp_postmeta: compressed with zstd
+# (or zlib when the zstandard package is missing) under _blog_content, with its blog type and inline image
+# path. After a markup change in BlogContentParser (headings, checklist format, image fragment, ...) this
+# command renders those posts again in a process pool and writes the posts whose HTML changed back with
+# one UPDATE per batch. The inline image and the Related Posts links are reused as they are, and so are
+# the sections refresh.py rewrote (_blog_refreshed_sections), which replace the same sections of the render.
+import argparse
+import base64
+import html
+import json
+import re
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import zstandard
+except ImportError:  # Optional: zlib is used instead, and values record which codec wrote them
+    zstandard = None
+
+import metrics
+from blog_parser import BlogContentParser, split_sections
+from metrics import span
+from storage import open_storage
+
+ZSTD_LEVEL = 10
+ZLIB_LEVEL = 9
+FETCH_SIZE = 500  # Posts read per query
+MAX_BATCH_BYTES = 4 * 1024 * 1024  # Keep each UPDATE well under MariaDB's default max_allowed_packet
+
+_RELATED_RE = re.compile(r"<h2>Related Posts</h2>\n<ul>\n(.*?)</ul>\n", re.S)
+_LINK_RE = re.compile(r'<li><a href="[^"]*\?p=(\d+)">(.*?)</a></li>')
+
+
+def compress_content(blog_content_json: str) -> str:
+    """Compress JSON for a meta_value: "<codec>:" followed by base64, since meta_value is a text column."""
+    data = blog_content_json.encode("utf-8")
+    if zstandard is not None:
+        return "zstd:" + base64.b64encode(zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)).decode("ascii")
+    return "zlib:" + base64.b64encode(zlib.compress(data, ZLIB_LEVEL)).decode("ascii")
+
+
+def decompress_content(value: str) -> str:
+    codec, _, payload = value.partition(":")
+    data = base64.b64decode(payload)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Post content was stored with zstd; install the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    if codec == "zlib":
+        return zlib.decompress(data).decode("utf-8")
+    raise ValueError(f"Unknown raw content codec '{codec}'")
+
+
+def raw_content_meta(blog_type: str, blog_content_json: str, image_path: str = None) -> dict:
+    """The RAW_CONTENT_META_KEYS post meta for a rendered post (see MySQLHandler.insert_post)."""
+    meta = {"_blog_type": blog_type, "_blog_content": compress_content(blog_content_json)}
+    if image_path:
+        meta["_blog_inline_image"] = image_path
+    return meta
+
+
+class StoredLinks:
+    """Stands in for LinkIndex during a re-render: serves the Related Posts the post was published with."""
+
+    def __init__(self, html_content: str):
+        match = _RELATED_RE.search(html_content)
+        # Titles as the index serves them: add_internal_links escapes them again
+        self.links = ([(int(post_id), html.unescape(title)) for post_id, title in _LINK_RE.findall(match.group(1))]
+                      if match else [])
+
+    def related(self, title, terms, limit=3):
+        return self.links[:limit]
+
+
+class NoImages:
+    """Never generates an image: posts without a stored inline image keep the pending fragment for backfill."""
+
+    @staticmethod
+    def generate_image(*args, **kwargs):
+        return None
+
+
+def apply_refreshed_sections(html_content: str, refreshed_sections: str) -> str:
+    """Put the sections refresh.py rewrote (JSON {section index: HTML}) over a freshly rendered post."""
+    if not refreshed_sections:
+        return html_content
+    sections = split_sections(html_content)
+    for index, section in json.loads(refreshed_sections).items():
+        if int(index) < len(sections):
+            sections[int(index)] = section
+    return "".join(sections)
+
+
+def render_post(post_id: int, html_content: str, blog_type: str, raw_content: str, image_path: str,
+                refreshed_sections: str, base_url: str):
+    """Render one post from its raw content. Returns (post_id, new HTML or None if unchanged, error)."""
+    try:
+        links = StoredLinks(html_content)
+        parser = BlogContentParser(blog_content_json=decompress_content(raw_content), blog_type=blog_type,
+                                   category="", openai_handler=NoImages(), save_path="", base_url=base_url,
+                                   image_path=image_path or None, link_index=links if links.links else None,
+                                   max_links=len(links.links))
+        new_html = apply_refreshed_sections(parser.parse_blog()[1], refreshed_sections)
+    except Exception as e:
+        return post_id, None, f"{type(e).__name__}: {e}"
+    return post_id, (new_html if new_html != html_content else None), None
+
+
+def _render_batch(rows, base_url):
+    return [render_post(*row, base_url) for row in rows]
+
+
+def _init_worker():
+    # Span lines from the worker processes would interleave with the parent's log
+    metrics.configure(log_path="off")
+
+
+def write_batches(db_handler, changed: dict) -> int:
+    """Write post_id -> HTML in UPDATEs of at most MAX_BATCH_BYTES. Returns the posts written."""
+    written = 0
+    batch, batch_bytes = {}, 0
+    for post_id, html_content in changed.items():
+        batch[post_id] = html_content
+        batch_bytes += len(html_content)
+        if batch_bytes >= MAX_BATCH_BYTES:
+            written += len(batch) if db_handler.update_post_contents(batch) else 0
+            batch, batch_bytes = {}, 0
+    if batch:
+        written += len(batch) if db_handler.update_post_contents(batch) else 0
+    return written
+
+
+def rerender(db_handler, workers: int = None, blog_type: str = None, chunk_size: int = 50, dry_run: bool = False):
+    """Re-render every post with stored raw content. Returns (posts rendered, posts changed, errors)."""
+    rendered = changed_total = errors = 0
+    last_post_id = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        while True:
+            rows = db_handler.fetch_raw_contents(last_post_id, FETCH_SIZE, blog_type)
+            if not rows:
+                break
+            last_post_id = rows[-1][0]
+
+            with span("rerender.batch", posts=len(rows)) as batch_span:
+                chunks = [rows[start:start + chunk_size] for start in range(0, len(rows), chunk_size)]
+                changed = {}
+                for results in executor.map(_render_batch, chunks, [db_handler.base_url] * len(chunks)):
+                    for post_id, new_html, error in results:
+                        if error:
+                            errors += 1
+                            print(f"Post ID {post_id} could not be re-rendered: {error}")
+                        elif new_html is not None:
+                            changed[post_id] = new_html
+                if changed and not dry_run:
+                    write_batches(db_handler, changed)
+                batch_span.set(changed=len(changed))
+
+            rendered += len(rows)
+            changed_total += len(changed)
+            print(f"Re-rendered {rendered} posts up to Post ID {last_post_id}; {changed_total} changed.")
+    return rendered, changed_total, errors
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Rebuild post HTML from the stored raw content.")
+    arg_parser.add_argument("--config", required=True, help="JSON file with mysql.connector settings (or a \"db\" key)")
+    arg_parser.add_argument("--blog-type", help="Only posts of this blog type")
+    arg_parser.add_argument("--workers", type=int, help="Render processes (default: one per CPU)")
+    arg_parser.add_argument("--chunk-size", type=int, default=50, help="Posts per task sent to a render process")
+    arg_parser.add_argument("--dry-run", action="store_true", help="Count changed posts without writing them")
+    args = arg_parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+
+    db_handler = open_storage(config.get("db", config))
+    db_handler.connect()
+    try:
+        rendered, changed, errors = rerender(db_handler, args.workers, args.blog_type, args.chunk_size, args.dry_run)
+        print(f"{rendered} posts re-rendered, {changed} {'would change' if args.dry_run else 'updated'}, "
+              f"{errors} errors.")
+    finally:
+        db_handler.close()
+        metrics.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# routing.py
+# Per-blog-type model routing: which chat model, max_tokens and temperature each blog type uses.
+#
+#   python routing.py show --routes routes.json
+#   python routing.py adapt --routes routes.json --days 14        # retune from the usage ledger
+#
+# The schemas differ a lot in size (myths_and_misconceptions vs beginners_guide with eight lists), so
+# one setting for all either truncates the big types or lets the small ones run long. adapt() sets
+# max_tokens from the completion-token percentiles recorded in usage_ledger.py, and moves a type to the
+# next model in its list when that type's p95 latency on its current model exceeds the latency target.
+#
+# A route with "outline": true generates its type outline-first: a short outline call (the "outline"
+# route), then one call per section in parallel (the "section" route), see
+# OpenAIHandler.generate_outlined_post. E.g. routes.json: {"beginners_guide": {"outline": true, ...}}
+import argparse
+import json
+import math
+import os
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+from usage_ledger import DEFAULT_LEDGER_PATH, UsageLedger, percentile
+
+DEFAULT_MODEL = "gpt-4o-mini"
+MIN_SAMPLES = 20  # Calls of a type needed before its route is retuned
+TOKEN_HEADROOM = 1.3  # max_tokens = p99 completion tokens * headroom, so only outliers are cut off
+MIN_MAX_TOKENS = 1024
+MAX_MAX_TOKENS = 16384
+
+
+class Route(BaseModel):
+    model: str = DEFAULT_MODEL
+    max_tokens: Optional[int] = None  # None leaves it to the API
+    temperature: Optional[float] = None
+    models: List[str] = []  # Models to fall through, in order, when p95 latency misses the target
+    latency_target_ms: Optional[float] = None
+    outline: bool = False  # Generate an outline, then the sections in parallel (OpenAIHandler.generate_outlined_post)
+
+    def options(self) -> dict:
+        """Keyword arguments for backend.chat_completion."""
+        options = {}
+        if self.max_tokens is not None:
+            options["max_tokens"] = self.max_tokens
+        if self.temperature is not None:
+            options["temperature"] = self.temperature
+        return options
+
+
+# Starting points sized to each schema; adapt() replaces max_tokens once there is data
+DEFAULT_ROUTES = {
+    "top_10_list": Route(max_tokens=3000),
+    "step_by_step_guide": Route(max_tokens=3000),
+    "pros_and_cons": Route(max_tokens=2000),
+    "case_study": Route(max_tokens=3000),
+    "how_to_tutorial": Route(max_tokens=4000),
+    "beginners_guide": Route(max_tokens=4500),
+    "in_depth_review": Route(max_tokens=3000),
+    "myths_and_misconceptions": Route(max_tokens=2000),
+    "benefits_overview": Route(max_tokens=3500),
+    "expert_opinions": Route(max_tokens=3000),
+    "refresh": Route(max_tokens=3000, temperature=0.3),
+    # Picking the outdated sections before a refresh: indexes and reasons only
+    "refresh_triage": Route(max_tokens=800),
+    # Calls of outline mode, shared by every blog type that enables it
+    "outline": Route(max_tokens=2000),
+    "section": Route(max_tokens=1200),
+    # Regenerating the invalid fields of a response (OpenAIHandler.repair)
+    "repair": Route(max_tokens=3000),
+}
+
+
+class ModelRouter:
+    def __init__(self, routes: Dict[str, Route] = None, path: str = None):
+        self.path = path
+        self.routes = dict(DEFAULT_ROUTES)
+        self.routes.update(routes or {})
+
+    @classmethod
+    def load(cls, path: str):
+        """Load routes saved by save(); a missing file gives the defaults."""
+        routes = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                routes = {blog_type: Route(**route) for blog_type, route in json.load(f).items()}
+        return cls(routes, path)
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({blog_type: route.model_dump(exclude_defaults=True) for blog_type, route in self.routes.items()},
+                      f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def route(self, blog_type: str) -> Route:
+        return self.routes.get(blog_type) or Route()
+
+    def adapt(self, ledger: UsageLedger, days: int = 14) -> List[str]:
+        """Retune every route with enough recorded calls. Returns a line per change."""
+        changes = []
+        stats = ledger.chat_stats(days)
+        for blog_type in sorted({blog_type for blog_type, model in stats}):
+            route = self.route(blog_type)
+            entry = stats.get((blog_type, route.model))
+            if not entry or len(entry["completion_tokens"]) < MIN_SAMPLES:
+                continue
+
+            p99_tokens = percentile(entry["completion_tokens"], 0.99)
+            max_tokens = math.ceil(p99_tokens * TOKEN_HEADROOM / 256) * 256
+            max_tokens = max(MIN_MAX_TOKENS, min(MAX_MAX_TOKENS, max_tokens))
+            updated = route.model_copy(update={"max_tokens": max_tokens})
+
+            p95_latency = percentile(entry["latency_ms"], 0.95)
+            if route.latency_target_ms and p95_latency > route.latency_target_ms and route.model in route.models:
+                position = route.models.index(route.model)
+                if position + 1 < len(route.models):
+                    updated.model = route.models[position + 1]
+
+            if updated != route:
+                changes.append(f"{blog_type}: {route.model} max_tokens={route.max_tokens} -> {updated.model} "
+                               f"max_tokens={updated.max_tokens} (p99 tokens {p99_tokens}, p95 {p95_latency:.0f} ms)")
+                self.routes[blog_type] = updated
+        return changes
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Show or retune the per-blog-type model routes.")
+    arg_parser.add_argument("command", choices=["show", "adapt"])
+    arg_parser.add_argument("--routes", default="routes.json", help="Routes file")
+    arg_parser.add_argument("--ledger", default=DEFAULT_LEDGER_PATH, help="Path to the usage ledger")
+    arg_parser.add_argument("--days", type=int, default=14, help="Only use calls from the last N days")
+    args = arg_parser.parse_args()
+
+    router = ModelRouter.load(args.routes)
+    if args.command == "adapt":
+        ledger = UsageLedger(args.ledger)
+        for change in router.adapt(ledger, args.days) or ["No routes changed."]:
+            print(change)
+        ledger.close()
+        router.save()
+    for blog_type, route in sorted(router.routes.items()):
+        print(f"{blog_type:28} {route.model:16} max_tokens={route.max_tokens} temperature={route.temperature}"
+              + (" outline" if route.outline else ""))
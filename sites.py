@@ -0,0 +1,99 @@
+# sites.py
+# Site profiles for publishing to several WordPress sites from one process.
+#
+# worker.json with several sites:
+#   {
+#     "openai_api_key": "...",
+#     "sites": [
+#       {"name": "chillandearn", "db": {...}, "base_url": "https://chillandearn.com",
+#        "upload_root": "/var/www/chillandearn/wp-content/uploads", "min_term_id": 89, "weight": 2},
+#       {"name": "othersite", "db": {...}, "base_url": "https://example.com",
+#        "upload_root": "/var/www/example/wp-content/uploads", "min_term_id": 5, "max_term_id": 400}
+#     ]
+#   }
+#
+# A config with a top-level "db" instead of "sites" is treated as a single site called "default".
+import threading
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+DEFAULT_BASE_URL = "https://chillandearn.com"
+DEFAULT_UPLOAD_ROOT = "/var/www/html/wp-content/uploads"
+DEFAULT_MIN_TERM_ID = 89
+
+
+class SiteProfile(BaseModel):
+    name: str
+    db: Dict[str, Any]  # mysql.connector settings
+    base_url: str = DEFAULT_BASE_URL  # Used for attachment GUIDs and inline image URLs
+    upload_root: str = DEFAULT_UPLOAD_ROOT  # wp-content/uploads directory images are written to
+    min_term_id: int = DEFAULT_MIN_TERM_ID  # Category range this site rotates through
+    max_term_id: Optional[int] = None
+    pool_size: int = 2  # Connections in this site's pool; load_site_profiles defaults it to concurrency + 1
+    weight: float = 1.0  # Relative share of the OpenAI quota
+    dedup_index_path: Optional[str] = None  # Near-duplicate index file (see dedup_index.py)
+    link_index_path: Optional[str] = None  # Internal-link index file (see link_index.py)
+    locales: List[str] = []  # Publish every post in these languages, source first, e.g. ["en", "de"]
+
+
+def load_site_profiles(config: dict, concurrency: int = 1) -> List[SiteProfile]:
+    """Build site profiles from a worker config.
+
+    A site without a pool_size gets concurrency + 1 connections, so it can take every worker slot.
+    """
+    if "sites" in config:
+        return [SiteProfile(**dict({"pool_size": concurrency + 1}, **site)) for site in config["sites"]]
+
+    return [SiteProfile(
+        name="default",
+        db=config["db"],
+        upload_root=config.get("save_path", DEFAULT_UPLOAD_ROOT),
+        pool_size=config.get("pool_size", concurrency + 1),
+        dedup_index_path=config.get("dedup_index_path"),
+        link_index_path=config.get("link_index_path"),
+        locales=config.get("locales", []),
+    )]
+
+
+class FairShareScheduler:
+    """Hand out post slots to sites in proportion to their weight.
+
+    Each site's virtual time is posts started / weight; the site furthest behind goes next. A site that
+    has every pooled connection busy is skipped for that slot, so a slow site cannot hold up the others.
+    """
+
+    def __init__(self, sites: List[SiteProfile]):
+        self.sites = sites
+        self._lock = threading.Lock()
+        self._started = {site.name: 0 for site in sites}
+        self._in_flight = {site.name: 0 for site in sites}
+
+    def acquire(self, room: Dict[str, int] = None) -> Optional[SiteProfile]:
+        """Reserve a slot for the next site, or return None if every site is at capacity.
+
+        `room` (site name -> posts) further limits the in-flight posts of each site, e.g. to the free places
+        in its publish buffer. It is computed by the caller beforehand, so no I/O happens under the lock.
+        """
+        with self._lock:
+            candidates = [site for site in self.sites if self._in_flight[site.name] < self.capacity(site)
+                          and (room is None or self._in_flight[site.name] < room.get(site.name, 0))]
+            if not candidates:
+                return None
+            site = min(candidates, key=lambda candidate: self._started[candidate.name] / candidate.weight)
+            self._started[site.name] += 1
+            self._in_flight[site.name] += 1
+            return site
+
+    def release(self, site: SiteProfile):
+        with self._lock:
+            self._in_flight[site.name] -= 1
+
+    @staticmethod
+    def capacity(site: SiteProfile) -> int:
+        # One pooled connection per in-flight post
+        return max(1, site.pool_size)
+
+    def started(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._started)
@@ -0,0 +1,323 @@
+# storage.py
+# Pluggable storage for the pipeline.
+#
+# - MySQLHandler (mysql_handler.py): WordPress on MariaDB, used in production.
+# - SQLiteHandler:                   the same WordPress subset in one SQLite file, for local load tests,
+#                                    benchmarks and CI on a box without MariaDB.
+#
+#   python storage.py init --path blog.db --categories 50     # schema plus seed categories and templates
+#   "db": {"sqlite": "blog.db"}                                 # in worker.json, see open_storage()
+#
+# Both implement blog_storage.BlogStorage, the interface the pipeline and the maintenance commands use.
+#
+# SQLiteHandler is MySQLHandler running on an adapted connection: every statement is rewritten from the
+# MariaDB dialect (placeholders, GREATEST, RAND(), GROUP_CONCAT ... SEPARATOR, INTERVAL, FOR UPDATE) and
+# SQLite errors are raised as mysql.connector errors, so transactions, batching and error handling are
+# the exact code paths production runs.
+import argparse
+import re
+import sqlite3
+from functools import lru_cache
+
+import mysql.connector
+
+from blog_storage import BlogStorage
+from mysql_handler import MySQLHandler
+from sites import DEFAULT_BASE_URL, DEFAULT_MIN_TERM_ID
+
+BUSY_TIMEOUT = 30  # Seconds a writer waits for another connection's transaction
+
+# WordPress tables with the columns the pipeline reads and writes, plus the custom tables from migrations.py
+SQLITE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS wp_posts (
+        ID INTEGER PRIMARY KEY AUTOINCREMENT,
+        post_author INTEGER NOT NULL DEFAULT 0,
+        post_date TEXT NOT NULL DEFAULT '0000-00-00 00:00:00',
+        post_content TEXT NOT NULL DEFAULT '',
+        post_title TEXT NOT NULL DEFAULT '',
+        post_excerpt TEXT NOT NULL DEFAULT '',
+        post_status TEXT NOT NULL DEFAULT 'publish',
+        comment_status TEXT NOT NULL DEFAULT 'open',
+        ping_status TEXT NOT NULL DEFAULT 'open',
+        post_name TEXT NOT NULL DEFAULT '',
+        to_ping TEXT NOT NULL DEFAULT '',
+        pinged TEXT NOT NULL DEFAULT '',
+        post_modified TEXT NOT NULL DEFAULT '0000-00-00 00:00:00',
+        post_modified_gmt TEXT NOT NULL DEFAULT '0000-00-00 00:00:00',
+        post_content_filtered TEXT NOT NULL DEFAULT '',
+        post_parent INTEGER NOT NULL DEFAULT 0,
+        guid TEXT NOT NULL DEFAULT '',
+        post_type TEXT NOT NULL DEFAULT 'post',
+        post_mime_type TEXT NOT NULL DEFAULT ''
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS type_status_date ON wp_posts (post_type, post_status, post_date, ID)",
+    """
+    CREATE TABLE IF NOT EXISTS wp_postmeta (
+        meta_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        post_id INTEGER NOT NULL DEFAULT 0,
+        meta_key TEXT,
+        meta_value TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS post_id ON wp_postmeta (post_id)",
+    "CREATE INDEX IF NOT EXISTS meta_key ON wp_postmeta (meta_key)",
+    """
+    CREATE TABLE IF NOT EXISTS wp_terms (
+        term_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL DEFAULT '',
+        slug TEXT NOT NULL DEFAULT '',
+        term_group INTEGER NOT NULL DEFAULT 0,
+        z_category_description TEXT NOT NULL DEFAULT '',
+        z_processed INTEGER NOT NULL DEFAULT 0,
+        z_epoch INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "DROP INDEX IF EXISTS idx_z_epoch_term",
+    "CREATE INDEX IF NOT EXISTS idx_z_epoch_term_cover ON wp_terms (z_epoch, term_id, name, z_category_description)",
+    """
+    CREATE TABLE IF NOT EXISTS wp_term_taxonomy (
+        term_taxonomy_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        term_id INTEGER NOT NULL DEFAULT 0,
+        taxonomy TEXT NOT NULL DEFAULT '',
+        description TEXT NOT NULL DEFAULT '',
+        parent INTEGER NOT NULL DEFAULT 0,
+        count INTEGER NOT NULL DEFAULT 0,
+        UNIQUE (term_id, taxonomy)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS wp_term_relationships (
+        object_id INTEGER NOT NULL DEFAULT 0,
+        term_taxonomy_id INTEGER NOT NULL DEFAULT 0,
+        term_order INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (object_id, term_taxonomy_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS blog_templates (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        blog_type TEXT NOT NULL,
+        user_prompt TEXT NOT NULL,
+        is_taken INTEGER NOT NULL DEFAULT 0,
+        last_epoch INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_last_epoch_type ON blog_templates (last_epoch, blog_type)",
+    "CREATE INDEX IF NOT EXISTS idx_blog_type ON blog_templates (blog_type)",
+    """
+    CREATE TABLE IF NOT EXISTS z_rotation (
+        name TEXT NOT NULL PRIMARY KEY,
+        epoch INTEGER NOT NULL DEFAULT 1
+    )
+    """,
+    "INSERT OR IGNORE INTO z_rotation (name, epoch) VALUES ('terms', 1), ('templates', 1)",
+    """
+    CREATE TABLE IF NOT EXISTS z_publish_buffer (
+        post_id INTEGER NOT NULL PRIMARY KEY,
+        created_at TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS z_image_backfill (
+        post_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        prompt TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT NOT NULL,
+        claimed_at TEXT,
+        PRIMARY KEY (post_id, kind)
+    )
+    """,
+]
+
+# MariaDB -> SQLite rewrites for the statements in mysql_handler.py
+_DIALECT = [
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"\bGREATEST\("), "MAX("),
+    (re.compile(r"\bAS SIGNED\b"), "AS INTEGER"),
+    (re.compile(r"\bRAND\(\)"), "RANDOM()"),
+    (re.compile(r"\bINSERT IGNORE\b"), "INSERT OR IGNORE"),
+    (re.compile(r"GROUP_CONCAT\(([^)]*?) SEPARATOR ('[^']*')\)"), r"GROUP_CONCAT(\1, \2)"),
+    (re.compile(r"NOW\(\) - INTERVAL \? DAY"), "datetime('now', 'localtime', '-' || ? || ' days')"),
+]
+_FOR_UPDATE_RE = re.compile(r"\s+FOR UPDATE\s*$")
+
+
+@lru_cache(maxsize=512)
+def translate(query: str):
+    """Rewrite a MariaDB statement for SQLite. Returns (query, locks), locks=True for SELECT ... FOR UPDATE."""
+    for pattern, replacement in _DIALECT:
+        query = pattern.sub(replacement, query)
+    locks = bool(_FOR_UPDATE_RE.search(query))
+    return _FOR_UPDATE_RE.sub("", query), locks
+
+
+def as_mysql_error(err: sqlite3.Error):
+    # errno 1205 (lock wait timeout) is what MariaDB reports for the equivalent of SQLITE_BUSY
+    errno = 1205 if "locked" in str(err) else None
+    return mysql.connector.DatabaseError(msg=f"SQLite: {err}", errno=errno)
+
+
+class SQLiteCursor:
+    """sqlite3 cursor that accepts the MariaDB statements MySQLHandler issues."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._cursor = connection.raw.cursor()
+
+    def execute(self, query, params=None):
+        query, locks = translate(query)
+        self.connection.statements += 1
+        try:
+            if locks and not self.connection.raw.in_transaction:
+                # SQLite has no row locks; take the database write lock for the rest of the transaction
+                self._cursor.execute("BEGIN IMMEDIATE")
+            self._cursor.execute(query, tuple(params or ()))
+        except sqlite3.Error as err:
+            raise as_mysql_error(err) from err
+
+    def executemany(self, query, seq_params):
+        query, locks = translate(query)
+        seq_params = [tuple(params) for params in seq_params]
+        self.connection.statements += len(seq_params)
+        try:
+            self._cursor.executemany(query, seq_params)
+        except sqlite3.Error as err:
+            raise as_mysql_error(err) from err
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """The parts of a mysql.connector connection MySQLHandler uses, on top of sqlite3."""
+
+    def __init__(self, path: str):
+        # One connection per handler, as with MariaDB; check_same_thread=False because the worker hands
+        # a handler between threads, never using it from two at once
+        self.raw = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self.statements = 0
+        if path != ":memory:":
+            # Readers never block the writer and vice versa, like InnoDB's consistent reads
+            self.raw.execute("PRAGMA journal_mode = WAL")
+            self.raw.execute("PRAGMA synchronous = NORMAL")
+
+    def cursor(self):
+        return SQLiteCursor(self)
+
+    def commit(self):
+        try:
+            self.raw.commit()
+        except sqlite3.Error as err:
+            raise as_mysql_error(err) from err
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def is_connected(self):
+        return self.raw is not None
+
+    def close(self):
+        self.raw.close()
+        self.raw = None
+
+
+class SQLiteHandler(MySQLHandler):
+    def __init__(self, path: str, base_url=DEFAULT_BASE_URL, min_term_id=DEFAULT_MIN_TERM_ID, max_term_id=None):
+        # SQLite integers are signed 64-bit, one short of MySQLHandler's unsigned default bound
+        max_term_id = max_term_id if max_term_id is not None else 2 ** 63 - 1
+        super().__init__({"database": path}, base_url=base_url, min_term_id=min_term_id, max_term_id=max_term_id)
+        self.path = path
+
+    def connect(self):
+        try:
+            self.connection = SQLiteConnection(self.path)
+        except sqlite3.Error as err:
+            print(f"Error connecting: {err}")
+
+    def close(self):
+        if self.connection and self.connection.is_connected():
+            self.connection.close()
+
+    @property
+    def statements(self) -> int:
+        """Statements run on this handler's connection so far."""
+        return self.connection.statements if self.connection else 0
+
+    def create_schema(self):
+        cursor = self.connection.raw.cursor()
+        for statement in SQLITE_SCHEMA:
+            cursor.execute(statement)
+        self.connection.commit()
+        cursor.close()
+
+    def add_category(self, name: str, description: str = None, term_id: int = None) -> int:
+        """Insert a category (wp_terms plus its wp_term_taxonomy row). Returns the term_id."""
+        cursor = self.connection.raw.cursor()
+        slug = re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+        cursor.execute("INSERT INTO wp_terms (term_id, name, slug, z_category_description) VALUES (?, ?, ?, ?)",
+                       (term_id, name, slug, description or name))
+        term_id = cursor.lastrowid
+        cursor.execute("INSERT INTO wp_term_taxonomy (term_id, taxonomy) VALUES (?, 'category')", (term_id,))
+        self.connection.commit()
+        cursor.close()
+        return term_id
+
+    def add_template(self, blog_type: str, user_prompt: str):
+        cursor = self.connection.raw.cursor()
+        cursor.execute("INSERT INTO blog_templates (blog_type, user_prompt) VALUES (?, ?)", (blog_type, user_prompt))
+        self.connection.commit()
+        cursor.close()
+
+    def seed(self, blog_types, categories: int = 50, first_term_id: int = DEFAULT_MIN_TERM_ID):
+        """Create the schema, `categories` numbered categories and one template per blog type."""
+        self.create_schema()
+        for index in range(categories):
+            self.add_category(f"Passive income topic {index}", f"passive income topic {index}", first_term_id + index)
+        for blog_type in blog_types:
+            self.add_template(blog_type, f"Write a {blog_type.replace('_', ' ')} blog post about {{category}}.")
+
+
+def open_storage(db_config: dict, **kwargs) -> BlogStorage:
+    """Storage handler for a site's "db" settings: {"sqlite": path} for SQLite, else mysql.connector settings.
+
+    kwargs are MySQLHandler's; the pool settings do not apply to SQLite and are dropped.
+    """
+    if "sqlite" in db_config:
+        return SQLiteHandler(db_config["sqlite"], **{key: value for key, value in kwargs.items()
+                                                    if key in ("base_url", "min_term_id", "max_term_id")})
+    return MySQLHandler(db_config, **kwargs)
+
+
+if __name__ == "__main__":
+    from openai_handler import BLOG_TYPES
+
+    arg_parser = argparse.ArgumentParser(description="Create a local SQLite stand-in for the WordPress database.")
+    arg_parser.add_argument("command", choices=["init"])
+    arg_parser.add_argument("--path", default="blog.db", help="SQLite database file")
+    arg_parser.add_argument("--categories", type=int, default=50, help="Seed categories to create")
+    args = arg_parser.parse_args()
+
+    db_handler = SQLiteHandler(args.path)
+    db_handler.connect()
+    try:
+        db_handler.seed(BLOG_TYPES, args.categories)
+        print(f"Created {args.path} with {args.categories} categories and {len(BLOG_TYPES)} templates.")
+    finally:
+        db_handler.close()
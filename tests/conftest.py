@@ -0,0 +1,40 @@
+import pytest
+
+import metrics
+from storage import SQLiteHandler
+
+
+
+@pytest.fixture(autouse=True)
+def quiet_metrics():
+    metrics.configure(log_path="off")
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "blog.db")
+    handler = SQLiteHandler(path)
+    handler.connect()
+    handler.seed(["how_to_tutorial", "top_10_list", "case_study"], categories=5)
+    handler.close()
+    return path
+
+
+@pytest.fixture
+def db(db_path):
+    handler = SQLiteHandler(db_path)
+    handler.connect()
+    yield handler
+    handler.close()
+
+
+@pytest.fixture
+def query(db):
+    """Runs a statement in SQLite's own dialect on the db handler's connection and returns the rows."""
+    def run(sql, params=()):
+        cursor = db.connection.raw.cursor()
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+    return run
@@ -0,0 +1,33 @@
+import threading
+import time
+
+import pytest
+
+from openai_backends import HedgedBackend
+
+
+class BlockingBackend:
+    """Image calls block until released, like requests stuck on a slow API."""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def generate_image(self, model, prompt, size, quality, timeout=None):
+        self.release.wait()
+        return "https://example.com/image.png"
+
+
+def test_hedged_call_queued_behind_a_full_pool_respects_its_timeout():
+    inner = BlockingBackend()
+    backend = HedgedBackend(inner, initial_delay=0.01, max_workers=1)
+    # Takes the pool's only thread
+    stuck = threading.Thread(target=backend.generate_image, args=("dall-e-3", "a", "1024x1024", "standard"))
+    stuck.start()
+    try:
+        start = time.monotonic()
+        with pytest.raises(TimeoutError):
+            backend.generate_image("dall-e-3", "b", "1024x1024", "standard", timeout=0.05)
+        assert time.monotonic() - start < 1
+    finally:
+        inner.release.set()
+        stuck.join()
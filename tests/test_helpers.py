@@ -0,0 +1,103 @@
+import json
+from typing import List, Optional
+
+import pytest
+from pydantic import BaseModel, Field
+
+from blog_parser import split_sections, truncate_words
+from deadlines import Deadline, DeadlineExceeded
+from mysql_handler import post_content_update, term_count_update
+from openai_backends import json_schema_format
+from openai_handler import salvage_fields
+
+STAGES = (("generate", 0.5), ("inline_image", 0.25), ("featured_image", 0.25))
+
+
+class Step(BaseModel):
+    text: str
+    done: bool = False
+
+
+class Guide(BaseModel):
+    title: str
+    main_step: Step = Field(description="The step everything else depends on")
+    steps: List[Step]
+    note: Optional[str] = None
+
+
+def test_salvage_fields_keeps_fields_completed_before_a_cut():
+    content = json.dumps({"title": "A, \"quoted\" title", "intro": "Text: with colon", "items": [1, 2]})
+    assert salvage_fields(content) == {"title": 'A, "quoted" title', "intro": "Text: with colon", "items": [1, 2]}
+    assert salvage_fields(content[:-8]) == {"title": 'A, "quoted" title', "intro": "Text: with colon"}
+    assert salvage_fields('{"title": "Complete", "intro": "Cut off') == {"title": "Complete"}
+    assert salvage_fields("") == {}
+    assert salvage_fields("no json here") == {}
+
+
+def test_deadline_reserves_the_share_of_later_stages():
+    deadline = Deadline(100, stages=STAGES)
+    deadline.started -= 10
+    assert deadline.timeout("generate") == pytest.approx(40, abs=0.1)
+    assert deadline.timeout("inline_image") == pytest.approx(65, abs=0.1)
+    assert deadline.timeout("featured_image") == pytest.approx(90, abs=0.1)
+    # Stages outside the plan get whatever is left
+    assert deadline.timeout("translate") == pytest.approx(90, abs=0.1)
+
+    deadline.started -= 50
+    assert deadline.timeout("generate") == 0.0
+    with pytest.raises(DeadlineExceeded):
+        deadline.check("generate")
+    deadline.check("featured_image")
+
+    deadline.cancel()
+    assert deadline.cancelled
+    assert deadline.timeout("featured_image") == 0.0
+
+
+def test_term_count_update_skips_zero_deltas():
+    assert term_count_update({}) is None
+    assert term_count_update({7: 0}) is None
+    query, params = term_count_update({7: 2, 8: 0, 9: -1})
+    assert query.count("WHEN %s THEN %s") == 2
+    assert params == [7, 2, 9, -1, 7, 9]
+
+
+def test_post_content_update_builds_one_statement():
+    query, params = post_content_update({1: "<p>a</p>", 2: "<p>b</p>"})
+    assert query.count("WHEN %s THEN %s") == 2
+    assert query.count("%s") == 6
+    assert params == [1, "<p>a</p>", 2, "<p>b</p>", 1, 2]
+
+
+def test_truncate_words_cuts_at_a_word_boundary():
+    assert truncate_words("short text", 20) == "short text"
+    assert truncate_words("one two three four", 12) == "one two"
+    assert truncate_words("one two, three four", 12, "…") == "one two…"
+    assert len(truncate_words("word " * 50, 155, "…")) <= 155
+
+
+def test_split_sections_splits_before_headings():
+    html_content = "<p>Intro</p>\n<h2>First</h2><p>a</p>\n<h3 class=\"x\">Second</h3><p>b</p>\n<header>no</header>"
+    sections = split_sections(html_content)
+    assert sections == ["<p>Intro</p>\n", "<h2>First</h2><p>a</p>\n",
+                        "<h3 class=\"x\">Second</h3><p>b</p>\n<header>no</header>"]
+    assert "".join(sections) == html_content
+    assert split_sections("<h2>Only</h2>") == ["", "<h2>Only</h2>"]
+
+
+def test_json_schema_format_is_strict():
+    response_format = json_schema_format(Guide)
+    assert response_format["type"] == "json_schema"
+    assert response_format["json_schema"]["name"] == "Guide"
+    assert response_format["json_schema"]["strict"] is True
+
+    schema = response_format["json_schema"]["schema"]
+    assert schema["additionalProperties"] is False
+    assert schema["required"] == ["title", "main_step", "steps", "note"]
+    assert "default" not in schema["properties"]["note"]
+    # A $ref with a description is inlined; a bare one is kept
+    main_step = schema["properties"]["main_step"]
+    assert "$ref" not in main_step and main_step["description"] == "The step everything else depends on"
+    assert main_step["required"] == ["text", "done"] and main_step["additionalProperties"] is False
+    assert schema["properties"]["steps"]["items"] == {"$ref": "#/$defs/Step"}
+    assert schema["$defs"]["Step"]["required"] == ["text", "done"]
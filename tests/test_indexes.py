@@ -0,0 +1,32 @@
+from dedup_index import DedupIndex
+from link_index import LinkIndex
+
+
+def test_link_index_save_keeps_posts_other_processes_logged(tmp_path):
+    path = str(tmp_path / "links.idx")
+    # Two workers on one index file, each with its own copy in memory
+    first, second = LinkIndex.load(path), LinkIndex.load(path)
+    first.add(1, "Dividend ETFs for passive income", ["Investing"])
+    second.add(2, "Passive income from rental property", ["Real estate"])
+    first.save()
+    second.add(3, "Rental property taxes explained", ["Real estate"])
+    second.save()
+
+    index = LinkIndex.load(path)
+    assert sorted(index.documents) == [1, 2, 3]
+    assert {post_id for post_id, _ in index.related("Passive income ideas", limit=5)} == {1, 2}
+    assert [post_id for post_id, _ in index.related("Property taxes", ["Real estate"], limit=1)] == [3]
+
+
+def test_dedup_index_save_keeps_posts_other_processes_logged(tmp_path):
+    path = str(tmp_path / "dedup.idx")
+    content = "<p>Index funds spread your money over hundreds of companies at a very low yearly cost.</p>"
+    first, second = DedupIndex.load(path), DedupIndex.load(path)
+    first.add(1, "Index funds", content)
+    second.add(2, "Bonds", "<p>Bonds pay a fixed coupon until they mature and then return the principal.</p>")
+    first.save()
+    second.save()
+
+    index = DedupIndex.load(path)
+    assert len(index) == 2 and index.last_post_id == 2
+    assert [post_id for post_id, _ in index.find_similar("Index funds", content)] == [1]
@@ -0,0 +1,58 @@
+import collections
+
+import pytest
+
+from openai_backends import LatencyModel, SyntheticBackend
+from openai_handler import OpenAIHandler
+from pipeline import backfill_images, claim_next_job, generate_and_publish
+from usage_ledger import UsageLedger
+
+FAST = LatencyModel(median=0.001, sigma=0.1)
+
+
+class FailingInlineBackend(SyntheticBackend):
+    """Synthetic backend whose first inline (dall-e-2) image fails."""
+
+    def __init__(self):
+        super().__init__(chat_latency=FAST, image_latency=FAST, download_latency=FAST, seed=1)
+        self.image_calls = collections.Counter()
+
+    def generate_image(self, model, prompt, size, quality, timeout=None):
+        self.image_calls[model] += 1
+        if model == "dall-e-2" and self.image_calls[model] == 1:
+            raise RuntimeError("inline image failed")
+        return super().generate_image(model, prompt, size, quality, timeout)
+
+
+@pytest.fixture
+def backend():
+    return FailingInlineBackend()
+
+
+@pytest.fixture
+def openai_handler(backend):
+    return OpenAIHandler(backend=backend, ledger=UsageLedger(":memory:"))
+
+
+def post_contents(db):
+    return [row[0] for row in db.connection.raw.execute("SELECT post_content FROM wp_posts WHERE post_type = 'post' "
+                                                        "ORDER BY ID")]
+
+
+def test_locale_variants_share_a_failed_inline_image(db, backend, openai_handler, tmp_path):
+    job = claim_next_job(db)
+    post_id = generate_and_publish(job, db, openai_handler, str(tmp_path), locales=["en", "de", "fr"])
+
+    assert post_id
+    # The variants reuse the source's placeholder instead of generating images of their own
+    assert backend.image_calls["dall-e-2"] == 1
+    contents = post_contents(db)
+    assert len(contents) == 3
+    assert all("<!--inline-image-pending-->" in content for content in contents)
+    assert db.connection.raw.execute("SELECT post_id, kind FROM z_image_backfill").fetchall() == [(post_id, "inline")]
+
+    assert backfill_images(db, openai_handler, str(tmp_path)) == 1
+    contents = post_contents(db)
+    images = {content[content.index("<img"):content.index("/>", content.index("<img"))] for content in contents}
+    assert len(images) == 1
+    assert all(content.count("<img") == 1 and "<!--inline-image-pending-->" not in content for content in contents)
@@ -0,0 +1,78 @@
+from benchmark import load_fixture
+from blog_parser import BlogContentParser
+from openai_handler import OutdatedSection, OutdatedSections, PostRefresh, SectionUpdate
+from refresh import refresh_post
+from rerender import NoImages, raw_content_meta, rerender
+
+
+def publish_fixture(db, blog_type, link_index=None):
+    blog_content_json = load_fixture(blog_type)
+    parser = BlogContentParser(blog_content_json=blog_content_json, blog_type=blog_type, category="",
+                               openai_handler=NoImages(), save_path="", base_url=db.base_url, link_index=link_index)
+    title, html_content = parser.parse_blog()
+    post_id = db.create_blog_post({"title": title, "content": html_content,
+                                   "meta": raw_content_meta(blog_type, blog_content_json)})
+    return post_id, html_content
+
+
+def test_rerender_is_idempotent(db, query):
+    posts = dict(publish_fixture(db, blog_type) for blog_type in ("how_to_tutorial", "top_10_list", "case_study"))
+    stale_id = next(iter(posts))
+    db.update_post_contents({stale_id: "<p>Rendered by an older template</p>"})
+
+    assert rerender(db, workers=1) == (3, 1, 0)
+    assert rerender(db, workers=1) == (3, 0, 0)
+    contents = dict(query("SELECT ID, post_content FROM wp_posts WHERE post_type = 'post'"))
+    assert contents == posts
+
+
+
+class FixedLinks:
+    def related(self, title, terms, limit=3):
+        return [(90001, "Stocks & Bonds: <Which> Pays More?")]
+
+
+def test_related_post_titles_are_escaped(db):
+    post_id, html_content = publish_fixture(db, "case_study", link_index=FixedLinks())
+    assert '?p=90001">Stocks &amp; Bonds: &lt;Which&gt; Pays More?</a>' in html_content
+
+    # Re-rendering reads the escaped title back from the stored list and writes the same HTML
+    assert rerender(db, workers=1) == (1, 0, 0)
+
+
+class StaleSectionHandler:
+    """Stands in for OpenAIHandler in refresh_post: marks one section outdated and rewrites it."""
+
+    def __init__(self, index):
+        self.index = index
+        self.sent = None
+
+    def begin_post(self, blog_type):
+        pass
+
+    def assign_post(self, post_id):
+        pass
+
+    def outdated_sections(self, title, section_texts):
+        return OutdatedSections(sections=[OutdatedSection(index=self.index, reason="2023 figures")])
+
+    def refresh_sections(self, title, sections, outdated):
+        self.sent = [section.index for section in outdated]
+        heading = sections[self.index].split("\n")[0]
+        content = f"{heading}\n<p>Figures as of this year.</p>"
+        return PostRefresh(updates=[SectionUpdate(index=self.index, reason="2023 figures", content=content)])
+
+
+def test_rerender_keeps_refreshed_sections(db, query):
+    post_id, html_content = publish_fixture(db, "how_to_tutorial")
+    handler = StaleSectionHandler(index=2)
+    assert refresh_post(db, handler, post_id, "Title", html_content) == [2]
+    assert handler.sent == [2]
+    refreshed = db.get_post(post_id)[1]
+    assert "Figures as of this year." in refreshed
+
+    # The raw content is kept, and re-rendering puts the rewrite back over it
+    meta_keys = {row[0] for row in query("SELECT meta_key FROM wp_postmeta WHERE post_id = ?", (post_id,))}
+    assert {"_blog_content", "_blog_refreshed_sections"} <= meta_keys
+    assert rerender(db, workers=1) == (1, 0, 0)
+    assert db.get_post(post_id)[1] == refreshed
@@ -0,0 +1,140 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from blog_storage import BlogStorage
+from mysql_handler import MySQLHandler, generate_slug
+from pipeline import claim_next_job
+from storage import SQLiteHandler, translate
+
+
+def category_count(query, term_id):
+    return query("SELECT count FROM wp_term_taxonomy WHERE term_id = ? AND taxonomy = 'category'", (term_id,))[0][0]
+
+
+def first_term_id(query):
+    return query("SELECT MIN(term_id) FROM wp_terms")[0][0]
+
+
+def create_buffered_draft(db, term_id, title):
+    post_id = db.create_blog_post({"title": title, "content": "<p>Body</p>", "status": "draft"})
+    db.assign_category_to_post(category_id=term_id, post_id=post_id, published=False)
+    db.add_to_publish_buffer(post_id)
+    return post_id
+
+
+def test_both_backends_implement_the_storage_interface(db):
+    assert isinstance(db, BlogStorage)
+    assert issubclass(MySQLHandler, BlogStorage)
+    # Nothing left abstract: every interface method has an implementation
+    assert not SQLiteHandler.__abstractmethods__ and not MySQLHandler.__abstractmethods__
+
+
+def test_translate_rewrites_mariadb_dialect():
+    sql, locks = translate("SELECT GREATEST(count, 0), RAND() FROM t WHERE id = %s FOR UPDATE")
+    assert sql == "SELECT MAX(count, 0), RANDOM() FROM t WHERE id = ?"
+    assert locks
+
+    sql, locks = translate("SELECT GROUP_CONCAT(t.name SEPARATOR '|') FROM t WHERE d < NOW() - INTERVAL %s DAY")
+    assert sql == "SELECT GROUP_CONCAT(t.name, '|') FROM t WHERE d < datetime('now', 'localtime', '-' || ? || ' days')"
+    assert not locks
+
+
+def test_claim_next_job_hands_out_each_term_once(db_path, query):
+    # Like the worker: one handler per post, claims serialized per site
+    claim_lock = threading.Lock()
+    jobs = []  # In claim order
+
+    def claim(_):
+        handler = SQLiteHandler(db_path)
+        handler.connect()
+        try:
+            with claim_lock:
+                jobs.append(claim_next_job(handler))
+        finally:
+            handler.close()
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        list(executor.map(claim, range(5)))
+
+    assert len(jobs) == 5 and all(jobs)
+    assert len({job["term_id"] for job in jobs}) == 5
+    # Every blog type is used once before the template rotation starts over
+    blog_types = {row[0] for row in query("SELECT blog_type FROM blog_templates")}
+    assert len(blog_types) < 5
+    assert {job["blog_type"] for job in jobs[:len(blog_types)]} == blog_types
+
+
+def test_publish_buffered_posts_counts_only_flipped_drafts(db, query):
+    term_id = first_term_id(query)
+    post_ids = [create_buffered_draft(db, term_id, f"Draft {index}") for index in range(3)]
+    assert db.count_buffered_posts() == 3
+    assert category_count(query, term_id) == 0
+
+    # An admin publishes one draft by hand, which WordPress counts itself
+    db.connection.raw.execute("UPDATE wp_posts SET post_status = 'publish' WHERE ID = ?", (post_ids[0],))
+    db.connection.raw.execute("UPDATE wp_term_taxonomy SET count = 1 WHERE term_id = ?", (term_id,))
+    db.connection.commit()
+
+    assert db.publish_buffered_posts(limit=2) == post_ids[:2]
+    assert category_count(query, term_id) == 2
+    assert db.publish_buffered_posts(limit=5) == post_ids[2:]
+    assert category_count(query, term_id) == 3
+    assert db.publish_buffered_posts(limit=5) == []
+    assert db.count_buffered_posts() == 0
+    statuses = query("SELECT DISTINCT post_status FROM wp_posts WHERE post_type = 'post'")
+    assert statuses == [("publish",)]
+
+
+def test_create_post_variants_shares_image_and_derives_slugs(db, query):
+    term_id = first_term_id(query)
+    variants = [
+        {"locale": "en", "title": "Passive Income Basics", "content": "<p>English</p>"},
+        {"locale": "ja", "title": "不労所得の基本", "content": "<p>日本語</p>"},
+        {"locale": "de", "title": "Grundlagen passives Einkommen", "content": "<p>Deutsch</p>"},
+    ]
+    image = {"name": "featured.jpg", "month": "01", "year": "2025", "path": "2025/01/featured.jpg"}
+    post_ids = db.create_post_variants(variants, term_id, image=image, status="draft")
+
+    assert len(post_ids) == 3
+    slugs = [row[0] for row in query("SELECT post_name FROM wp_posts WHERE ID IN (?, ?, ?) ORDER BY ID", post_ids)]
+    primary_slug = generate_slug("Passive Income Basics")
+    assert slugs == [primary_slug, f"{primary_slug}-ja", f"{primary_slug}-de"]
+
+    translation_of = query("SELECT post_id, meta_value FROM wp_postmeta WHERE meta_key = '_blog_translation_of' "
+                           "ORDER BY post_id")
+    assert translation_of == [(post_ids[1], str(post_ids[0])), (post_ids[2], str(post_ids[0]))]
+    thumbnails = query("SELECT DISTINCT meta_value FROM wp_postmeta WHERE meta_key = '_thumbnail_id'")
+    assert len(thumbnails) == 1
+
+    # Drafts are buffered as one group and counted once they go live
+    assert db.count_buffered_posts() == 1
+    assert category_count(query, term_id) == 0
+    assert db.publish_buffered_posts(limit=1) == post_ids[:1]
+    assert category_count(query, term_id) == 3
+    assert query("SELECT COUNT(*) FROM wp_posts WHERE post_status = 'publish'")[0][0] == 3
+
+
+def test_inline_backfill_only_replaces_the_placeholder(db, query):
+    pending = "<p>Intro</p>\n<!--more-->\n\n<!--inline-image-pending-->\n<p>Body</p>"
+    own_image = "<p>Intro</p>\n<!--more-->\n\n<img src=\"own.jpg\"/>\n<p>Body</p>"
+    variants = [
+        {"locale": "en", "title": "Passive Income Basics", "content": pending},
+        {"locale": "de", "title": "Grundlagen passives Einkommen", "content": own_image},
+        {"locale": "fr", "title": "Les bases du revenu passif", "content": pending},
+    ]
+    post_ids = db.create_post_variants(variants, first_term_id(query))
+    db.queue_image_backfill(post_ids[0], "inline", "inline prompt")
+    assert db.claim_image_backfills() == [(post_ids[0], "inline", "inline prompt")]
+
+    fragment = "<img src=\"backfilled.jpg\"/>"
+    placeholder = "<!--inline-image-pending-->"
+    assert db.complete_inline_backfill(post_ids[0], fragment, "2025/01/backfilled.jpg", placeholder)
+    contents = dict(query("SELECT ID, post_content FROM wp_posts WHERE post_type = 'post'"))
+    assert contents[post_ids[0]] == pending.replace(placeholder, fragment)
+    assert contents[post_ids[1]] == own_image
+    assert contents[post_ids[2]] == pending.replace(placeholder, fragment)
+    image_meta = query("SELECT post_id FROM wp_postmeta WHERE meta_key = '_blog_inline_image' ORDER BY post_id")
+    assert image_meta == [(post_ids[0],), (post_ids[2],)]
+
+    # Completed once: a second worker finishing the same backfill writes nothing
+    assert not db.complete_inline_backfill(post_ids[0], fragment, "2025/01/backfilled.jpg", placeholder)
@@ -0,0 +1,252 @@
+# usage_ledger.py
+# Local ledger of every OpenAI call (tokens, images, latency, cost) keyed by post_id and term_id.
+#
+#   python usage_ledger.py report               # all recorded calls
+#   python usage_ledger.py report --days 7      # only the last week
+#
+# The ledger is a SQLite file (BLOG_USAGE_LEDGER, default usage_ledger.sqlite3 next to this file).
+import argparse
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict
+
+DEFAULT_LEDGER_PATH = os.environ.get(
+    "BLOG_USAGE_LEDGER", os.path.join(os.path.dirname(os.path.abspath(__file__)), "usage_ledger.sqlite3"))
+
+# USD per 1M tokens: (input, cached input, output)
+CHAT_PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+}
+
+# USD per image: (model, quality, size)
+IMAGE_PRICES = {
+    ("dall-e-3", "standard", "1024x1024"): 0.040,
+    ("dall-e-3", "standard", "1024x1792"): 0.080,
+    ("dall-e-3", "standard", "1792x1024"): 0.080,
+    ("dall-e-3", "hd", "1024x1024"): 0.080,
+    ("dall-e-3", "hd", "1024x1792"): 0.120,
+    ("dall-e-3", "hd", "1792x1024"): 0.120,
+    ("dall-e-2", "standard", "1024x1024"): 0.020,
+    ("dall-e-2", "standard", "512x512"): 0.018,
+    ("dall-e-2", "standard", "256x256"): 0.016,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS api_calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts TEXT NOT NULL,
+    run_id TEXT,
+    post_id INTEGER,
+    term_id INTEGER,
+    blog_type TEXT,
+    kind TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_tokens INTEGER DEFAULT 0,
+    completion_tokens INTEGER DEFAULT 0,
+    cached_tokens INTEGER DEFAULT 0,
+    image_count INTEGER DEFAULT 0,
+    image_size TEXT,
+    image_quality TEXT,
+    latency_ms REAL,
+    cost_usd REAL,
+    hedge INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_api_calls_run ON api_calls (run_id);
+CREATE INDEX IF NOT EXISTS idx_api_calls_post ON api_calls (post_id);
+"""
+
+
+def usage_fields(usage) -> Dict[str, int]:
+    """Extract token counts, including prompt-cache hits, from a completion's usage."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "cached_tokens": getattr(details, "cached_tokens", 0) or 0,
+    }
+
+
+def chat_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int):
+    """Return the USD cost of a chat completion, or None for an unknown model."""
+    prices = CHAT_PRICES.get(model)
+    if not prices:
+        return None
+    input_price, cached_price, output_price = prices
+    uncached_tokens = prompt_tokens - cached_tokens
+    return (uncached_tokens * input_price + cached_tokens * cached_price + completion_tokens * output_price) / 1_000_000
+
+
+def image_cost(model: str, quality: str, size: str, image_count: int):
+    """Return the USD cost of an image generation, or None for an unknown combination."""
+    price = IMAGE_PRICES.get((model, quality, size))
+    if price is None:
+        return None
+    return price * image_count
+
+
+def percentile(values, fraction: float):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return None
+    values = sorted(values)
+    index = max(0, min(len(values) - 1, int(round(fraction * len(values))) - 1))
+    return values[index]
+
+
+class UsageLedger:
+    def __init__(self, path: str = DEFAULT_LEDGER_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        # Calls can be recorded from worker threads, so the connection is shared under a lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        # Ledgers written before hedged requests were recorded
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(api_calls)")]
+        if "hedge" not in columns:
+            self.connection.execute("ALTER TABLE api_calls ADD COLUMN hedge INTEGER DEFAULT 0")
+
+    @staticmethod
+    def new_run_id() -> str:
+        """Identify the calls made for one post before its post_id exists."""
+        return uuid.uuid4().hex
+
+    def record_chat(self, model: str, usage, latency: float, context: dict):
+        """Record a chat completion from its `completion.usage` object."""
+        tokens = usage_fields(usage)
+        self._insert(context, kind="chat", model=model, latency=latency, cost=chat_cost(model, **tokens), **tokens)
+
+    def record_image(self, model: str, size: str, quality: str, image_count: int, latency: float, context: dict):
+        """Record an image generation."""
+        self._insert(context, kind="image", model=model, image_count=image_count, image_size=size,
+                     image_quality=quality, latency=latency, cost=image_cost(model, quality, size, image_count))
+
+    def _insert(self, context: dict, kind: str, model: str, latency: float, cost, prompt_tokens=0,
+                completion_tokens=0, cached_tokens=0, image_count=0, image_size=None, image_quality=None):
+        insert_query = """
+            INSERT INTO api_calls (
+                ts, run_id, post_id, term_id, blog_type, kind, model, prompt_tokens, completion_tokens,
+                cached_tokens, image_count, image_size, image_quality, latency_ms, cost_usd, hedge
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """
+        call_data = (
+            datetime.now().isoformat(timespec="seconds"), context.get("run_id"), context.get("post_id"),
+            context.get("term_id"), context.get("blog_type"), kind, model, prompt_tokens, completion_tokens,
+            cached_tokens, image_count, image_size, image_quality, latency * 1000, cost, int(bool(context.get("hedge")))
+        )
+        with self._lock:
+            self.connection.execute(insert_query, call_data)
+            self.connection.commit()
+
+    def assign_post(self, run_id: str, post_id: int):
+        """Attach the post_id to calls that were recorded before the post was inserted."""
+        with self._lock:
+            self.connection.execute("UPDATE api_calls SET post_id = ? WHERE run_id = ?", (post_id, run_id))
+            self.connection.commit()
+
+    def chat_stats(self, days=None) -> dict:
+        """Completion tokens and latencies of chat calls, keyed by (blog_type, model). Hedged duplicates are left out."""
+        where = "WHERE kind = 'chat' AND hedge = 0"
+        params = ()
+        if days:
+            where += " AND ts >= ?"
+            params = ((datetime.now() - timedelta(days=days)).isoformat(timespec="seconds"),)
+
+        with self._lock:
+            rows = self.connection.execute(
+                f"SELECT blog_type, model, completion_tokens, latency_ms FROM api_calls {where}", params).fetchall()
+
+        stats = {}
+        for blog_type, model, completion_tokens, latency in rows:
+            entry = stats.setdefault((blog_type, model), {"completion_tokens": [], "latency_ms": []})
+            entry["completion_tokens"].append(completion_tokens or 0)
+            entry["latency_ms"].append(latency or 0.0)
+        return stats
+
+    def report(self, days=None) -> str:
+        """Summarize throughput, cost per blog type and latency percentiles."""
+        where = ""
+        params = ()
+        if days:
+            where = "WHERE ts >= ?"
+            params = ((datetime.now() - timedelta(days=days)).isoformat(timespec="seconds"),)
+
+        with self._lock:
+            rows = self.connection.execute(f"""
+                SELECT blog_type, kind, model, prompt_tokens, completion_tokens, cached_tokens,
+                       image_count, latency_ms, cost_usd, COALESCE(post_id, run_id)
+                FROM api_calls {where}
+            """, params).fetchall()
+
+        if not rows:
+            return "No API calls recorded."
+
+        lines = []
+
+        # Cost per blog type
+        by_type = {}
+        for blog_type, kind, model, prompt, completion, cached, images, latency, cost, post_key in rows:
+            entry = by_type.setdefault(blog_type or "unknown",
+                                       {"posts": set(), "prompt": 0, "completion": 0, "cached": 0, "images": 0,
+                                        "cost": 0.0})
+            entry["posts"].add(post_key)
+            entry["prompt"] += prompt
+            entry["completion"] += completion
+            entry["cached"] += cached
+            entry["images"] += images
+            entry["cost"] += cost or 0.0
+
+        lines.append(f"{'blog_type':28} {'posts':>6} {'prompt':>10} {'cached':>10} {'completion':>11} "
+                     f"{'images':>7} {'cost $':>9} {'$/post':>8}")
+        for blog_type in sorted(by_type):
+            entry = by_type[blog_type]
+            posts = len(entry["posts"])
+            lines.append(f"{blog_type:28} {posts:>6} {entry['prompt']:>10} {entry['cached']:>10} "
+                         f"{entry['completion']:>11} {entry['images']:>7} {entry['cost']:>9.4f} "
+                         f"{entry['cost'] / posts:>8.4f}")
+
+        # Throughput and latency per model
+        lines.append("")
+        lines.append(f"{'kind':6} {'model':16} {'calls':>6} {'tokens/sec':>11} {'p50 ms':>10} {'p95 ms':>10}")
+        by_model = {}
+        for blog_type, kind, model, prompt, completion, cached, images, latency, cost, post_key in rows:
+            entry = by_model.setdefault((kind, model), {"latencies": [], "completion": 0})
+            entry["latencies"].append(latency or 0.0)
+            entry["completion"] += completion
+        for (kind, model), entry in sorted(by_model.items()):
+            total_seconds = sum(entry["latencies"]) / 1000
+            tokens_per_sec = f"{entry['completion'] / total_seconds:.1f}" if kind == "chat" and total_seconds else "-"
+            lines.append(f"{kind:6} {model:16} {len(entry['latencies']):>6} {tokens_per_sec:>11} "
+                         f"{percentile(entry['latencies'], 0.50):>10.1f} {percentile(entry['latencies'], 0.95):>10.1f}")
+
+        # Losing requests of HedgedBackend, already included in the costs above
+        with self._lock:
+            hedges, hedge_cost = self.connection.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(cost_usd), 0) FROM api_calls {where} {'AND' if where else 'WHERE'} hedge = 1",
+                params).fetchone()
+        if hedges:
+            lines.append("")
+            lines.append(f"Hedged duplicates: {hedges} calls, ${hedge_cost:.4f}")
+
+        return "\n".join(lines)
+
+    def close(self):
+        self.connection.close()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Inspect the OpenAI usage ledger.")
+    arg_parser.add_argument("command", choices=["report"])
+    arg_parser.add_argument("--days", type=int, help="Only include calls from the last N days")
+    arg_parser.add_argument("--ledger", default=DEFAULT_LEDGER_PATH, help="Path to the ledger file")
+    args = arg_parser.parse_args()
+
+    ledger = UsageLedger(args.ledger)
+    print(ledger.report(days=args.days))
+    ledger.close()
@@ -0,0 +1,356 @@
+# worker.py
+# Long-running publisher daemon. Unlike main.py (one post per cron run), the worker keeps the OpenAI
+# client, the MySQL connection pools and imported libraries (cv2, openai, Pillow) warm between posts.
+#
+#   python worker.py --config worker.json --posts-per-hour 6
+#   python worker.py --config worker.json --interval 300 --concurrency 2 --active-hours 6-23
+#
+# worker.json (single site):
+#   {
+#     "db": {"user": "...", "password": "...", "host": "...", "database": "...", "port": "3306"},
+#                                                        (or {"sqlite": "blog.db"} to run locally, see storage.py)
+#     "openai_api_key": "...",            (or the OPENAI_API_KEY environment variable)
+#     "save_path": "/var/www/html/wp-content/uploads",
+#     "pool_size": 4,
+#     "dedup_index_path": "/var/lib/blog/dedup.idx",    (optional, see dedup_index.py)
+#     "link_index_path": "/var/lib/blog/links.idx",     (optional, see link_index.py)
+#     "hedging": {"percentile": 0.95, "budget_per_hour": 20},  (optional, see HedgedBackend)
+#     "routes_path": "/var/lib/blog/routes.json",      (optional, model routes retuned at start, see routing.py)
+#     "locales": ["en", "de", "es"],                    (optional, publish each post in these languages)
+#     "deadline": 300,                                  (optional, seconds per post, see deadlines.py)
+#     "image_profiles": {"inline": {"model": "dall-e-3", "size": "1024x1024", "output_size": [512, 512]}}
+#                                                        (optional overrides of openai_handler.IMAGE_PROFILES)
+#   }
+#
+# or a "sites" list of site profiles (see sites.py) to serve several WordPress sites from one process.
+# The schedule and --concurrency are the shared OpenAI quota; each slot goes to the site furthest
+# behind its weighted share, and each site has its own connection pool.
+#
+# Pre-generation buffer (run the publish_buffer migration first):
+#   python worker.py --config worker.json --mode buffer --buffer-target 24 --interval 0 --concurrency 4
+#   python worker.py --config worker.json --mode publish-buffer --posts-per-hour 2
+# --mode buffer generates complete drafts until each site has --buffer-target waiting, e.g. off-peak
+# with --active-hours; --mode publish-buffer makes one buffered draft per site live every interval,
+# which is a single UPDATE and needs no OpenAI calls.
+#
+# Image backfill (run the image_backfill migration first):
+#   python worker.py --config worker.json --deadline 300
+#   python worker.py --config worker.json --mode backfill --interval 120
+# With a deadline, a post whose image stage runs out of time is published without that image and the
+# image is queued; --mode backfill generates up to --backfill-batch queued images per site every interval.
+#
+# SIGTERM/SIGINT stop the scheduler; posts already in flight are finished before the process exits.
+import argparse
+import json
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+
+import metrics
+from dedup_index import DedupIndex
+from link_index import LinkIndex
+from metrics import span
+from openai_backends import HedgedBackend, LiveBackend
+from openai_handler import OUTLINE_MAX_WORKERS, OpenAIHandler
+from deadlines import Deadline
+from pipeline import backfill_images, claim_next_job, generate_and_publish, publish_from_buffer
+from profiling import Profiler
+from routing import ModelRouter
+from sites import FairShareScheduler, SiteProfile, load_site_profiles
+from storage import open_storage
+
+
+MODES = ("publish", "buffer", "publish-buffer", "backfill")
+
+
+class Worker:
+    def __init__(self, sites, openai_handler, interval: float = 600, concurrency: int = 1, active_hours=None,
+                 max_posts: int = None, mode: str = "publish", buffer_target: int = 24, deadline: float = None,
+                 backfill_batch: int = 5):
+        self.sites = sites
+        self.mode = mode
+        self.buffer_target = buffer_target
+        self.deadline = deadline
+        self.backfill_batch = backfill_batch
+        self.openai_handler = openai_handler
+        self.interval = interval
+        self.concurrency = concurrency
+        self.active_hours = active_hours
+        self.max_posts = max_posts
+
+        self.scheduler = FairShareScheduler(sites)
+        self.stop_event = threading.Event()
+        # Claiming reads and then marks a term/template, so it must not interleave between threads of a site
+        self.claim_locks = {site.name: threading.Lock() for site in sites}
+        self.in_flight = threading.Semaphore(concurrency)
+        capacity = sum(FairShareScheduler.capacity(site) for site in sites)
+        if concurrency > capacity:
+            print(f"Warning: --concurrency {concurrency} exceeds the sites' pool sizes ({capacity} connections); "
+                  f"at most {capacity} posts will run at once.")
+        self.started = 0
+        self.dedup_indexes = {}
+        self.link_indexes = {}
+
+    @staticmethod
+    def new_db_handler(site: SiteProfile):
+        """A handler bound to the site's pool; connect()/close() borrow and return a connection."""
+        return open_storage(site.db, pool_size=site.pool_size, pool_name=f"blog_pool_{site.name}",
+                            base_url=site.base_url, min_term_id=site.min_term_id, max_term_id=site.max_term_id)
+
+    def load_indexes(self):
+        """Load each site's near-duplicate and internal-link indexes and catch up on posts published since."""
+        for site in self.sites:
+            if not site.dedup_index_path and not site.link_index_path:
+                continue
+            db_handler = self.new_db_handler(site)
+            try:
+                db_handler.connect()
+                if site.dedup_index_path:
+                    dedup_index = DedupIndex.load(site.dedup_index_path)
+                    added = dedup_index.update_from_db(db_handler)
+                    print(f"Near-duplicate index for {site.name}: {len(dedup_index)} posts ({added} new).")
+                    self.dedup_indexes[site.name] = dedup_index
+                if site.link_index_path:
+                    link_index = LinkIndex.load(site.link_index_path)
+                    added = link_index.update_from_db(db_handler)
+                    print(f"Internal-link index for {site.name}: {len(link_index)} posts ({added} new).")
+                    self.link_indexes[site.name] = link_index
+            finally:
+                db_handler.close()
+
+    def request_stop(self, signum=None, frame=None):
+        """Signal handler: stop scheduling new posts and let in-flight ones drain."""
+        if not self.stop_event.is_set():
+            print("Stop requested; finishing in-flight posts.")
+            metrics.log_event("worker_stop_requested", signal=signum)
+        self.stop_event.set()
+
+    def is_active_now(self) -> bool:
+        if not self.active_hours:
+            return True
+        start_hour, end_hour = self.active_hours
+        hour = datetime.now().hour
+        if start_hour <= end_hour:
+            return start_hour <= hour < end_hour
+        # Window that wraps midnight, e.g. 22-6
+        return hour >= start_hour or hour < end_hour
+
+    def run_one(self, site: SiteProfile):
+        """Claim and publish a single post for a site using a pooled connection."""
+        db_handler = self.new_db_handler(site)
+        try:
+            db_handler.connect()
+            with span("worker.post", site=site.name) as post_span:
+                with self.claim_locks[site.name]:
+                    job = claim_next_job(db_handler)
+                if not job:
+                    return None
+                post_id = generate_and_publish(job, db_handler, self.openai_handler, site.upload_root,
+                                               dedup_index=self.dedup_indexes.get(site.name),
+                                               link_index=self.link_indexes.get(site.name),
+                                               buffer=self.mode == "buffer", locales=site.locales,
+                                               deadline=Deadline(self.deadline) if self.deadline else None)
+                post_span.set(post_id=post_id, term_id=job["term_id"], blog_type=job["blog_type"])
+                return post_id
+        except Exception as e:
+            # One failed post must not take the daemon down
+            print(f"An error occurred while publishing a post for {site.name}: {e}")
+        finally:
+            db_handler.close()
+            self.scheduler.release(site)
+            self.in_flight.release()
+            metrics.flush()
+
+    def buffer_room(self) -> dict:
+        """Free places in each site's publish buffer; drafts still being generated are counted by the scheduler.
+
+        A site whose count fails gets no room for this slot instead of stalling the others.
+        """
+        room = {}
+        for site in self.sites:
+            db_handler = self.new_db_handler(site)
+            try:
+                db_handler.connect()
+                room[site.name] = self.buffer_target - db_handler.count_buffered_posts()
+            except Exception as e:
+                print(f"An error occurred while counting the publish buffer of {site.name}: {e}")
+                room[site.name] = 0
+            finally:
+                db_handler.close()
+        return room
+
+    def publish_buffered(self):
+        """Make the oldest buffered draft of every site live."""
+        for site in self.sites:
+            db_handler = self.new_db_handler(site)
+            try:
+                db_handler.connect()
+                with span("worker.publish_buffered", site=site.name) as publish_span:
+                    post_ids = publish_from_buffer(db_handler, 1, link_index=self.link_indexes.get(site.name))
+                    publish_span.set(post_ids=post_ids)
+                if not post_ids:
+                    print(f"Publish buffer for {site.name} is empty.")
+                self.started += len(post_ids)
+            except Exception as e:
+                print(f"An error occurred while publishing a buffered post for {site.name}: {e}")
+            finally:
+                db_handler.close()
+        metrics.flush()
+
+    def backfill(self):
+        """Add queued images to the posts of every site that were published without them."""
+        for site in self.sites:
+            db_handler = self.new_db_handler(site)
+            try:
+                db_handler.connect()
+                with span("worker.backfill", site=site.name) as backfill_span:
+                    added = backfill_images(db_handler, self.openai_handler, site.upload_root, self.backfill_batch)
+                    backfill_span.set(added=added)
+                self.started += added
+            except Exception as e:
+                print(f"An error occurred while backfilling images for {site.name}: {e}")
+            finally:
+                db_handler.close()
+        metrics.flush()
+
+    def run(self):
+        """Schedule posts every `interval` seconds until stopped, then drain in-flight work."""
+        metrics.log_event("worker_started", interval=self.interval, concurrency=self.concurrency,
+                          sites=[site.name for site in self.sites], mode=self.mode)
+        self.load_indexes()
+        next_start = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="post") as executor:
+            while not self.stop_event.is_set():
+                if self.max_posts is not None and self.started >= self.max_posts:
+                    break
+
+                # Sleep until the next slot, waking immediately on SIGTERM
+                delay = next_start - time.monotonic()
+                if delay > 0 and self.stop_event.wait(delay):
+                    break
+                next_start = max(next_start + self.interval, time.monotonic())
+
+                if not self.is_active_now():
+                    continue
+
+                if self.mode == "publish-buffer":
+                    self.publish_buffered()
+                    continue
+
+                if self.mode == "backfill":
+                    self.backfill()
+                    continue
+
+                if self.mode == "buffer":
+                    # Filling the buffer runs at full throughput: wait for a free worker instead of skipping
+                    while not self.in_flight.acquire(timeout=1):
+                        if self.stop_event.is_set():
+                            break
+                    else:
+                        site = self.scheduler.acquire(room=self.buffer_room())
+                        if site is None:
+                            self.in_flight.release()
+                            # Nothing to do until the publisher drains a buffer
+                            next_start = time.monotonic() + max(self.interval, 60)
+                            continue
+                        self.started += 1
+                        executor.submit(self.run_one, site)
+                    continue
+
+                # Skip the slot rather than queueing work when every worker is still busy
+                if not self.in_flight.acquire(blocking=False):
+                    print("All workers busy; skipping this slot.")
+                    continue
+
+                site = self.scheduler.acquire()
+                if site is None:
+                    self.in_flight.release()
+                    print("Every site is at its connection limit; skipping this slot.")
+                    continue
+
+                self.started += 1
+                executor.submit(self.run_one, site)
+
+            # Leaving the with-block waits for in-flight posts to finish
+        for index in list(self.dedup_indexes.values()) + list(self.link_indexes.values()):
+            index.save()
+        metrics.log_event("worker_stopped", started=self.started, per_site=self.scheduler.started())
+        metrics.flush()
+
+
+def parse_active_hours(value: str):
+    start_hour, end_hour = value.split("-")
+    return int(start_hour), int(end_hour)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Publish blog posts on a schedule.")
+    arg_parser.add_argument("--config", required=True, help="JSON file with db (or sites), openai_api_key and save_path")
+    schedule = arg_parser.add_mutually_exclusive_group()
+    schedule.add_argument("--interval", type=float, help="Seconds between post starts (default 600)")
+    schedule.add_argument("--posts-per-hour", type=float, help="Target publish rate")
+    arg_parser.add_argument("--concurrency", type=int, default=1, help="Posts generated in parallel")
+    arg_parser.add_argument("--active-hours", type=parse_active_hours,
+                            help="Only start posts between these hours, e.g. 6-23 or 22-6")
+    arg_parser.add_argument("--max-posts", type=int, help="Exit after starting this many posts")
+    arg_parser.add_argument("--mode", choices=MODES, default="publish",
+                            help="publish directly, generate drafts into the buffer, publish from the buffer, or "
+                                 "backfill images")
+    arg_parser.add_argument("--buffer-target", type=int, default=24,
+                            help="Drafts to keep buffered per site in --mode buffer")
+    arg_parser.add_argument("--deadline", type=float,
+                            help="Seconds per post, split across its stages (overrides the config's \"deadline\")")
+    arg_parser.add_argument("--backfill-batch", type=int, default=5,
+                            help="Queued images generated per site and interval in --mode backfill")
+    arg_parser.add_argument("--profile", metavar="DIR",
+                            help="Profile the run and write a trace to DIR (see profiling.py); pair with --max-posts")
+    args = arg_parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+
+    interval = 600
+    if args.interval is not None:
+        interval = args.interval
+    elif args.posts_per_hour:
+        interval = 3600 / args.posts_per_hour
+
+    router = ModelRouter.load(config["routes_path"]) if config.get("routes_path") else None
+    backend = LiveBackend(api_key=config.get("openai_api_key") or os.environ.get("OPENAI_API_KEY"))
+    if config.get("hedging"):
+        # A primary and a hedge for every call in flight; outline mode fans a post out the most
+        backend = HedgedBackend(backend, **dict({"max_workers": 2 * args.concurrency * OUTLINE_MAX_WORKERS},
+                                                **config["hedging"]))
+    openai_handler = OpenAIHandler(backend=backend, image_profiles=config.get("image_profiles"), router=router)
+    if router is not None:
+        # Retune max_tokens/models from the calls recorded since the last start
+        for change in router.adapt(openai_handler.ledger):
+            print(f"Route changed: {change}")
+        router.save()
+
+    worker = Worker(
+        sites=load_site_profiles(config, args.concurrency),
+        openai_handler=openai_handler,
+        interval=interval,
+        concurrency=args.concurrency,
+        active_hours=args.active_hours,
+        max_posts=args.max_posts,
+        mode=args.mode,
+        buffer_target=args.buffer_target,
+        deadline=args.deadline or config.get("deadline"),
+        backfill_batch=args.backfill_batch,
+    )
+
+    signal.signal(signal.SIGTERM, worker.request_stop)
+    signal.signal(signal.SIGINT, worker.request_stop)
+    with Profiler(args.profile) if args.profile else nullcontext():
+        worker.run()
+
+
+if __name__ == "__main__":
+    main()